@@ -4,8 +4,11 @@ import json
 import pandas as pd
 from collections import defaultdict
 from src.strategy_blocks import StrategyConfig
-from src.backtest import _load_ohlcv, backtest_one
 from src.config_loader import load_config
+from src.config_extras import load_extras
+from src.metrics_store import open_results
+from src.portfolio_engine import daily_equity_map, strategy_key
+from src.result_store import open_store
 
 root = Path(".")
 sel_path = root / "results/portfolios/selection.json"
@@ -15,6 +18,9 @@ ohlcv_dir = root / "data/processed/ohlcv"
 sel = json.loads(sel_path.read_text(encoding="utf-8"))
 acc = json.loads(acc_path.read_text(encoding="utf-8"))
 cfg = load_config("config/config.yaml")
+extras = load_extras("config/config.yaml")
+store = open_store(extras)
+intrabar = bool(extras["backtest"].get("intrabar_stops", False))
 
 def make_key(d: dict) -> str:
     tf = d.get("timeframe","1m")
@@ -24,8 +30,7 @@ def make_key(d: dict) -> str:
 acc_map = { make_key(d): d for d in acc }
 
 weights = sel.get("weights",{})
-rows=[]
-rets={}
+picked = []
 for k, w in sorted(weights.items(), key=lambda kv: kv[1], reverse=True):
     strat_d = acc_map.get(k)
     if not strat_d:
@@ -37,10 +42,15 @@ for k, w in sorted(weights.items(), key=lambda kv: kv[1], reverse=True):
         strat_d = cand[0] if cand else None
     if not strat_d:
         continue
+    picked.append((k, w, StrategyConfig(**strat_d)))
 
-    s = StrategyConfig(**strat_d)
-    df = _load_ohlcv(s.symbol, ohlcv_dir)
-    m, eq = backtest_one(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
+# Tageskurven aus dem Backtest-Artefakt (fehlende/veraltete werden nachgerechnet)
+curves = daily_equity_map([s for _, _, s in picked], cfg, ohlcv_dir, intrabar=intrabar, store=store,
+                         root=open_results(extras))
+rows=[]
+rets={}
+for k, w, s in picked:
+    m, eq = curves[strategy_key(s)]
     # tägliche Renditen
     daily = (eq.resample("D").last().pct_change().dropna())
     rets[k] = daily
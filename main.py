@@ -7,17 +7,27 @@ from src.config_loader import load_config
 from src.config_extras import load_extras
 from src.data_loader import load_all_markets, save_processed_ohlcv
 from src.features import build_features_for_markets
-from src.strategy_generator import generate_ma_crossover_candidates
-from src.backtest import backtest_all
-from src.evaluation import evaluate_and_save
+from src.strategy_generator import (coarse_to_fine_search, generate_ma_crossover_candidates, genetic_search,
+                                    save_search_state, successive_halving)
+from src.backtest import PruneRule, backtest_all, backtest_recent, slice_bar_counts
+from src.ohlcv_store import convert_parquet
+from src.result_store import open_store
+from src.evaluation import evaluate_metrics, save_evaluation, thresholds
+from src.metrics_store import open_results, read_metrics, write_phase
 from src.forward_test import forward_test_all, save_metrics_and_eval
 from src.forward_multi import run_forward_multi
-from src.portfolio_engine import build_portfolio
+from src.portfolio_engine import build_portfolio, save_daily_equity, sweep_portfolio
 from src.execution import run_paper
 
 def _key_no_tf(d: dict) -> str:
     return f"{d['symbol']}|{int(d['fast'])}|{int(d['slow'])}|{float(d['stop_loss_pct'])}"
 
+def _save_backtest_metrics(df, results: Path, backtest_dir: Path, write_csv: bool) -> None:
+    # Parquet-Partition phase=backtest; CSV nur noch als optionaler Export
+    write_phase(results, "backtest", {None: df})
+    if write_csv:
+        df.to_csv(backtest_dir / "metrics.csv", index=False)
+
 def run(phase: str):
     cfg = load_config("config/config.yaml")
     extras = load_extras("config/config.yaml")
@@ -35,26 +45,86 @@ def run(phase: str):
     oos_frac   = float(extras["forward"].get("oos_fraction", 0.60))
     n_splits   = int(extras["forward"].get("n_splits", 1))
     min_passes = int(extras["forward"].get("min_passes", n_splits))
+    single_pass = bool(extras["forward"].get("single_pass", True))
+    warm_start = bool(extras["forward"].get("warm_start", False))
     corr_cap   = float(extras["portfolio"].get("correlation_cap", 0.60))
     max_w      = float(extras["portfolio"].get("max_weight_per_strategy", 0.40))
     market_cap = float(extras["portfolio"].get("max_weight_per_market", 0.60))
+    optimizer  = str(extras["portfolio"].get("optimizer", "inverse_vol"))
     pb_days    = int(extras["paper"].get("lookback_days", 14))
+    workers    = int(extras["compute"].get("workers", 1))
+    accept_kw  = thresholds(extras["evaluation"])
+    prune      = PruneRule(accept_kw["max_mdd_floor"], accept_kw["min_trades"]) if extras["compute"].get("prune", False) else None
+    intrabar   = bool(extras["backtest"].get("intrabar_stops", False))
+    store      = open_store(extras)
+    results    = open_results(extras)
+    write_csv  = bool(extras["results"].get("csv", True))
+    daily_eq   = bool(extras["results"].get("daily_equity", True))
+    search     = extras["search"]
+    n_per_sym  = int(search.get("n_per_symbol", 20))
 
     strategies = None
+    search_df = None  # Metriken der coarse_fine-/halving-Suche -> Backtest-Phase rechnet sie nicht erneut
 
     if phase in ("data", "all"):
         dfs = load_all_markets(cfg.markets, cfg.paths.raw)
         save_processed_ohlcv(dfs, ohlcv_dir)
         print(f"[OK] Saved cleaned 1m OHLCV to: {ohlcv_dir}")
 
+    if phase == "store":
+        paths = convert_parquet(cfg.markets, ohlcv_dir)
+        print(f"[OK] Wrote mmap OHLCV store for {len(paths)} markets -> {ohlcv_dir / 'mmap'}")
+
     if phase in ("features", "all"):
         build_features_for_markets(cfg.markets, ohlcv_dir, feats_dir)
         print(f"[OK] Saved basic features to: {feats_dir}")
 
     if phase in ("search", "all"):
-        strategies = generate_ma_crossover_candidates(
-            cfg.markets, cfg.risk.risk_per_trade_target, n_per_symbol=20
-        )
+        if search.get("mode", "random") == "coarse_fine":
+            strategies, search_df, state = coarse_to_fine_search(
+                cfg.markets, cfg.risk.risk_per_trade_target,
+                lambda ss: backtest_all(ss, cfg, ohlcv_dir, workers=workers, prune=prune, intrabar=intrabar, store=store),
+                budget=int(search.get("budget", 240)), coarse_fraction=float(search.get("coarse_fraction", 0.5)),
+                top_k=int(search.get("top_k", 8)), seed=int(search.get("seed", 42)), accept_kw=accept_kw
+            )
+            _save_backtest_metrics(search_df, results, backtest_dir, write_csv)
+            save_search_state(state, backtest_dir / "search_state.json")
+            stages = ", ".join(f"{st['stage']}: {st['evaluated']} ({st['accepted']} acc)" for st in state.stages)
+            print(f"[OK] Coarse->fine search: {len(strategies)} evaluated [{stages}] -> {backtest_dir / 'metrics.csv'}")
+        elif search.get("mode", "random") == "genetic":
+            strategies, search_df, state = genetic_search(
+                cfg.markets, cfg.risk.risk_per_trade_target,
+                lambda ss: backtest_all(ss, cfg, ohlcv_dir, workers=workers, prune=prune, intrabar=intrabar, store=store),
+                budget=int(search.get("budget", 240)), population=int(search.get("population", 48)),
+                elite=int(search.get("elite", 8)), mutation_rate=float(search.get("mutation_rate", 0.2)),
+                seed=int(search.get("seed", 42)), checkpoint=Path(search.get("checkpoint", backtest_dir / "search_checkpoint.json")),
+                accept_kw=accept_kw
+            )
+            _save_backtest_metrics(search_df, results, backtest_dir, write_csv)
+            save_search_state(state, backtest_dir / "search_state.json")
+            gens = ", ".join(f"{st['stage']}: {st['accepted']}/{st['evaluated']}" for st in state.stages)
+            print(f"[OK] Genetic search: {len(strategies)} evaluated, accepted per generation [{gens}]")
+        elif search.get("mode", "random") == "halving":
+            # strategies.json / metrics.csv enthalten nur die Überlebenden (volle Historie)
+            frames: dict = {}
+            strategies, search_df, report = successive_halving(
+                generate_ma_crossover_candidates(cfg.markets, cfg.risk.risk_per_trade_target, n_per_symbol=n_per_sym),
+                lambda ss, f: backtest_recent(ss, cfg, ohlcv_dir, f, workers=workers, prune=prune if f >= 1.0 else None,
+                                              intrabar=intrabar, frames=frames, store=store),
+                lambda ss, f: slice_bar_counts(ss, frames, f),
+                min_fraction=float(search.get("halving_min_fraction", 0.125)), keep=float(search.get("halving_keep", 0.5)),
+                accept_kw=accept_kw
+            )
+            _save_backtest_metrics(search_df, results, backtest_dir, write_csv)
+            save_search_state(report, backtest_dir / "search_state.json")
+            rungs = ", ".join(f"{r['fraction']:.3g}: {r['candidates']}" for r in report["rungs"])
+            print(f"[OK] Successive halving [{rungs}] -> {len(strategies)} survivors; bar evaluations "
+                  f"{report['bar_evaluations']} vs {report['exhaustive_bar_evaluations']} exhaustive "
+                  f"(saved {report['saved_fraction']:.1%})")
+        else:
+            strategies = generate_ma_crossover_candidates(
+                cfg.markets, cfg.risk.risk_per_trade_target, n_per_symbol=n_per_sym
+            )
         (backtest_dir / "strategies.json").write_text(
             dumps([s.model_dump() for s in strategies], indent=2), encoding="utf-8"
         )
@@ -65,16 +135,26 @@ def run(phase: str):
             path = backtest_dir / "strategies.json"
             if not path.exists():
                 strategies = generate_ma_crossover_candidates(
-                    cfg.markets, cfg.risk.risk_per_trade_target, n_per_symbol=20
+                    cfg.markets, cfg.risk.risk_per_trade_target, n_per_symbol=n_per_sym
                 )
             else:
                 data = loads(path.read_text(encoding="utf-8"))
                 from src.strategy_blocks import StrategyConfig
                 strategies = [StrategyConfig(**d) for d in data]
-        df = backtest_all(strategies, cfg, ohlcv_dir)
-        out_csv = backtest_dir / "metrics.csv"
-        df.to_csv(out_csv, index=False)
-        print(f"[OK] Backtests done -> {out_csv}")
+        df = search_df if search_df is not None else \
+            backtest_all(strategies, cfg, ohlcv_dir, workers=workers, prune=prune, intrabar=intrabar, store=store,
+                         daily=daily_eq)
+        if "daily_equity" in df.columns:
+            # Tageskurven für Portfolio/Validierung; Suchläufe liefern keine -> dort rechnet build_portfolio nach
+            n_eq = save_daily_equity(results, strategies, df, cfg, ohlcv_dir, intrabar)
+            df = df.drop(columns="daily_equity")
+            print(f"[OK] Daily equity for {n_eq} strategies -> {results}")
+        _save_backtest_metrics(df, results, backtest_dir, write_csv)
+        print(f"[OK] Backtests done -> {backtest_dir / 'metrics.csv' if write_csv else results}")
+        if store is not None:
+            st = store.stats()
+            print(f"[OK] Result store: {st['hits']} hits / {st['misses']} misses, {st['entries']} entries, "
+                  f"{st['bytes'] / 2**20:.1f} MB")
         try:
             top = df.sort_values("net_return", ascending=False).head(5)
             print("\nTop 5 (net_return):")
@@ -83,11 +163,18 @@ def run(phase: str):
             print(f"Could not print top results: {e}")
 
     if phase in ("evaluate", "all"):
-        df2 = evaluate_and_save(
-            str(backtest_dir / "metrics.csv"),
-            str(backtest_dir / "strategies.json"),
-            str(backtest_dir)
-        )
+        df_bt = read_metrics(results, "backtest")
+        if df_bt is None:  # Backtest-Lauf von vor dem Parquet-Store
+            import pandas as pd
+            df_bt = pd.read_csv(backtest_dir / "metrics.csv")
+        try:
+            bt_strats = loads((backtest_dir / "strategies.json").read_text(encoding="utf-8"))
+        except Exception:
+            bt_strats = []
+        ev = evaluate_metrics(df_bt, bt_strats, **accept_kw)
+        write_phase(results, "backtest", {None: ev.metrics})
+        save_evaluation(backtest_dir, ev, csv=write_csv)
+        df2 = ev.metrics
         acc = int(df2["is_accepted"].sum())
         print(f"[OK] Evaluation done. Accepted: {acc} / {len(df2)}")
 
@@ -102,21 +189,24 @@ def run(phase: str):
         strategies = [StrategyConfig(**d) for d in acc_data]
 
         if n_splits <= 1:
-            df_fwd = forward_test_all(strategies, cfg, ohlcv_dir, oos_fraction=oos_frac)
+            df_fwd = forward_test_all(strategies, cfg, ohlcv_dir, oos_fraction=oos_frac, workers=workers,
+                                      intrabar=intrabar, warm_start=warm_start)
             (forward_dir / "strategies.json").write_text(
                 dumps([s.model_dump() for s in strategies], indent=2), encoding="utf-8"
             )
-            save_metrics_and_eval(df_fwd, forward_dir / "strategies.json", forward_dir)
+            save_metrics_and_eval(df_fwd, forward_dir / "strategies.json", forward_dir, accept_kw, results, write_csv)
             print(f"[OK] Forward-test done -> {forward_dir / 'metrics.csv'}")
         else:
             res = run_forward_multi(
                 strategies, cfg, ohlcv_dir, forward_dir,
-                total_oos_frac=oos_frac, n_splits=n_splits, min_passes=min_passes
+                total_oos_frac=oos_frac, n_splits=n_splits, min_passes=min_passes,
+                workers=workers, intrabar=intrabar, single_pass=single_pass, warm_start=warm_start,
+                thresholds=accept_kw, results_root=results, csv=write_csv
             )
             print(f"[OK] Multi-forward done ({res['splits']} splits, min_passes={res['min_passes']}) -> {res['out_dir']}")
             print(f"    per-split accepted: {res['per_split_counts']} | aggregated accepted: {res['accepted_aggregated']}")
 
-    if phase in ("portfolio", "all"):
+    if phase in ("portfolio", "sweep", "all"):
         bt_acc_f = backtest_dir / "accepted_strategies.json"
         fwd_acc_f = forward_dir / "accepted_strategies.json"
         use_forward = fwd_acc_f.exists() and fwd_acc_f.read_text(encoding="utf-8").strip() not in ("", "[]")
@@ -132,9 +222,24 @@ def run(phase: str):
             src_for_portfolio = tmp
             print(f"[OK] Using intersection Backtest&Forward -> {tmp}")
 
+    if phase == "sweep":
+        grid = extras["portfolio_sweep"]
+        table = sweep_portfolio(
+            cfg, src_for_portfolio, ohlcv_dir,
+            corr_caps=grid["correlation_cap"], max_ws=grid["max_weight_per_strategy"],
+            market_caps=grid["max_weight_per_market"], intrabar=intrabar, store=store, results_root=results,
+            optimizer=optimizer, workers=workers
+        )
+        write_phase(results, "portfolio_sweep", {None: table})
+        if write_csv:
+            table.to_csv(port_dir / "sweep.csv", index=False)
+        print(f"[OK] Portfolio sweep: {len(table)} settings -> {port_dir / 'sweep.csv' if write_csv else results}")
+
+    if phase in ("portfolio", "all"):
         res, port_eq = build_portfolio(
             cfg, src_for_portfolio, ohlcv_dir,
-            corr_cap=corr_cap, max_w=max_w, market_cap=market_cap
+            corr_cap=corr_cap, max_w=max_w, market_cap=market_cap, intrabar=intrabar, store=store,
+            results_root=results, optimizer=optimizer
         )
         if not res["selected"]:
             print("[WARN] No portfolio built (no accepted or all too correlated).")
@@ -147,12 +252,12 @@ def run(phase: str):
                 print(f"[OK] Saved equity  -> {port_dir / 'portfolio_equity.parquet'}")
 
     if phase in ("paper", "all"):
-        out = run_paper(lookback_days=pb_days)
+        out = run_paper(lookback_days=pb_days, intrabar=intrabar)
         print(f"[OK] Paper run: {out}")
 
 def main():
     p = argparse.ArgumentParser(description="Local Perp Futures Engine - pipeline")
-    p.add_argument("--phase", choices=["data","features","search","backtest","evaluate","forward","portfolio","paper","all"], default="all")
+    p.add_argument("--phase", choices=["data","store","features","search","backtest","evaluate","forward","portfolio","sweep","paper","all"], default="all")
     args = p.parse_args()
     run(args.phase)
 
@@ -2,6 +2,8 @@
 from pathlib import Path
 import json, textwrap, datetime
 import pandas as pd
+from src.config_extras import load_extras
+from src.metrics_store import open_results, read_metrics
 
 ROOT = Path(".")
 RES  = ROOT / "results"
@@ -25,6 +27,17 @@ def _maybe_df_csv(path: Path):
             pass
     return None
 
+def _maybe_metrics(phase: str, columns, csv_path: Path, split: int | None = None):
+    """Nur die benötigten Spalten aus dem Parquet-Store; Fallback: CSV-Export älterer Läufe."""
+    try:
+        df = read_metrics(open_results(load_extras()), phase, columns=columns, split=split)
+        if df is not None:
+            return df
+    except Exception:
+        pass
+    df = _maybe_df_csv(csv_path)
+    return None if df is None else df[[c for c in columns if c in df.columns]]
+
 def _fmt_pct(x):
     try:
         return f"{100*float(x):.2f}%"
@@ -77,11 +90,12 @@ def main():
     md.append(f"# XY – Statusreport\n\n_Generiert: {now}_\n")
 
     # Backtest
-    bt_metrics = _maybe_df_csv(BT / "metrics.csv")
+    top_cols = ["symbol","timeframe","fast","slow","stop_loss_pct","trades","net_return","max_drawdown","avg_monthly_return","worst_month"]
+    bt_metrics = _maybe_metrics("backtest", top_cols, BT / "metrics.csv")
     if bt_metrics is not None and not bt_metrics.empty:
         top = bt_metrics.sort_values("net_return", ascending=False).head(10)
         md.append("## Backtest – Top 10 (net_return)\n")
-        md.append(_to_md(top[["symbol","timeframe","fast","slow","stop_loss_pct","trades","net_return","max_drawdown","avg_monthly_return","worst_month"]]))
+        md.append(_to_md(top[top_cols]))
         md.append("")
 
     # Evaluate Backtest
@@ -93,7 +107,7 @@ def main():
     md.append(f"- Forward (aggregated) accepted: **{len(fw_acc)}**\n")
     splits = []
     for p in sorted(FW.glob("split_*")):
-        df = _maybe_df_csv(p / "accepted_metrics.csv")
+        df = _maybe_metrics("forward", ["is_accepted"], p / "accepted_metrics.csv", split=int(p.name.split("_")[1]))
         if df is not None:
             cnt = int(df[df.get("is_accepted", False) == True].shape[0])
             splits.append((p.name, cnt))
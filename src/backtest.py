@@ -1,12 +1,19 @@
 ﻿from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+import math, os
 import pandas as pd
 import numpy as np
 from .strategy_blocks import StrategyConfig
 from .config_loader import GlobalConfig
+from .bar_cache import BAR_CACHE, SOURCE_ATTR, frame_key, ohlcv_fingerprint
+from .indicators import IndicatorBank, get_indicator_bank
+from .shared_frames import SharedFrames, attach_frames
+from .ohlcv_store import load_store
+from .result_store import ResultStore, cached_backtest_one, result_key
 
-def _load_ohlcv(symbol: str, ohlcv_dir: Path) -> pd.DataFrame:
+def _read_parquet_ohlcv(symbol: str, ohlcv_dir: Path) -> pd.DataFrame:
     df = pd.read_parquet(ohlcv_dir / f"{symbol}_1m.parquet")
     cols = {"open","high","low","close","volume"}
     missing = cols - set(df.columns)
@@ -23,12 +30,36 @@ def _load_ohlcv(symbol: str, ohlcv_dir: Path) -> pd.DataFrame:
         df["funding"] = 0.0
     return df
 
+def _load_ohlcv(symbol: str, ohlcv_dir: Path) -> pd.DataFrame:
+    """
+    1m-OHLCV + Funding eines Symbols. Liegt ein aktueller mmap-Store vor (ohlcv_store,
+    main.py --phase store), wird er ohne Kopie gemappt, sonst werden die Parquets gelesen.
+    Store-Frames sind read-only.
+    """
+    df = load_store(symbol, ohlcv_dir)
+    if df is None:
+        df = _read_parquet_ohlcv(symbol, ohlcv_dir)
+    df.attrs[SOURCE_ATTR] = (symbol, ohlcv_fingerprint(symbol, ohlcv_dir, df.index[-1] if len(df) else None))
+    return df
+
 def _resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
     if timeframe == "1m": return df
     rule = {"5m":"5min","15m":"15min"}[timeframe]
     agg  = {"open":"first","high":"max","low":"min","close":"last","volume":"sum","funding":"sum"}
     return df.resample(rule).agg(agg).dropna()
 
+def _resample_cached(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    _resample_ohlcv über den prozessweiten BAR_CACHE. Schlüssel: Symbol, Timeframe,
+    Fingerprint der Quell-Parquets und Slice-Grenzen (Länge, erster/letzter Timestamp).
+    Gilt für Frames aus _load_ohlcv und deren Zeilen-Slices; Frames ohne Quell-Tag
+    werden direkt resampled. Ergebnis ist geteilt -> nicht verändern.
+    """
+    key = frame_key(df)
+    if timeframe == "1m" or key is None:
+        return _resample_ohlcv(df, timeframe)
+    return BAR_CACHE.get_or_build((key, timeframe), lambda: _resample_ohlcv(df, timeframe))
+
 def _max_drawdown(equity: pd.Series) -> float:
     peak = equity.cummax(); dd = equity/peak - 1.0
     return float(dd.min()) if len(dd) else 0.0
@@ -40,6 +71,7 @@ def _monthly_stats(equity: pd.Series) -> Dict[str, float]:
             "worst_month": float(m.min()) if len(m) else 0.0}
 
 def _atr(high: pd.Series, low: pd.Series, close: pd.Series, n: int) -> pd.Series:
+    """pandas-ATR, nur für engine="reference"; alle anderen Pfade nutzen indicators.atr."""
     prev_close = close.shift(1)
     tr = pd.concat([
         (high - low).abs(),
@@ -48,8 +80,9 @@ def _atr(high: pd.Series, low: pd.Series, close: pd.Series, n: int) -> pd.Series
     ], axis=1).max(axis=1)
     return tr.rolling(int(n), min_periods=int(n)).mean()
 
-def backtest_one(df: pd.DataFrame, strat: StrategyConfig, starting_capital: float, max_leverage: float) -> Tuple[Dict, pd.Series]:
-    df_tf = _resample_ohlcv(df, strat.timeframe)
+ENGINES = ("array", "reference")
+
+def _entry_signals(df_tf: pd.DataFrame, strat: StrategyConfig) -> Tuple[pd.Series, pd.Series]:
     close = df_tf["close"].astype(float)
     high = df_tf["high"].astype(float)
     low  = df_tf["low"].astype(float)
@@ -75,10 +108,392 @@ def backtest_one(df: pd.DataFrame, strat: StrategyConfig, starting_capital: floa
 
     long_entry  = cross_up   & trend_ok_long  & vol_ok
     short_entry = cross_down & trend_ok_short & vol_ok
+    return long_entry, short_entry
 
-    equity = float(starting_capital); equity_track = []
+# Equity-Aufzeichnung: jede Bar, letzte Bar je Tag oder keine Kurve (nur Metriken)
+EQUITY_MODES = ("full", "daily", "none")
+
+class SimResult(NamedTuple):
+    equity: np.ndarray      # "full": jede Bar; sonst nur an den Markierungen (marks)
+    trades: int
+    first: float            # Equity nach der ersten Bar (Basis für net_return)
+    last: float
+    max_drawdown: float     # online über alle Bars, bitgleich zu _max_drawdown
+    pruned_at: int = -1     # Bar, nach der abgebrochen wurde (-1 = bis zum Ende gerechnet)
+    events: int = 0         # Anzahl in log geschriebener Entry-/Exit-Events (Entries = trades)
+    stats: List[Dict[str, float]] | None = None  # StreamStats.finish je Strategie (None ohne Schedule)
+
+class PruneRule(NamedTuple):
+    """
+    Akzeptanzgrenzen für vorzeitigen Abbruch (opt-in). Eine Strategie wird gestoppt, sobald sie
+    sicher durchfällt: Drawdown unter max_mdd_floor oder selbst mit einem Trade je verbleibender
+    Entry-Signal-Bar nicht mehr min_trades erreichbar. None = Kriterium aus.
+    """
+    max_mdd_floor: float | None = None
+    min_trades: int | None = None
+
+def _period_ends(index: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    """Positionen der jeweils letzten Bar je Tag ("D") bzw. Monat ("M") in der Zeitzone des Index."""
+    if not len(index):
+        return np.empty(0, dtype=np.int64)
+    if freq == "D":
+        key = index.normalize().asi8
+    else:
+        key = np.asarray(index.year, dtype=np.int64) * 12 + np.asarray(index.month, dtype=np.int64)
+    return np.append(np.flatnonzero(key[1:] != key[:-1]), len(index) - 1).astype(np.int64)
+
+def _equity_marks(index: pd.DatetimeIndex, equity: str) -> np.ndarray | None:
+    """Aufzuzeichnende Bar-Positionen: None = jede Bar; "daily" Tagesenden; "none" keine (Metriken laufen online)."""
+    if equity not in EQUITY_MODES:
+        raise ValueError(f"unknown equity mode {equity!r}; expected one of {EQUITY_MODES}")
+    if equity == "full":
+        return None
+    return _period_ends(index, "D") if equity == "daily" else np.empty(0, dtype=np.int64)
+
+class Schedule(NamedTuple):
+    """Tagesenden für StreamStats: Iteration -> [(Spalten oder None = alle lebenden, Monatsnummer oder -1)]."""
+    at: Dict[int, List[Tuple[np.ndarray | None, int]]]
+    month: np.ndarray       # Monatsnummer (Jahr*12+Monat) je Bar, Form (bars, lanes)
+    months: int             # Kalendermonate von erstem bis letztem Monat (Puffergröße)
+
+def _schedule(indexes: Sequence[pd.DatetimeIndex], cols: Sequence[np.ndarray | None] | None = None) -> Schedule:
+    """Schedule für eine Bar-Reihe oder mehrere Lanes (cols[s] = Spalten der Lane s); jedes Monatsende ist auch Tagesende."""
+    cols = [None] * len(indexes) if cols is None else cols
+    n = max((len(ix) for ix in indexes), default=0)
+    at: Dict[int, List[Tuple[np.ndarray | None, int]]] = {}
+    month = np.zeros((n, len(indexes)), dtype=np.int64)
+    for s, (ix, c) in enumerate(zip(indexes, cols)):
+        if not len(ix):
+            continue
+        mno = np.asarray(ix.year, dtype=np.int64) * 12 + np.asarray(ix.month, dtype=np.int64)
+        month[:len(ix), s] = mno; month[len(ix):, s] = mno[-1]
+        mends = set(_period_ends(ix, "M").tolist())
+        for d in _period_ends(ix, "D").tolist():
+            at.setdefault(d, []).append((c, int(mno[d]) if d in mends else -1))
+    return Schedule(at, month, int(month.max() - month.min() + 1) if n else 0)
+
+# Tagesrenditen -> Jahreswerte (Krypto handelt an 365 Tagen)
+_ANNUAL = math.sqrt(365.0)
+
+def _daily_ratios(s1: np.ndarray, s2: np.ndarray, sd: np.ndarray, nd: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sharpe (Stichproben-Std) und Sortino (Downside-Abweichung) aus den Summen der Tagesrenditen; 0.0, wo undefiniert."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s1 / nd
+        var = (s2 - s1 * mean) / (nd - 1)
+        sharpe = np.where((nd > 1) & (var > 0), mean / np.sqrt(var) * _ANNUAL, 0.0)
+        sortino = np.where((nd > 0) & (sd > 0), mean / np.sqrt(sd / nd) * _ANNUAL, 0.0)
+    return sharpe, sortino
+
+class StreamStats:
+    """
+    Kennzahlen je Spalte, vom Kernel an Tages-/Monatsenden fortgeschrieben – ohne Equity-Kurve.
+    Monatsrenditen wie _monthly_stats (pct_change füllt Lücken-Monate auf -> Rendite 0, die erste entfällt),
+    ein Wert je Monat im Puffer und am Ende zeilenweise summiert wie Series.mean() -> bitgleich.
+    Tagesrenditen nur als Summen (Sharpe/Sortino); held zählt Bars, die mit offener Position enden.
+    """
+    def __init__(self, k: int, months: int):
+        self.mprev = np.zeros(k); self.mlast = np.full(k, -1, dtype=np.int64)
+        self.R = np.zeros((k, max(months - 1, 1))); self.nm = np.zeros(k, dtype=np.int64)
+        self.dprev = np.full(k, np.nan)
+        self.s1 = np.zeros(k); self.s2 = np.zeros(k); self.sd = np.zeros(k); self.nd = np.zeros(k, dtype=np.int64)
+        self.held = np.zeros(k, dtype=np.int64)
+
+    def day_end(self, cols: np.ndarray, eq: np.ndarray) -> None:
+        p = self.dprev[cols]; has = ~np.isnan(p)
+        if has.any():
+            c = cols[has]; r = eq[has] / p[has] - 1.0; d = np.minimum(r, 0.0)
+            self.s1[c] += r; self.s2[c] += r * r; self.sd[c] += d * d; self.nd[c] += 1
+        self.dprev[cols] = eq
+
+    def month_end(self, cols: np.ndarray, eq: np.ndarray, month: np.ndarray | int) -> None:
+        month = np.broadcast_to(np.asarray(month, dtype=np.int64), cols.shape)
+        last = self.mlast[cols]; has = last >= 0
+        if has.any():
+            c = cols[has]; at = self.nm[c] + (month[has] - last[has] - 1)  # Lücken-Monate bleiben 0.0
+            self.R[c, at] = eq[has] / self.mprev[c] - 1.0; self.nm[c] = at + 1
+        self.mprev[cols] = eq; self.mlast[cols] = month
+
+    def finish(self, bars: np.ndarray) -> List[Dict[str, float]]:
+        """Kennzahlen je Spalte; bars = gerechnete Bars je Spalte (Nenner der Exposure)."""
+        k = len(self.nm); avg = np.zeros(k); worst = np.zeros(k)
+        for m in np.unique(self.nm).tolist():
+            if m:
+                c = np.flatnonzero(self.nm == m); R = self.R[c, :m]  # Kopie, Zeilen zusammenhängend
+                avg[c] = R.sum(axis=1) / m; worst[c] = R.min(axis=1)
+        sharpe, sortino = _daily_ratios(self.s1, self.s2, self.sd, self.nd)
+        bars = np.asarray(bars)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            exposure = np.where(bars > 0, self.held / bars, 0.0)
+        return [{"avg_monthly_return": a, "worst_month": w, "exposure": e, "sharpe": sh, "sortino": so}
+                for a, w, e, sh, so in zip(avg.tolist(), worst.tolist(), exposure.tolist(), sharpe.tolist(), sortino.tolist())]
+
+# Trade-Log: Entries/Exits schreibt der Kernel, Funding wird nachträglich vektoriell ergänzt.
+ACTIONS = ("entry_long", "entry_short", "exit_signal_long", "exit_signal_short",
+           "exit_stop_long", "exit_stop_short", "funding")
+_NAN = float("nan")
+
+class TradeLog(NamedTuple):
+    """
+    Vorab allokierte Spalten je Trade (Zeile k = k-ter Trade): Entry e_*, Exit x_*. Der Kernel schreibt
+    je Event nur, was sich nicht nachrechnen lässt; Preise, Stop, Fees und PnL rechnet _trade_frame
+    mit denselben Operationen aus close/open und den Strategie-Parametern nach.
+    x_minute/x_fund_cf/x_fund_eq nur bei Intrabar-Stops: 1m-Zeile des Stops, Funding der Minuten davor,
+    Equity danach (sonst -1 / 0 / NaN).
+    """
+    e_bar: np.ndarray
+    e_pos: np.ndarray
+    e_qty: np.ndarray
+    e_equity: np.ndarray
+    e_risk: np.ndarray
+    x_bar: np.ndarray
+    x_stop: np.ndarray
+    x_equity: np.ndarray
+    x_minute: np.ndarray
+    x_fund_cf: np.ndarray
+    x_fund_eq: np.ndarray
+
+def _trade_log(n: int) -> TradeLog:
+    """Leeres Log für höchstens n Trades (n >= Signal-Bars)."""
+    return TradeLog(np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int8), np.empty(n), np.empty(n), np.empty(n),
+                    np.empty(n, dtype=np.int64), np.empty(n, dtype=bool), np.empty(n),
+                    np.full(n, -1, dtype=np.int64), np.zeros(n), np.full(n, np.nan))
+
+_TF_DELTA = {"5m": pd.Timedelta(minutes=5), "15m": pd.Timedelta(minutes=15)}
+
+class Intrabar(NamedTuple):
+    """
+    1m-Arrays plus 1m-Zeilenbereich [start, end) je Timeframe-Bar für Intrabar-Stops.
+    fund_pre[m]: Funding der Minuten [start, m) der Bar, in der m liegt (der Reihe nach summiert wie
+    np.cumsum(funding[start:m])[-1]) -> Funding bis zur Stop-Minute ohne Summe je Stop.
+    """
+    start: np.ndarray
+    end: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    funding: np.ndarray
+    index: pd.DatetimeIndex
+    fund_pre: np.ndarray
+
+def _intrabar(df: pd.DataFrame, df_tf: pd.DataFrame, timeframe: str) -> Intrabar | None:
+    """Zuordnung Timeframe-Bar -> 1m-Zeilen (Label = linke Kante, wie resample). None für 1m."""
+    if timeframe not in _TF_DELTA:
+        return None
+    ix = df.index
+    start = ix.searchsorted(df_tf.index, side="left")
+    end = ix.searchsorted(df_tf.index + _TF_DELTA[timeframe], side="left")
+    col = lambda c: df[c].to_numpy(dtype=np.float64) if c in df.columns else np.zeros(len(df))
+    start = start.astype(np.int64); end = end.astype(np.int64); funding = col("funding")
+    # Präfix je Bar: Schritt t addiert die t-te Minute aller Bars, die so lang sind (<= 15 Schritte)
+    pre = np.zeros(len(df)); length = end - start
+    for t in range(1, int(length.max(initial=0))):
+        rows = start[length > t] + t
+        pre[rows] = pre[rows - 1] + funding[rows - 1]
+    return Intrabar(start, end, col("open"), col("high"), col("low"), col("close"), funding, ix.rename(None), pre)
+
+def _intrabar_stop(ib: Intrabar, i: int, side: int, stop: float, qty: float) -> Tuple[int, float, float]:
+    """
+    Erste 1m-Zeile der Bar i, die den Stop berührt (Schleife über die <= 15 Minuten, ohne
+    Zwischen-Arrays), Fill (Gap: Open jenseits des Stops -> Open) und Funding-Cashflow der vollen
+    Minuten davor (aus ib.fund_pre). Die Berührung existiert, weil high/low der Bar Max/Min derselben
+    1m-Zeilen sind; sonst (nur bei NaN denkbar) wie argmax die erste Minute.
+    """
+    s = int(ib.start[i]); e = int(ib.end[i])
+    if side == 1:
+        low = ib.low
+        for m in range(s, e):
+            if low[m] <= stop:
+                break
+        else:
+            m = s
+        fill = min(float(ib.open[m]), stop)
+    else:
+        high = ib.high
+        for m in range(s, e):
+            if high[m] >= stop:
+                break
+        else:
+            m = s
+        fill = max(float(ib.open[m]), stop)
+    cf = 0.0
+    if m > s:
+        rate = float(ib.fund_pre[m])
+        notional = float(ib.close[m - 1]) * qty
+        cf = -notional*rate if side == 1 else +notional*rate
+    return m, fill, cf
+
+def _recorded_positions(marks: np.ndarray | None, n_bars: int, cut: int = -1) -> np.ndarray:
+    """Bar-Positionen der vom Kernel aufgezeichneten Equity (bei Abbruch: Marken bis cut plus cut selbst)."""
+    if marks is None:
+        return np.arange(n_bars if cut < 0 else cut + 1)
+    if cut < 0:
+        return marks
+    p = marks[marks <= cut]
+    return p if len(p) and p[-1] == cut else np.append(p, cut)
+
+def _simulate(close: np.ndarray, high: np.ndarray, low: np.ndarray, funding: np.ndarray,
+              long_entry: np.ndarray, short_entry: np.ndarray, strat: StrategyConfig,
+              starting_capital: float, max_leverage: float, marks: np.ndarray | None = None,
+              prune: PruneRule | None = None, log: TradeLog | None = None,
+              intrabar: Intrabar | None = None, days: Schedule | None = None) -> SimResult:
+    """
+    Positions-/Stop-/Fee-/Funding-Zustandsmaschine auf flachen Arrays (ein Wert je Bar).
+    Gleiche Rechenreihenfolge wie der Referenzpfad -> bitgleiche Equity.
+    Equity landet in einem vorab allokierten Array: jede Bar (marks=None) oder nur an den
+    Positionen aus marks (aufsteigend). Peak/Drawdown laufen online mit.
+    Mit prune endet die Schleife nach der ersten Bar, ab der die Strategie sicher durchfällt;
+    equity enthält dann die bis dahin aufgezeichneten Werte plus die Equity der Abbruch-Bar
+    (Positionen: _recorded_positions).
+    log: TradeLog (_trade_log(Signal-Bars)); Entries und Exits werden je Trade-Zeile in die
+    Spalten eingetragen, SimResult.events = Anzahl Events.
+    intrabar: Stops innerhalb einer 5m/15m-Bar gegen die 1m-Bars auflösen (erste berührende Minute,
+    Gap-Fill, Funding bis zum Stop). Ohne Stop-Treffer identisch zum Bar-Modus.
+    days: Schedule der Bars -> SimResult.stats (Monats-/Tageskennzahlen, Exposure) aus StreamStats,
+    bei Abbruch bis einschließlich der Abbruch-Bar.
+    """
+    n = len(close)
+    equity = float(starting_capital)
+    out = np.empty(n if marks is None else len(marks), dtype=np.float64)
+    mk = [] if marks is None else marks.tolist()
+    r = 0; nxt = mk[0] if mk else -1
+    peak = mdd = first = 0.0
     pos = 0; qty = 0.0; entry_price = 0.0; stop_price = 0.0
     fee_rate = strat.fee_rate; slip = strat.slippage; trades = 0
+    risk_fraction = strat.risk_fraction; sl_pct = strat.stop_loss_pct
+    allow_long = strat.direction in ("both","long"); allow_short = strat.direction in ("both","short")
+    floor = -math.inf if prune is None or prune.max_mdd_floor is None else float(prune.max_mdd_floor)
+    need = 0 if prune is None or prune.min_trades is None else int(prune.min_trades)
+    rem: List[int] = []
+    if need:
+        # Signal-Bars nach Bar i = obere Schranke für weitere Entries
+        sig = (np.asarray(long_entry) & allow_long) | (np.asarray(short_entry) & allow_short)
+        rem = (int(sig.sum()) - np.cumsum(sig)).tolist()
+    pruning = prune is not None and (need > 0 or floor > -math.inf)
+    cut = -1
+    ne = 0; entry_bar = -1
+    st = None if days is None else StreamStats(1, days.months)
+    at = {} if days is None else days.at
+    one = np.zeros(1, dtype=np.int64); held = 0
+    if log is not None:
+        e_bar, e_pos, e_qty, e_equity, e_risk, x_bar, x_stop, x_equity, x_minute, x_fund_cf, x_fund_eq = log
+
+    # tolist() -> native floats/bools, deutlich schneller als Element-Zugriff auf ndarrays
+    for i, (price, hi, lo, fund, le, se) in enumerate(zip(close.tolist(), high.tolist(), low.tolist(), funding.tolist(),
+                                                          long_entry.tolist(), short_entry.tolist())):
+        # Exits
+        if pos==1:
+            if lo <= stop_price or se:
+                hit = lo <= stop_price
+                if hit and intrabar is not None:
+                    mi, fill, fcf = _intrabar_stop(intrabar, i, 1, stop_price, qty)
+                    equity += fcf; feq = equity
+                    exit_px = fill * (1 - slip)
+                else:
+                    mi = -1; fcf = 0.0; feq = _NAN
+                    exit_px = (stop_price if hit else price) * (1 - slip)
+                pnl=(exit_px-entry_price)*qty; fee=abs(exit_px*qty)*fee_rate
+                equity += pnl - fee
+                if log is not None:
+                    k = trades - 1
+                    x_bar[k] = i; x_stop[k] = hit; x_equity[k] = equity
+                    if mi >= 0:
+                        x_minute[k] = mi; x_fund_cf[k] = fcf; x_fund_eq[k] = feq
+                    ne += 1
+                pos=0; qty=0.0; held += i - entry_bar
+        elif pos==-1:
+            if hi >= stop_price or le:
+                hit = hi >= stop_price
+                if hit and intrabar is not None:
+                    mi, fill, fcf = _intrabar_stop(intrabar, i, -1, stop_price, qty)
+                    equity += fcf; feq = equity
+                    exit_px = fill * (1 + slip)
+                else:
+                    mi = -1; fcf = 0.0; feq = _NAN
+                    exit_px = (stop_price if hit else price) * (1 + slip)
+                pnl=(entry_price-exit_px)*qty; fee=abs(exit_px*qty)*fee_rate
+                equity += pnl - fee
+                if log is not None:
+                    k = trades - 1
+                    x_bar[k] = i; x_stop[k] = hit; x_equity[k] = equity
+                    if mi >= 0:
+                        x_minute[k] = mi; x_fund_cf[k] = fcf; x_fund_eq[k] = feq
+                    ne += 1
+                pos=0; qty=0.0; held += i - entry_bar
+
+        # Entries
+        if pos==0:
+            risk_amt = equity*risk_fraction
+            if risk_amt>0:
+                if allow_long and le:
+                    entry=price*(1+slip); stop=entry*(1-sl_pct); dist=entry-stop
+                    if dist>0:
+                        q = min(risk_amt*entry/dist, equity*max_leverage)/entry
+                        if q>0:
+                            fee=abs(entry*q)*fee_rate; equity-=fee
+                            pos=1; qty=q; entry_price=entry; stop_price=stop; trades+=1; entry_bar = i
+                            if log is not None:
+                                k = trades - 1
+                                e_bar[k] = i; e_pos[k] = 1; e_qty[k] = q; e_equity[k] = equity; e_risk[k] = risk_amt
+                                ne += 1
+                elif allow_short and se:
+                    entry=price*(1-slip); stop=entry*(1+sl_pct); dist=stop-entry
+                    if dist>0:
+                        q = min(risk_amt*entry/dist, equity*max_leverage)/entry
+                        if q>0:
+                            fee=abs(entry*q)*fee_rate; equity-=fee
+                            pos=-1; qty=q; entry_price=entry; stop_price=stop; trades+=1; entry_bar = i
+                            if log is not None:
+                                k = trades - 1
+                                e_bar[k] = i; e_pos[k] = -1; e_qty[k] = q; e_equity[k] = equity; e_risk[k] = risk_amt
+                                ne += 1
+
+        # Funding
+        if fund!=0.0 and pos!=0 and qty>0:
+            notional=price*qty
+            equity += (-notional*fund) if pos==1 else (+notional*fund)
+
+        # Aufzeichnung + Drawdown (wie equity/cummax - 1, Minimum)
+        if marks is None:
+            out[i] = equity
+        elif i == nxt:
+            out[r] = equity; r += 1; nxt = mk[r] if r < len(mk) else -1
+        if i == 0:
+            first = peak = equity
+        elif equity >= peak:
+            peak = equity
+        else:
+            dd = equity/peak - 1.0
+            if dd < mdd: mdd = dd
+        if i in at:
+            mno = at[i][0][1]; eq1 = np.array([equity])
+            st.day_end(one, eq1)
+            if mno >= 0:
+                st.month_end(one, eq1, mno)
+        if pruning and (mdd < floor or (need and trades + rem[i] < need)):
+            cut = i
+            if st is not None:
+                _stream_cut(st, days, i, one, np.array([equity]), None)
+            break
+
+    if pos in (1, -1):
+        held += (cut + 1 if cut >= 0 else n) - entry_bar
+    stats = None
+    if st is not None:
+        st.held[0] = held
+        stats = st.finish(np.array([cut + 1 if cut >= 0 else n]))
+    if cut >= 0:
+        out = out[:cut + 1] if marks is None else out[:r]
+        if marks is not None and (not r or mk[r - 1] != cut):
+            out = np.append(out, equity)
+    return SimResult(out, trades, first, equity if n else 0.0, mdd, cut, ne, stats)
+
+def _run_reference(df_tf: pd.DataFrame, long_entry: pd.Series, short_entry: pd.Series, strat: StrategyConfig,
+                   starting_capital: float, max_leverage: float) -> Tuple[pd.Series, int, int]:
+    """Ursprünglicher iterrows-Pfad; bleibt als Referenz zum Diffen gegen die Array-Engine. (Equity, Trades, Bars mit Position)"""
+    equity = float(starting_capital); equity_track = []
+    pos = 0; qty = 0.0; entry_price = 0.0; stop_price = 0.0
+    fee_rate = strat.fee_rate; slip = strat.slippage; trades = 0; held = 0
 
     for t, row in df_tf.iterrows():
         price=float(row["close"]); hi=float(row["high"]); lo=float(row["low"]); fund=float(row.get("funding",0.0))
@@ -119,20 +534,803 @@ def backtest_one(df: pd.DataFrame, strat: StrategyConfig, starting_capital: floa
             notional=price*qty
             equity += (-notional*fund) if pos==1 else (+notional*fund)
 
-        equity_track.append((t, equity))
+        equity_track.append((t, equity)); held += pos != 0
 
     eq = pd.Series({t:v for t,v in equity_track}).sort_index()
+    return eq, trades, held
+
+def _daily_stats(equity: pd.Series) -> Dict[str, float]:
+    """Sharpe/Sortino aus den Renditen zwischen aufeinanderfolgenden Tagesenden, Summen der Reihe nach wie StreamStats."""
+    v = equity.to_numpy(dtype=np.float64)[_period_ends(equity.index, "D")].tolist()
+    s1 = s2 = sd = 0.0
+    for p, x in zip(v, v[1:]):
+        r = x/p - 1.0; d = min(r, 0.0)
+        s1 += r; s2 += r*r; sd += d*d
+    sharpe, sortino = _daily_ratios(np.array([s1]), np.array([s2]), np.array([sd]), np.array([max(len(v) - 1, 0)]))
+    return {"sharpe": float(sharpe[0]), "sortino": float(sortino[0])}
+
+def _metrics(strat: StrategyConfig, trades: int, eq: pd.Series, held: int) -> Dict:
     metrics = {"symbol":strat.symbol,"timeframe":strat.timeframe,"fast":strat.fast,"slow":strat.slow,
                "stop_loss_pct":strat.stop_loss_pct,"trades":trades,
                "net_return": float(eq.iloc[-1]/eq.iloc[0]-1.0) if len(eq)>1 else 0.0,
-               "max_drawdown": _max_drawdown(eq)}
+               "max_drawdown": _max_drawdown(eq), "start_equity": float(eq.iloc[0]) if len(eq) else 0.0}
     metrics.update(_monthly_stats(eq))
-    return metrics, eq
+    metrics["exposure"] = held/len(eq) if len(eq) else 0.0
+    metrics.update(_daily_stats(eq))
+    return metrics
+
+def _ohlc_arrays(df_tf: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """close, high, low, funding als float64-Arrays (Funding 0, falls die Spalte fehlt)."""
+    close = df_tf["close"].to_numpy(dtype=np.float64)
+    high  = df_tf["high"].to_numpy(dtype=np.float64)
+    low   = df_tf["low"].to_numpy(dtype=np.float64)
+    fund  = df_tf["funding"].to_numpy(dtype=np.float64) if "funding" in df_tf.columns else np.zeros(len(df_tf))
+    return close, high, low, fund
+
+def _sim_metrics(strat: StrategyConfig, sim: SimResult, n_bars: int, prune: PruneRule | None = None) -> Dict:
+    """
+    Wie _metrics, aber aus den Online-Werten des Kernels (sim.stats, Kernel mit days gerechnet).
+    Mit prune zusätzlich "pruned" und "pruned_at" (Bar-Index im Timeframe, -1 = nicht gestoppt);
+    Kennzahlen gestoppter Strategien beziehen sich auf den Lauf bis zum Abbruch.
+    """
+    metrics = {"symbol":strat.symbol,"timeframe":strat.timeframe,"fast":strat.fast,"slow":strat.slow,
+               "stop_loss_pct":strat.stop_loss_pct,"trades":int(sim.trades),
+               "net_return": float(sim.last/sim.first-1.0) if n_bars>1 else 0.0,
+               "max_drawdown": float(sim.max_drawdown) if n_bars else 0.0,
+               "start_equity": float(sim.first) if n_bars else 0.0}
+    metrics.update(sim.stats[0])
+    if prune is not None:
+        metrics.update({"pruned": bool(sim.pruned_at >= 0), "pruned_at": int(sim.pruned_at)})
+    return metrics
+
+def backtest_one(df: pd.DataFrame, strat: StrategyConfig, starting_capital: float, max_leverage: float,
+                 engine: str = "array", equity: str = "full", prune: PruneRule | None = None,
+                 intrabar: bool = False) -> Tuple[Dict, pd.Series]:
+    """
+    engine="array":     Zustandsmaschine über zusammenhängende NumPy-Arrays, SMAs aus der IndicatorBank (Standard).
+    engine="reference": alter Pfad (pandas-Rolling + iterrows), nur zum Gegenprüfen.
+    equity="full":  Equity je Bar; "daily": letzte Bar je Tag (reicht für Tages-/Monatsrenditen);
+    "none": leere Serie, nur Metriken (keine Equity-Aufzeichnung). Die Metriken sind in allen Modi identisch.
+    prune: vorzeitiger Abbruch nach PruneRule (nur engine="array"); die Equity endet dann beim Abbruch.
+    intrabar: Stop-Treffer bei 5m/15m gegen die 1m-Bars auflösen (nur engine="array"; bei 1m ohne Wirkung).
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}; expected one of {ENGINES}")
+    if prune is not None and engine != "array":
+        raise ValueError("pruning is only supported by engine='array'")
+    if intrabar and engine != "array":
+        raise ValueError("intrabar stops are only supported by engine='array'")
+    df_tf = _resample_cached(df, strat.timeframe)
+    index = df_tf.index.rename(None)
+    marks = _equity_marks(index, equity)
+
+    if engine == "reference":
+        long_entry, short_entry = _entry_signals(df_tf, strat)
+        eq, trades, held = _run_reference(df_tf, long_entry, short_entry, strat, starting_capital, max_leverage)
+        m = _metrics(strat, trades, eq, held)
+        if equity == "none":
+            return m, pd.Series(dtype=np.float64)
+        return m, eq if marks is None else eq.iloc[marks]
+
+    close, high, low, fund = _ohlc_arrays(df_tf)
+    L, S = _entry_signal_matrix(df_tf, [strat])
+    ib = _intrabar(df, df_tf, strat.timeframe) if intrabar else None
+    sim = _simulate(close, high, low, fund, L[:, 0], S[:, 0], strat, starting_capital, max_leverage,
+                    marks=marks, prune=prune, intrabar=ib, days=_schedule([index]))
+    m = _sim_metrics(strat, sim, len(index), prune)
+    if equity == "none":
+        return m, pd.Series(dtype=np.float64)
+    return m, pd.Series(sim.equity, index=index[_recorded_positions(marks, len(index), sim.pruned_at)])
+
+def _ns_index(ns: np.ndarray, tz) -> pd.DatetimeIndex:
+    # int64-ns (UTC, NaT = int64-Minimum) -> DatetimeIndex in tz, ohne Timestamp-Objekte je Zeile
+    ix = pd.DatetimeIndex(ns.view("datetime64[ns]"))
+    return ix if tz is None else ix.tz_localize("UTC").tz_convert(tz)
+
+def _trade_frame(log: TradeLog, trades: int, exits: int, close: np.ndarray, funding: np.ndarray, n_bars: int,
+                 index: pd.DatetimeIndex, strat: StrategyConfig, ib: Intrabar | None = None) -> pd.DataFrame:
+    """
+    Kernel-Log -> DataFrame im trades.csv-Format (analyze_trades.py), einmal am Ende.
+    Funding-Zeilen entstehen vektoriell aus den Halteintervallen [Entry-Bar, Exit-Bar) mit
+    derselben Rechnung wie im Kernel. Zwischen Entry und Exit ändert nur Funding die Equity ->
+    Funding-Equity = Entry-Equity + kumulierte Cashflows des Trades (ohne Equity-Kurve).
+    Reihenfolge je Bar: Exit, Entry, Funding. Events wechseln sich je Trade ab (Entry, Exit), Funding
+    ist nach Bar sortiert; beide werden per searchsorted zusammengeführt, Spalten per Zuweisung
+    an die Zielpositionen.
+    Intrabar-Stops: Exit-Zeit = 1m-Zeitstempel, davor eine Funding-Zeile für die Minuten bis zum Stop.
+    """
+    e_bar = log.e_bar[:trades]; e_pos = log.e_pos[:trades]; e_qty = log.e_qty[:trades]
+    x_bar = log.x_bar[:exits]; x_pos = e_pos[:exits]; x_qty = e_qty[:exits]; minute = log.x_minute[:exits]
+    # Preise/Stop/Fees/PnL wie im Kernel (gleiche Operationen je Element -> bitgleich)
+    slip = strat.slippage; fee_rate = strat.fee_rate; sl_pct = strat.stop_loss_pct
+    long_e = e_pos == 1; long_x = x_pos == 1
+    e_px = np.where(long_e, close[e_bar] * (1 + slip), close[e_bar] * (1 - slip))
+    e_stop = np.where(long_e, e_px * (1 - sl_pct), e_px * (1 + sl_pct))
+    e_fee = np.abs(e_px * e_qty) * fee_rate
+    x_entry = e_px[:exits]; x_stop = e_stop[:exits]
+    base = np.where(log.x_stop[:exits], x_stop, close[x_bar])
+    if ib is not None:  # Intrabar-Stop: Fill = Open der Stop-Minute, falls jenseits des Stops
+        o = ib.open[np.maximum(minute, 0)]
+        base = np.where(minute >= 0, np.where(long_x, np.minimum(o, x_stop), np.maximum(o, x_stop)), base)
+    x_px = np.where(long_x, base * (1 - slip), base * (1 + slip))
+    x_pnl = np.where(long_x, (x_px - x_entry) * x_qty, (x_entry - x_px) * x_qty)
+    x_fee = np.abs(x_px * x_qty) * fee_rate
+    b1 = np.append(x_bar, n_bars)[:trades]  # offene Position läuft bis zum Ende
+    lengths = b1 - e_bar
+    tid = np.repeat(np.arange(trades), lengths)
+    f_bar = np.repeat(e_bar - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+    keep = funding[f_bar] != 0.0
+    f_bar = f_bar[keep]; tid = tid[keep]
+    f_pos = e_pos[tid]; f_qty = e_qty[tid]; rate = funding[f_bar]
+    f_px = close[f_bar]
+    notional = f_px * f_qty
+    cf = np.where(f_pos == 1, -notional * rate, +notional * rate)
+    csum = np.cumsum(cf)
+    counts = np.bincount(tid, minlength=trades)
+    before = np.append(0.0, csum)[np.repeat(np.cumsum(counts) - counts, counts)]
+    f_eq = log.e_equity[tid] + (csum - before)
+    ns = index.asi8
+    f_ns = ns[f_bar]; x_ns = ns[x_bar]
+    # Sortierschlüssel bar*4 + Rang: Teil-Funding (0) vor Exit (1) vor Entry (2) vor Funding (3)
+    e_key = np.empty(trades + exits, dtype=np.int64); e_key[0::2] = e_bar * 4 + 2; e_key[1::2] = x_bar * 4 + 1
+    f_key = f_bar * 4 + 3
+    if ib is not None:
+        x_ns = np.where(minute >= 0, ib.index.asi8[np.maximum(minute, 0)], x_ns)
+        part = np.flatnonzero(minute > ib.start[x_bar])
+        p_rate = ib.fund_pre[minute[part]]  # Funding der Minuten [Bar-Start, Stop-Minute), wie im Kernel
+        part = part[p_rate != 0.0]; p_rate = p_rate[p_rate != 0.0]
+        if len(part):
+            p_min = minute[part]; p_px = ib.close[p_min - 1]
+            f_key = np.concatenate((f_key, x_bar[part] * 4)); o = np.argsort(f_key, kind="stable"); f_key = f_key[o]
+            f_pos = np.concatenate((f_pos, x_pos[part]))[o]; f_qty = np.concatenate((f_qty, x_qty[part]))[o]
+            rate = np.concatenate((rate, p_rate))[o]; f_px = np.concatenate((f_px, p_px))[o]
+            notional = np.concatenate((notional, p_px * x_qty[part]))[o]
+            cf = np.concatenate((cf, log.x_fund_cf[part]))[o]; f_eq = np.concatenate((f_eq, log.x_fund_eq[part]))[o]
+            f_ns = np.concatenate((f_ns, ib.index.asi8[p_min]))[o]
+    n = len(e_key) + len(f_key)
+    at_e = np.arange(len(e_key)) + np.searchsorted(f_key, e_key)
+    at_en = at_e[0::2]; at_ex = at_e[1::2]
+    is_f = np.ones(n, dtype=bool); is_f[at_e] = False
+    at_f = np.flatnonzero(is_f)
+
+    def col(en_vals, ex_vals, f_vals, out: np.ndarray) -> np.ndarray:
+        for at, vals in ((at_en, en_vals), (at_ex, ex_vals), (at_f, f_vals)):
+            if vals is not None:
+                out[at] = vals
+        return out
+
+    # Float-Spalten als Zeilen eines Blocks (Entry, Exit, Funding), NaN = Spalte gilt für die Zeile nicht
+    floats = [("price", close[e_bar], close[x_bar], f_px), ("qty", e_qty, x_qty, f_qty),
+              ("equity", log.e_equity[:trades], log.x_equity[:exits], f_eq),
+              ("entry_px", e_px, x_entry, None), ("fee", e_fee, x_fee, None),
+              ("stop_px", e_stop, None, None), ("risk_amt", log.e_risk[:trades], None, None),
+              ("size", e_qty, None, None), ("cashflow", None, None, cf), ("notional", None, None, notional),
+              ("rate", None, None, rate), ("exit_px", None, x_px, None), ("pnl", None, x_pnl, None)]
+    block = np.full((len(floats), n), np.nan)
+    for k, (_, en_vals, ex_vals, f_vals) in enumerate(floats):
+        col(en_vals, ex_vals, f_vals, block[k])
+    nat = np.iinfo(np.int64).min
+    action = col(np.where(e_pos == 1, 0, 1), 2 + (x_pos == -1) + 2 * log.x_stop[:exits], None,
+                 np.full(n, 6, dtype=np.int8))
+    cols = {
+        "time": _ns_index(col(ns[e_bar], x_ns, f_ns, np.empty(n, dtype=np.int64)), index.tz),
+        "symbol": strat.symbol, "timeframe": strat.timeframe,
+        "action": np.asarray(ACTIONS, dtype=object)[action],
+        "pos": col(e_pos, x_pos, f_pos, np.empty(n, dtype=np.int8)),
+        **{c: block[k] for k, (c, _, _, _) in enumerate(floats)},
+        "entry_time": _ns_index(col(None, ns[e_bar[:exits]], None, np.full(n, nat, dtype=np.int64)), index.tz),
+    }
+    return pd.DataFrame(cols, copy=False)  # Spalten als eigene Blöcke, ohne Umkopieren in einen Block
+
+def backtest_one_with_trades(df: pd.DataFrame, strat: StrategyConfig, starting_capital: float, max_leverage: float,
+                             equity: str = "full", intrabar: bool = False) -> Tuple[Dict, pd.Series, pd.DataFrame]:
+    """
+    Wie backtest_one (engine="array"), zusätzlich Trade-Log als DataFrame: eine Zeile je Entry,
+    Exit (Signal/Stop) und Funding-Zahlung; Spalten wie results/paper_trading/trades.csv. Der Kernel schreibt
+    Entries/Exits in vorab allokierte Spalten (TradeLog), umgewandelt wird einmal am Ende.
+    equity und intrabar wie bei backtest_one; aufgezeichnet wird nur der angefragte Equity-Modus.
+    """
+    df_tf = _resample_cached(df, strat.timeframe)
+    index = df_tf.index.rename(None)
+    marks = _equity_marks(index, equity)
+    close, high, low, fund = _ohlc_arrays(df_tf)
+    L, S = _entry_signal_matrix(df_tf, [strat])
+    le, se = L[:, 0], S[:, 0]
+    log = _trade_log(int(np.count_nonzero(le | se)))  # Entries <= Signal-Bars
+    ib = _intrabar(df, df_tf, strat.timeframe) if intrabar else None
+    sim = _simulate(close, high, low, fund, le, se, strat, starting_capital, max_leverage, marks=marks, log=log,
+                    intrabar=ib, days=_schedule([index]))
+    m = _sim_metrics(strat, sim, len(index))
+    trades = _trade_frame(log, sim.trades, sim.events - sim.trades, close, fund, len(index), index, strat, ib)
+    if equity == "none":
+        return m, pd.Series(dtype=np.float64), trades
+    return m, pd.Series(sim.equity, index=index[_recorded_positions(marks, len(index))]), trades
+
+def _entry_signal_matrix(df_tf: pd.DataFrame, strats: List[StrategyConfig],
+                         bank: IndicatorBank | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Entry-Masken für viele Strategien auf denselben Bars, Form (bars, strategies).
+    SMAs, Kreuzungen und ATR kommen aus der IndicatorBank (einmal je (symbol, timeframe));
+    Filterlogik wie _entry_signals. Gemeinsame Quelle für Backtest und Live-Signale.
+    """
+    bank = bank if bank is not None else get_indicator_bank(df_tf)
+    close = bank.close
+    n = len(close)
+    pairs = sorted({(st.fast, st.slow) for st in strats})
+    row = {p: i for i, p in enumerate(pairs)}
+    UP, DOWN = bank.cross_matrix(pairs)
+    atr_ratio: Dict[int, np.ndarray] = {}
+
+    L = np.empty((n, len(strats)), dtype=bool)
+    S = np.empty((n, len(strats)), dtype=bool)
+    for j, st in enumerate(strats):
+        up = UP[row[(st.fast, st.slow)]].copy(); down = DOWN[row[(st.fast, st.slow)]].copy()
+        if st.trend_tol > 0:
+            f = bank.sma(st.fast); sl = bank.sma(st.slow)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                delta = (f - sl) / np.where(sl == 0, np.nan, sl)
+            up &= delta >= st.trend_tol
+            down &= (-delta) >= st.trend_tol
+        if st.atr_thresh > 0:
+            if st.atr_period not in atr_ratio:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    atr_ratio[st.atr_period] = bank.atr(st.atr_period) / close
+            vol_ok = atr_ratio[st.atr_period] >= st.atr_thresh
+            up &= vol_ok; down &= vol_ok
+        L[:, j] = up; S[:, j] = down
+    return L, S
+
+# ab dieser Gruppengröße lohnt sich die über Strategien vektorisierte Schleife
+BATCH_VECTOR_MIN = 32
+
+class WarmRows(NamedTuple):
+    """Warmstart: Bars der vollen Reihe, Zeile je Slice-Bar darin und ob die letzte Slice-Bar angeschnitten ist."""
+    bars: pd.DataFrame
+    rows: np.ndarray
+    cut_last: bool
+
+def _warm_rows(full: pd.DataFrame, df: pd.DataFrame, df_tf: pd.DataFrame, timeframe: str) -> WarmRows:
+    """
+    Ordnet die Bars eines 1m-Zeilen-Slices df (von full) den Bars des vollen Resamples zu (gleiche Labels).
+    Die erste Bar endet mit derselben Minute wie ihr voller Bin -> gleicher Close. Die letzte Bar ist
+    angeschnitten, wenn full nach df noch Minuten desselben Bins hat – ihr voller Wert enthielte die Zukunft.
+    """
+    bars = _resample_cached(full, timeframe)
+    rows = bars.index.get_indexer(df_tf.index)
+    if len(rows) and rows.min() < 0:
+        raise ValueError("warm start: slice bars not found in the full-series resample")
+    cut_last = False
+    if timeframe in _TF_DELTA and len(df):
+        nxt = full.index.searchsorted(df.index[-1], side="right")
+        delta = _TF_DELTA[timeframe]
+        cut_last = nxt < len(full) and full.index[nxt].floor(delta) == df.index[-1].floor(delta)
+    return WarmRows(bars, rows.astype(np.int64), bool(cut_last))
+
+def _warm_signal_matrix(warm: WarmRows, strats: List[StrategyConfig],
+                        full: Tuple[np.ndarray, np.ndarray] | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Entry-Masken aus den Indikatoren der vollen Reihe, auf die Slice-Bars geschnitten: SMA/ATR sind an
+    der Slice-Grenze schon eingeschwungen, Kreuzungen der ersten Bar vergleichen mit der Bar davor.
+    full: bereits berechnete Masken auf warm.bars (mehrere Slices derselben Reihe).
+    """
+    L, S = full if full is not None else _entry_signal_matrix(warm.bars, strats)
+    L, S = L[warm.rows], S[warm.rows]
+    if warm.cut_last:
+        L[-1] = False; S[-1] = False
+    return L, S
+
+def _intrabar_stops_batch(ib: Intrabar, i: int, side: int, hit: np.ndarray, idx: np.ndarray, sp: np.ndarray,
+                          q: np.ndarray, slip_px: np.ndarray, equity: np.ndarray, exit_px: np.ndarray) -> None:
+    """_intrabar_stop für alle Stop-Treffer einer Bar auf einmal (Minuten x Strategien); schreibt equity/exit_px."""
+    if not hit.any():
+        return
+    h = np.flatnonzero(hit); cols = idx[h]; stop = sp[h]
+    s = int(ib.start[i]); e = int(ib.end[i])
+    if side == 1:
+        m = s + (ib.low[s:e][:, None] <= stop[None, :]).argmax(axis=0); fill = np.minimum(ib.open[m], stop)
+    else:
+        m = s + (ib.high[s:e][:, None] >= stop[None, :]).argmax(axis=0); fill = np.maximum(ib.open[m], stop)
+    rate = ib.fund_pre[m]
+    notional = ib.close[np.maximum(m - 1, 0)] * q[h]
+    cf = np.where(m > s, -notional * rate if side == 1 else +notional * rate, 0.0)
+    equity[cols] = equity[cols] + cf
+    exit_px[h] = fill * slip_px[cols]
+
+def _simulate_batch(close: np.ndarray, high: np.ndarray, low: np.ndarray, funding: np.ndarray,
+                    long_entry: np.ndarray, short_entry: np.ndarray, strats: List[StrategyConfig],
+                    starting_capital: float, max_leverage: float, marks: np.ndarray | None = None,
+                    prune: PruneRule | None = None, intrabar: Intrabar | None = None,
+                    lane: np.ndarray | None = None, ends: np.ndarray | None = None,
+                    days: Schedule | None = None) -> SimResult:
+    """
+    Wie _simulate, aber für alle Strategien gleichzeitig: eine Python-Iteration je Bar,
+    NumPy-Operationen über die Strategie-Achse. Elementweise gleiche Rechenschritte
+    -> bitgleich zu _simulate. Masken in Form (bars, strategies); Equity (bars bzw.
+    len(marks), strategies); trades/first/last/max_drawdown/pruned_at als Arrays je Strategie.
+    Gestoppte Strategien werden eingefroren (keine Exits/Entries/Funding mehr); sind alle
+    gestoppt, endet die Schleife. Ihre Equity-Zeilen nach pruned_at sind bedeutungslos.
+    lane/ends: mehrere Zeitreihen ("Lanes", z. B. Forward-Splits) nebeneinander – close/high/low/funding
+    in Form (bars, lanes), Spalte j liest Lane lane[j] und wird ab Iteration ends[j] eingefroren
+    (wie beim Pruning, aber ohne pruned_at). Je Spalte bitgleich zum Einzellauf auf ihrer Lane.
+    days: wie bei _simulate (mit Lanes: Schedule über alle Lanes, _schedule mit Spalten je Lane).
+    """
+    n, k = long_entry.shape
+    laned = lane is not None
+    if laned and intrabar is not None:
+        raise ValueError("intrabar stops are not supported with lanes")
+    fee_rate = np.array([st.fee_rate for st in strats], dtype=np.float64)
+    slip     = np.array([st.slippage for st in strats], dtype=np.float64)
+    risk_fr  = np.array([st.risk_fraction for st in strats], dtype=np.float64)
+    sl_pct   = np.array([st.stop_loss_pct for st in strats], dtype=np.float64)
+    allow_l  = np.array([st.direction in ("both","long") for st in strats], dtype=bool)
+    allow_s  = np.array([st.direction in ("both","short") for st in strats], dtype=bool)
+    down_px, up_px = 1 - slip, 1 + slip
+
+    equity = np.full(k, float(starting_capital)); pos = np.zeros(k, dtype=np.int8)
+    qty = np.zeros(k); entry_price = np.zeros(k); stop_price = np.zeros(k)
+    trades = np.zeros(k, dtype=np.int64)
+    E = np.empty((n if marks is None else len(marks), k), dtype=np.float64)
+    mk = [] if marks is None else marks.tolist()
+    r = 0; nxt = mk[0] if mk else -1
+    first = np.zeros(k); peak = np.zeros(k); mdd = np.zeros(k)
+    floor = -math.inf if prune is None or prune.max_mdd_floor is None else float(prune.max_mdd_floor)
+    need = 0 if prune is None or prune.min_trades is None else int(prune.min_trades)
+    pruning = prune is not None and (need > 0 or floor > -math.inf)
+    cut = np.full(k, -1, dtype=np.int64); alive = np.ones(k, dtype=bool)
+    st = None if days is None else StreamStats(k, days.months)
+    at = {} if days is None else days.at
+    every = np.arange(k); entry_bar = np.zeros(k, dtype=np.int64); held = np.zeros(k, dtype=np.int64)
+    # gestoppte Spalten bekommen -inf / 0, damit sie nicht erneut auslösen
+    floor_k = np.full(k, floor); need_k = np.full(k, need, dtype=np.int64)
+    if need:
+        # trades + verbleibende Signal-Bars ändert sich nur auf Signal-Bars -> dort (und auf Bar 0) prüfen
+        sig = (long_entry & allow_l) | (short_entry & allow_s)
+        sig_any = sig.any(axis=1).tolist()
+        rem = sig.sum(axis=0)
+
+    if laned:
+        # Einfrieren am Lane-Ende: Iteration -> Spalten
+        freeze: Dict[int, np.ndarray] = {int(e): np.flatnonzero(ends == e) for e in np.unique(ends) if e < n}
+        rows = zip(close, high, low, funding)
+    else:
+        rows = zip(close.tolist(), high.tolist(), low.tolist(), funding.tolist())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, (price, hi, lo, fund) in enumerate(rows):
+            le = long_entry[i]; se = short_entry[i]
+            if laned:
+                if i in freeze:
+                    cols = freeze[i]; o = cols[(pos[cols] == 1) | (pos[cols] == -1)]
+                    held[o] += i - entry_bar[o]; pos[cols] = 2; qty[cols] = 0.0
+                lo_k = lo[lane]; hi_k = hi[lane]
+            else:
+                lo_k = lo; hi_k = hi
+
+            # Exits
+            idx = np.flatnonzero((pos == 1) & ((lo_k <= stop_price) | se))
+            if idx.size:
+                sp = stop_price[idx]; q = qty[idx]
+                lo_i = lo_k[idx] if laned else lo
+                exit_px = np.where(lo_i <= sp, sp, price[lane[idx]] if laned else price) * down_px[idx]
+                if intrabar is not None:
+                    _intrabar_stops_batch(intrabar, i, 1, lo <= sp, idx, sp, q, down_px, equity, exit_px)
+                pnl = (exit_px - entry_price[idx]) * q; fee = np.abs(exit_px * q) * fee_rate[idx]
+                equity[idx] = equity[idx] + (pnl - fee); pos[idx] = 0; qty[idx] = 0.0; held[idx] += i - entry_bar[idx]
+            idx = np.flatnonzero((pos == -1) & ((hi_k >= stop_price) | le))
+            if idx.size:
+                sp = stop_price[idx]; q = qty[idx]
+                hi_i = hi_k[idx] if laned else hi
+                exit_px = np.where(hi_i >= sp, sp, price[lane[idx]] if laned else price) * up_px[idx]
+                if intrabar is not None:
+                    _intrabar_stops_batch(intrabar, i, -1, hi >= sp, idx, sp, q, up_px, equity, exit_px)
+                pnl = (entry_price[idx] - exit_px) * q; fee = np.abs(exit_px * q) * fee_rate[idx]
+                equity[idx] = equity[idx] + (pnl - fee); pos[idx] = 0; qty[idx] = 0.0; held[idx] += i - entry_bar[idx]
 
-def backtest_all(strategies: List[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path) -> pd.DataFrame:
-    results=[]; cache: Dict[str,pd.DataFrame] = {}
+            # Entries (elif-Semantik: Short nur, wenn kein Long-Signal greift)
+            go_long = allow_l & le
+            for side, go in ((1, go_long), (-1, ~go_long & allow_s & se)):
+                idx = np.flatnonzero((pos == 0) & go)
+                if not idx.size:
+                    continue
+                eq_i = equity[idx]; risk_amt = eq_i * risk_fr[idx]
+                px = price[lane[idx]] if laned else price
+                if side == 1:
+                    entry = px * up_px[idx]; stop = entry * (1 - sl_pct[idx]); dist = entry - stop
+                else:
+                    entry = px * down_px[idx]; stop = entry * (1 + sl_pct[idx]); dist = stop - entry
+                q = np.minimum(risk_amt * entry / dist, eq_i * max_leverage) / entry
+                ok = (risk_amt > 0) & (dist > 0) & (q > 0)
+                if not ok.any():
+                    continue
+                idx = idx[ok]; entry = entry[ok]; q = q[ok]
+                fee = np.abs(entry * q) * fee_rate[idx]
+                equity[idx] = equity[idx] - fee
+                pos[idx] = side; qty[idx] = q; entry_price[idx] = entry; stop_price[idx] = stop[ok]; trades[idx] += 1
+                entry_bar[idx] = i
+
+            # Funding
+            if laned:
+                if fund.any():
+                    idx = np.flatnonzero((pos != 0) & (qty > 0) & (fund[lane] != 0.0))
+                    if idx.size:
+                        notional = price[lane[idx]] * qty[idx]; f = fund[lane[idx]]
+                        equity[idx] = equity[idx] + np.where(pos[idx] == 1, -notional * f, +notional * f)
+            elif fund != 0.0:
+                idx = np.flatnonzero((pos != 0) & (qty > 0))
+                if idx.size:
+                    notional = price * qty[idx]
+                    equity[idx] = equity[idx] + np.where(pos[idx] == 1, -notional * fund, +notional * fund)
+
+            if marks is None:
+                E[i] = equity
+            elif i == nxt:
+                E[r] = equity; r += 1; nxt = mk[r] if r < len(mk) else -1
+            if i == 0:
+                first[:] = equity; peak[:] = equity
+            else:
+                np.maximum(peak, equity, out=peak)
+                np.minimum(mdd, equity / peak - 1.0, out=mdd)
+            if i in at:
+                for c, mno in at[i]:
+                    cols = every if c is None else c
+                    if pruning:
+                        cols = cols[alive[cols]]
+                    eq_c = equity[cols]; st.day_end(cols, eq_c)
+                    if mno >= 0:
+                        st.month_end(cols, eq_c, mno)
+            if pruning:
+                fail = mdd < floor_k
+                if need and (sig_any[i] or i == 0):
+                    rem -= sig[i]
+                    fail |= trades + rem < need_k
+                if fail.any():
+                    dead = np.flatnonzero(fail)
+                    o = dead[(pos[dead] == 1) | (pos[dead] == -1)]; held[o] += i + 1 - entry_bar[o]
+                    if st is not None:
+                        _stream_cut(st, days, i, dead, equity, lane)
+                    # pos=2 + qty=0: weder Exit- noch Entry- noch Funding-Zweig greift -> Equity eingefroren
+                    cut[dead] = i; alive[dead] = False; pos[dead] = 2; qty[dead] = 0.0
+                    floor_k[dead] = -math.inf; need_k[dead] = 0
+                    if not alive.any():
+                        break
+    o = (pos == 1) | (pos == -1); held[o] += n - entry_bar[o]
+    stats = None
+    if st is not None:
+        st.held[:] = held
+        stats = st.finish(np.where(cut >= 0, cut + 1, ends if laned else n))
+    return SimResult(E, trades, first, equity.copy() if n else np.zeros(k), mdd, cut, 0, stats)
+
+def _stream_cut(st: StreamStats, days: Schedule, i: int, dead: np.ndarray, equity: np.ndarray,
+                lane: np.ndarray | None) -> None:
+    """Abbruch-Bar i als letzter Tages-/Monatspunkt der gestoppten Spalten, soweit i nicht schon einer ist."""
+    k = len(equity); day = np.ones(k, dtype=bool); mon = np.ones(k, dtype=bool)
+    for c, mno in days.at.get(i, ()):
+        day[slice(None) if c is None else c] = False
+        if mno >= 0:
+            mon[slice(None) if c is None else c] = False
+    x = dead[day[dead]]
+    if x.size:
+        st.day_end(x, equity[x])
+    x = dead[mon[dead]]
+    if x.size:
+        st.month_end(x, equity[x], days.month[i, 0] if lane is None else days.month[i, lane[x]])
+
+def backtest_batch(df: pd.DataFrame, strategies: List[StrategyConfig], starting_capital: float, max_leverage: float,
+                   chunk_size: int = 512, prune: PruneRule | None = None, intrabar: bool = False,
+                   warm_from: pd.DataFrame | None = None, daily: bool = False) -> pd.DataFrame:
+    """
+    Bewertet alle Strategien eines (symbol, timeframe)-Paares gemeinsam: ein Resample,
+    gemeinsame Indikatoren, Signal-Matrix (bars x strategies). Liefert dieselben
+    Metriken wie backtest_one, eine Zeile je Strategie in Eingabereihenfolge.
+    chunk_size begrenzt die Breite der Signal-Matrizen; keine Equity-Kurve – alle Kennzahlen laufen online
+    im Kernel mit (StreamStats).
+    prune: wie bei backtest_one (Spalten "pruned"/"pruned_at"); intrabar: wie bei backtest_one.
+    warm_from: volle 1m-Reihe, von der df ein Zeilen-Slice ist -> Signale aus deren (gecachten)
+    Indikatoren statt Kaltstart auf dem Slice (_warm_signal_matrix).
+    daily: Equity zusätzlich an den Tagesenden aufzeichnen -> Spalte "daily_equity" (Series wie
+    backtest_one(equity="daily"); None für gestoppte Strategien).
+    """
+    if not strategies:
+        return pd.DataFrame()
+    pairs = {(st.symbol, st.timeframe) for st in strategies}
+    if len(pairs) != 1:
+        raise ValueError(f"backtest_batch expects a single (symbol, timeframe) pair, got {sorted(pairs)}")
+
+    df_tf = _resample_cached(df, strategies[0].timeframe)
+    close, high, low, fund = _ohlc_arrays(df_tf)
+    ib = _intrabar(df, df_tf, strategies[0].timeframe) if intrabar else None
+    n = len(df_tf)
+    marks = _period_ends(df_tf.index, "D") if daily else np.empty(0, dtype=np.int64)
+    day_index = df_tf.index.rename(None)[marks]
+    days = _schedule([df_tf.index])
+    warm = None if warm_from is None else _warm_rows(warm_from, df, df_tf, strategies[0].timeframe)
+
+    rows: List[Dict] = []
+    for c0 in range(0, len(strategies), int(chunk_size)):
+        chunk = strategies[c0:c0 + int(chunk_size)]
+        L, S = _entry_signal_matrix(df_tf, chunk) if warm is None else _warm_signal_matrix(warm, chunk)
+        if len(chunk) >= BATCH_VECTOR_MIN:
+            sim = _simulate_batch(close, high, low, fund, L, S, chunk, starting_capital, max_leverage,
+                                  marks=marks, prune=prune, intrabar=ib, days=days)
+        else:
+            cols = [_simulate(close, high, low, fund, L[:, j], S[:, j], st, starting_capital, max_leverage,
+                              marks=marks, prune=prune, intrabar=ib, days=days) for j, st in enumerate(chunk)]
+            E = np.column_stack([c.equity if c.pruned_at < 0 else np.zeros(len(marks)) for c in cols])
+            sim = SimResult(E, np.array([c.trades for c in cols], dtype=np.int64),
+                            np.array([c.first for c in cols]), np.array([c.last for c in cols]),
+                            np.array([c.max_drawdown for c in cols]),
+                            np.array([c.pruned_at for c in cols], dtype=np.int64), 0, [c.stats[0] for c in cols])
+        part = [_batch_row(st, sim, j, n, prune) for j, st in enumerate(chunk)]
+        if daily:
+            for j, m in enumerate(part):
+                m["daily_equity"] = pd.Series(sim.equity[:, j], index=day_index) if sim.pruned_at[j] < 0 else None
+        rows += part
+    return pd.DataFrame(rows)
+
+def _batch_row(st: StrategyConfig, sim: SimResult, j: int, n: int, prune: PruneRule | None = None) -> Dict:
+    m = {"symbol":st.symbol,"timeframe":st.timeframe,"fast":st.fast,"slow":st.slow,
+         "stop_loss_pct":st.stop_loss_pct,"trades":int(sim.trades[j]),
+         "net_return": float(sim.last[j]/sim.first[j]-1.0) if n>1 else 0.0,
+         "max_drawdown": float(sim.max_drawdown[j]) if n else 0.0,
+         "start_equity": float(sim.first[j]) if n else 0.0}
+    m.update(sim.stats[j])
+    if prune is not None:
+        cut = int(sim.pruned_at[j])
+        m.update({"pruned": cut >= 0, "pruned_at": cut})
+    return m
+
+def _split_bars(df: pd.DataFrame, df_tf: pd.DataFrame, a: int, b: int, timeframe: str) -> pd.DataFrame:
+    """
+    Bars von _resample_ohlcv(df.iloc[a:b]) aus dem Resample der vollen Reihe (df_tf): innere Bins
+    werden übernommen, nur die angeschnittenen Rand-Bins aus ihren 1m-Zeilen neu aggregiert.
+    """
+    part = df.iloc[a:b]
+    if timeframe not in _TF_DELTA or part.empty:
+        return _resample_ohlcv(part, timeframe)
+    delta = _TF_DELTA[timeframe]; ix = part.index
+    head, tail = ix[0].floor(delta), ix[-1].floor(delta)
+    if head == tail:
+        return _resample_ohlcv(part, timeframe)
+    he = ix.searchsorted(head + delta, side="left"); ts = ix.searchsorted(tail, side="left")
+    lo = df_tf.index.searchsorted(head + delta, side="left"); hi = df_tf.index.searchsorted(tail, side="left")
+    out = pd.concat([_resample_ohlcv(part.iloc[:he], timeframe), df_tf.iloc[lo:hi],
+                     _resample_ohlcv(part.iloc[ts:], timeframe)])
+    out.attrs = dict(df.attrs)
+    return out
+
+def backtest_splits(df: pd.DataFrame, strategies: List[StrategyConfig], segments: Sequence[Tuple[int, int]],
+                    starting_capital: float, max_leverage: float, chunk_size: int = 512,
+                    warm_start: bool = False) -> List[pd.DataFrame]:
+    """
+    backtest_batch für mehrere 1m-Slices [a, b) (Forward-Splits) in einem Durchgang: ein Resample der
+    vollen Reihe, daraus die Split-Bars; alle Splits laufen als Lanes nebeneinander durch den Kernel
+    (eine Python-Iteration je Bar-Position statt je Split und Bar). Indikatoren und Signale bleiben
+    Split-lokal (Kaltstart wie im Einzellauf) -> je Split bitgleich zu backtest_batch(df.iloc[a:b], ...).
+    Segmente dürfen nicht leer sein; ein DataFrame je Segment. Kleine Gruppen (< BATCH_VECTOR_MIN)
+    laufen wie in backtest_batch skalar je Split.
+    warm_start: Signale einmal auf der vollen Reihe, je Split nur geschnitten (wie warm_from in backtest_batch).
+    """
+    if not strategies or not segments:
+        return [pd.DataFrame() for _ in segments]
+    pairs = {(st.symbol, st.timeframe) for st in strategies}
+    if len(pairs) != 1:
+        raise ValueError(f"backtest_splits expects a single (symbol, timeframe) pair, got {sorted(pairs)}")
+    if len(strategies) < BATCH_VECTOR_MIN:
+        return [backtest_batch(df.iloc[a:b], strategies, starting_capital, max_leverage, chunk_size,
+                               warm_from=df if warm_start else None) for a, b in segments]
+    tf = strategies[0].timeframe
+    full = _resample_cached(df, tf)
+    bars = [_split_bars(df, full, a, b, tf) for a, b in segments]
+    lens = np.array([len(x) for x in bars], dtype=np.int64)
+    if not lens.min():
+        raise ValueError("backtest_splits needs non-empty segments")
+    n_max, n_lanes = int(lens.max()), len(bars)
+
+    # (bars, lanes); hinter dem Lane-Ende mit dem letzten Wert aufgefüllt – die Spalten sind dort eingefroren
+    arrays = [_ohlc_arrays(x) for x in bars]
+    def _stack(c: int) -> np.ndarray:
+        out = np.empty((n_max, n_lanes))
+        for s, arr in enumerate(a[c] for a in arrays):
+            out[:len(arr), s] = arr; out[len(arr):, s] = arr[-1]
+        return out
+    close, high, low, fund = (_stack(c) for c in range(4))
+    none = np.empty(0, dtype=np.int64)
+    warm = [_warm_rows(df, df.iloc[a:b], x, tf) for (a, b), x in zip(segments, bars)] if warm_start else None
+
+    out: List[List[Dict]] = [[] for _ in bars]
+    for c0 in range(0, len(strategies), int(chunk_size)):
+        chunk = strategies[c0:c0 + int(chunk_size)]; k = len(chunk)
+        L = np.zeros((n_max, n_lanes * k), dtype=bool); S = np.zeros_like(L)
+        full_sig = _entry_signal_matrix(full, chunk) if warm_start else None
+        for s, x in enumerate(bars):
+            L[:lens[s], s * k:(s + 1) * k], S[:lens[s], s * k:(s + 1) * k] = (
+                _entry_signal_matrix(x, chunk) if warm is None else _warm_signal_matrix(warm[s], chunk, full_sig))
+        lane = np.repeat(np.arange(n_lanes), k)
+        days = _schedule([x.index for x in bars], [np.arange(s * k, (s + 1) * k) for s in range(n_lanes)])
+        sim = _simulate_batch(close, high, low, fund, L, S, chunk * n_lanes, starting_capital, max_leverage,
+                              marks=none, lane=lane, ends=lens[lane], days=days)
+        for s in range(n_lanes):
+            cols = slice(s * k, (s + 1) * k)
+            sub = SimResult(None, sim.trades[cols], sim.first[cols], sim.last[cols], sim.max_drawdown[cols],
+                            sim.pruned_at[cols], 0, sim.stats[cols])
+            out[s] += [_batch_row(st, sub, j, int(lens[s])) for j, st in enumerate(chunk)]
+    return [pd.DataFrame(r) for r in out]
+
+class BatchJob(NamedTuple):
+    """
+    Arbeitspaket: Strategien eines (symbol, timeframe) auf dem 1m-Zeilen-Slice [start, stop).
+    segments: stattdessen mehrere Slices in einem Durchgang (backtest_splits, ohne prune/intrabar).
+    warm_start: Signale aus den Indikatoren der vollen Reihe (Slice handelt ab der ersten Bar).
+    daily: Tages-Equity je Strategie mitliefern (backtest_batch, nicht mit segments).
+    """
+    symbol: str
+    strategies: List[StrategyConfig]
+    start: int | None = None
+    stop: int | None = None
+    prune: PruneRule | None = None
+    intrabar: bool = False
+    segments: Tuple[Tuple[int, int], ...] | None = None
+    warm_start: bool = False
+    daily: bool = False
+
+def resolve_workers(workers: int | None) -> int:
+    """workers <= 0 -> alle Kerne."""
+    w = int(workers or 1)
+    return (os.cpu_count() or 1) if w <= 0 else w
+
+def plan_batch_jobs(strategies: List[StrategyConfig], workers: int = 1, start: int | None = None,
+                    stop: int | None = None, prune: PruneRule | None = None, intrabar: bool = False,
+                    segments: Sequence[Tuple[int, int]] | None = None, warm_start: bool = False,
+                    daily: bool = False) -> Tuple[List[BatchJob], List[List[int]]]:
+    """
+    Gruppiert nach (symbol, timeframe) in Eingabereihenfolge; bei mehreren Workern werden große
+    Gruppen gestückelt (nicht kleiner als BATCH_VECTOR_MIN). Liefert Jobs + Original-Indizes je Job.
+    """
+    if segments is not None and (prune is not None or intrabar or daily):
+        raise ValueError("segments cannot be combined with prune, intrabar or daily")
+    segs = None if segments is None else tuple((int(a), int(b)) for a, b in segments)
+    groups: Dict[Tuple[str,str], List[int]] = {}
+    for i, s in enumerate(strategies):
+        groups.setdefault((s.symbol, s.timeframe), []).append(i)
+    jobs: List[BatchJob] = []; slots: List[List[int]] = []
+    for (sym, _tf), idxs in groups.items():
+        size = len(idxs) if workers <= 1 else max(BATCH_VECTOR_MIN, math.ceil(len(idxs) / workers))
+        for c0 in range(0, len(idxs), size):
+            part = idxs[c0:c0 + size]
+            jobs.append(BatchJob(sym, [strategies[i] for i in part], start, stop, prune, intrabar, segs,
+                                 warm_start, daily)); slots.append(part)
+    return jobs, slots
+
+def _run_job(frames: Dict[str, pd.DataFrame], job: BatchJob, starting_capital: float, max_leverage: float) -> List[Dict]:
+    """Zeilen in Strategie-Reihenfolge; mit segments Segment für Segment hintereinander."""
+    df = frames[job.symbol]
+    if job.segments is not None:
+        parts = backtest_splits(df, job.strategies, job.segments, starting_capital, max_leverage,
+                                warm_start=job.warm_start)
+        return [m for part in parts for m in part.to_dict(orient="records")]
+    full = df
+    if job.start is not None or job.stop is not None:
+        df = df.iloc[job.start:job.stop]
+    return backtest_batch(df, job.strategies, starting_capital, max_leverage, prune=job.prune, intrabar=job.intrabar,
+                          warm_from=full if job.warm_start else None, daily=job.daily).to_dict(orient="records")
+
+# im Worker-Prozess: an Shared Memory angehängte OHLCV-Frames
+_WORKER_FRAMES: Dict[str, pd.DataFrame] = {}
+
+def _init_worker(meta: Dict[str, dict]) -> None:
+    _WORKER_FRAMES.update(attach_frames(meta))
+
+def _run_job_in_worker(args: Tuple[BatchJob, float, float]) -> List[Dict]:
+    job, starting_capital, max_leverage = args
+    return _run_job(_WORKER_FRAMES, job, starting_capital, max_leverage)
+
+def run_batch_jobs(frames: Dict[str, pd.DataFrame], jobs: List[BatchJob], starting_capital: float,
+                   max_leverage: float, workers: int = 1) -> List[List[Dict]]:
+    """
+    Führt Jobs seriell oder über einen Prozess-Pool aus. Parallel werden die OHLCV-Frames einmal
+    in Shared Memory veröffentlicht (nicht je Task gepickelt). Ergebnisreihenfolge = Jobreihenfolge,
+    Werte identisch zum seriellen Lauf.
+    """
+    workers = resolve_workers(workers)
+    if workers <= 1 or len(jobs) <= 1:
+        return [_run_job(frames, j, starting_capital, max_leverage) for j in jobs]
+    with SharedFrames({sym: frames[sym] for sym in {j.symbol for j in jobs}}) as shared:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_init_worker,
+                                 initargs=(shared.meta,)) as ex:
+            return list(ex.map(_run_job_in_worker, [(j, starting_capital, max_leverage) for j in jobs]))
+
+def _run_batch_cached(strategies: List[StrategyConfig], frames: Dict[str, pd.DataFrame],
+                      starts: Dict[str, int | None], cfg: GlobalConfig, workers: int, prune: PruneRule | None,
+                      intrabar: bool, store: ResultStore | None, daily: bool = False) -> List[Dict]:
+    """
+    Batch-Lauf je (symbol, timeframe) auf frames[sym].iloc[starts[sym]:]; mit Store werden vorhandene
+    Ergebnisse übernommen und nur die fehlenden Strategien gerechnet (und danach abgelegt).
+    daily: "daily_equity" je Zeile (backtest_batch); liegt sie im Store nicht vor, wird neu gerechnet.
+    """
+    sc, ml = cfg.risk.starting_capital, cfg.risk.max_leverage
+    results: List[Dict] = [{} for _ in strategies]
+    keys: List[str | None] = [None] * len(strategies)
+    if store is not None:
+        data = {sym: frame_key(df.iloc[starts.get(sym):]) for sym, df in frames.items()}
+        for i, s in enumerate(strategies):
+            if data[s.symbol] is not None:
+                keys[i] = result_key(s, sc, ml, data[s.symbol], "batch", prune, intrabar)
+                hit = store.get_metrics(keys[i])
+                if hit is not None and daily:
+                    eq = None if hit.get("pruned") else store.get_equity(keys[i], "daily")
+                    hit = None if eq is None and not hit.get("pruned") else {**hit, "daily_equity": eq}
+                if hit is not None:
+                    results[i] = hit
+    todo = [i for i, k in enumerate(keys) if k is None or not results[i]]
+    by_symbol: Dict[str, List[int]] = {}
+    for i in todo:
+        by_symbol.setdefault(strategies[i].symbol, []).append(i)
+    jobs, slots = [], []
+    for sym, idxs in by_symbol.items():
+        j, sl = plan_batch_jobs([strategies[i] for i in idxs], resolve_workers(workers), start=starts.get(sym),
+                                prune=prune, intrabar=intrabar, daily=daily)
+        jobs += j; slots += [[idxs[k] for k in part] for part in sl]
+    for idxs, rows in zip(slots, run_batch_jobs(frames, jobs, sc, ml, workers)):
+        for i, m in zip(idxs, rows):
+            results[i] = m
+            if keys[i] is not None:
+                eq = m.get("daily_equity")
+                store.put_metrics(keys[i], {k: v for k, v in m.items() if k != "daily_equity"})
+                if eq is not None:
+                    store.put_equity(keys[i], "daily", eq)
+    return results
+
+def backtest_all(strategies: List[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path, engine: str = "batch",
+                 workers: int = 1, prune: PruneRule | None = None, intrabar: bool = False,
+                 store: ResultStore | None = None, daily: bool = False) -> pd.DataFrame:
+    """
+    engine="batch": Strategien je (symbol, timeframe) gemeinsam über backtest_batch (Standard);
+    workers > 1 (oder <= 0 = alle Kerne) verteilt die Gruppen auf einen Prozess-Pool.
+    Sonst: einzeln über backtest_one mit der angegebenen Engine ("array" / "reference").
+    prune: opt-in Abbruch sicher durchfallender Strategien (PruneRule), Spalten "pruned"/"pruned_at".
+    intrabar: Stops bei 5m/15m gegen die 1m-Bars auflösen (config: backtest.intrabar_stops).
+    store: ResultStore – bereits gerechnete (Config, Risiko, Daten)-Kombinationen werden nicht neu simuliert.
+    daily: zusätzlich Spalte "daily_equity" (Tages-Equity als Series, None für gestoppte Strategien).
+    """
+    cache: Dict[str,pd.DataFrame] = {}
     for s in strategies:
         if s.symbol not in cache: cache[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
-        m, _ = backtest_one(cache[s.symbol], s, cfg.risk.starting_capital, cfg.risk.max_leverage)
-        results.append(m)
+    if engine == "batch":
+        return pd.DataFrame(_run_batch_cached(strategies, cache, {}, cfg, workers, prune, intrabar, store, daily))
+
+    results=[]
+    for s in strategies:
+        m, eq = cached_backtest_one(store, cache[s.symbol], s, cfg.risk.starting_capital, cfg.risk.max_leverage,
+                                    engine=engine, equity="daily" if daily else "none", prune=prune, intrabar=intrabar)
+        results.append({**m, "daily_equity": None if m.get("pruned") else eq} if daily else m)
     return pd.DataFrame(results)
+
+def _slice_start(n: int, fraction: float) -> int | None:
+    """Erste 1m-Zeile des jüngsten fraction-Anteils (None = volle Historie)."""
+    return None if fraction >= 1.0 else max(0, int(n * (1 - fraction)))
+
+def slice_bar_counts(strategies: List[StrategyConfig], frames: Dict[str, pd.DataFrame], fraction: float = 1.0) -> np.ndarray:
+    """Anzahl Timeframe-Bars, die je Strategie auf dem jüngsten fraction-Anteil simuliert werden."""
+    counts: Dict[Tuple[str, str], int] = {}
+    out = np.zeros(len(strategies), dtype=np.int64)
+    for i, s in enumerate(strategies):
+        k = (s.symbol, s.timeframe)
+        if k not in counts:
+            df = frames[s.symbol]
+            counts[k] = len(_resample_cached(df.iloc[_slice_start(len(df), fraction):], s.timeframe))
+        out[i] = counts[k]
+    return out
+
+def backtest_recent(strategies: List[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path, fraction: float = 1.0,
+                    workers: int = 1, prune: PruneRule | None = None, intrabar: bool = False,
+                    frames: Dict[str, pd.DataFrame] | None = None, store: ResultStore | None = None) -> pd.DataFrame:
+    """
+    Wie backtest_all (engine="batch"), aber nur auf dem jüngsten fraction-Anteil der 1m-Historie je Symbol
+    (Slice wie im Forward-Test: iloc[start:]). fraction=1.0 -> identisch zu backtest_all.
+    frames: bereits geladene OHLCV-Frames (werden bei Bedarf ergänzt).
+    """
+    cache = frames if frames is not None else {}
+    for s in strategies:
+        if s.symbol not in cache: cache[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
+    starts = {sym: _slice_start(len(df), fraction) for sym, df in cache.items()}
+    return pd.DataFrame(_run_batch_cached(strategies, cache, starts, cfg, workers, prune, intrabar, store))
@@ -0,0 +1,103 @@
+﻿from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+import pandas as pd
+
+__all__ = ["LRUCache", "BAR_CACHE", "ohlcv_fingerprint", "frame_key", "frame_nbytes"]
+
+# Tag, den _load_ohlcv an df.attrs hängt: (symbol, fingerprint). pandas reicht attrs
+# an Zeilen-Slices (iloc / Bool-Filter) weiter, dadurch bleiben auch OOS-/Lookback-Slices cachebar.
+SOURCE_ATTR = "ohlcv_source"
+
+def ohlcv_fingerprint(symbol: str, ohlcv_dir: Path, last_ts: pd.Timestamp | None) -> Tuple:
+    """Datenversion der Quell-Parquets: (mtime_ns, size) von OHLCV + Funding, plus letzter Timestamp."""
+    parts = []
+    for p in (ohlcv_dir / f"{symbol}_1m.parquet", ohlcv_dir / f"{symbol}_funding_1m.parquet"):
+        try:
+            st = p.stat(); parts.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            parts.append(None)
+    return (*parts, None if last_ts is None else int(pd.Timestamp(last_ts).value))
+
+def frame_key(df: pd.DataFrame) -> Tuple | None:
+    """
+    Cache-Schlüssel eines getaggten Frames: (symbol, fingerprint, Länge, erster, letzter Timestamp).
+    None, wenn der Frame nicht aus _load_ohlcv stammt (dann nicht cachen).
+    Annahme: Slices sind zusammenhängend (iloc[a:b], Zeitfenster) – so nutzt sie das Projekt.
+    """
+    src = df.attrs.get(SOURCE_ATTR)
+    if src is None or df.empty:
+        return None
+    return (src[0], src[1], len(df), int(df.index[0].value), int(df.index[-1].value))
+
+def frame_nbytes(obj: Any) -> int:
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True))
+    return int(getattr(obj, "nbytes", 0))
+
+class LRUCache:
+    """
+    Prozessweiter LRU-Cache mit Byte-Budget und Hit/Miss-Zählern.
+    Werte gelten als read-only – Aufrufer dürfen zurückgegebene Frames nicht verändern.
+    """
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int] = frame_nbytes):
+        self.max_bytes = int(max_bytes)
+        self._size_of = size_of
+        self._data: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+        value = build()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._size_of(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            if size > self.max_bytes:
+                return  # größer als das ganze Budget -> nicht cachen
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and self._data:
+                _, (_, sz) = self._data.popitem(last=False)
+                self.nbytes -= sz
+                self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            while self.nbytes > self.max_bytes and self._data:
+                _, (_, sz) = self._data.popitem(last=False)
+                self.nbytes -= sz
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._data), "bytes": self.nbytes, "max_bytes": self.max_bytes}
+
+# resamplete Bars je (symbol, timeframe, Datenversion, Slice)
+BAR_CACHE = LRUCache(max_bytes=256 * 1024 * 1024)
@@ -6,11 +6,19 @@ DEFAULTS = {
         "correlation_cap": 0.60,
         "max_weight_per_strategy": 0.40,
         "max_weight_per_market": 0.60,
+        "optimizer": "inverse_vol",     # "inverse_vol" | "hrp" | "min_variance" | "erc" (Ledoit–Wolf-Kovarianz)
+    },
+    "portfolio_sweep": {                # --phase sweep: Raster über die Portfolio-Caps, Renditen einmal geladen
+        "correlation_cap": [0.4, 0.5, 0.6, 0.7, 0.8],
+        "max_weight_per_strategy": [0.2, 0.3, 0.4, 0.5],
+        "max_weight_per_market": [0.4, 0.5, 0.6, 0.7, 0.8],
     },
     "forward": {
         "oos_fraction": 0.60,
         "n_splits": 1,
         "min_passes": 1,
+        "single_pass": True,            # Multi-Split: alle Splits je Gruppe in einem Kernel-Durchgang
+        "warm_start": False,            # OOS-Signale aus den Indikatoren der vollen Reihe (kein Kaltstart je Split)
     },
     "paper": {
         "lookback_days": 14,
@@ -23,6 +31,43 @@ DEFAULTS = {
         "daily_loss_limit_pct": 0.02,   # 2% vom Tages-Start-Equity
         "use_portfolio_weights": True   # Risk fraction pro Trade * Portfolio-Gewicht
     },
+    "compute": {
+        "workers": 1,                   # Prozesse für Backtest/Forward; 0 = alle Kerne
+        "prune": False,                 # Backtest bricht sicher abgelehnte Strategien früh ab
+    },
+    "search": {
+        "mode": "random",               # "random" (n_per_symbol Zufallskandidaten) | "coarse_fine" | "halving" | "genetic"
+        "n_per_symbol": 20,
+        "budget": 240,                  # coarse_fine: max. Bewertungen insgesamt
+        "coarse_fraction": 0.5,         # Anteil des Budgets für das Grobraster
+        "top_k": 8,                     # Verfeinerung um die k besten
+        "seed": 42,
+        "halving_min_fraction": 0.125,  # halving: erste Stufe auf dem jüngsten Anteil der Historie
+        "halving_keep": 0.5,            # halving: Anteil, der je Stufe weiterkommt
+        "population": 48,               # genetic: Kandidaten je Generation
+        "elite": 8,
+        "mutation_rate": 0.2,
+        "checkpoint": "results/backtests/search_checkpoint.json",  # genetic: Fortsetzen nach Abbruch
+    },
+    "result_store": {
+        "enabled": True,                # Backtest-Ergebnisse je (Config, Risiko, Daten) wiederverwenden
+        "path": "results/cache/backtests",
+        "max_mb": 512,                  # darüber werden die ältesten Einträge gelöscht
+    },
+    "backtest": {
+        "intrabar_stops": False,        # 5m/15m: Stop-Treffer gegen die 1m-Bars auflösen (auch DryRouter)
+    },
+    "evaluation": {
+        "min_trades": 10,               # Akzeptanz-Schwellen (Backtest, Forward, Pruning)
+        "max_mdd_floor": -0.60,
+        "min_avg_month": 0.0,
+        "worst_month_floor": -0.50,
+    },
+    "results": {
+        "store": "results/store",       # Metriken je Phase/Split als Parquet (phase=.../split=...)
+        "csv": True,                    # zusätzlich metrics.csv / accepted_metrics.csv wie bisher
+        "daily_equity": True,           # Backtest-Phase legt Tageskurven je Strategie ab (Portfolio/Validierung)
+    },
 }
 
 def load_extras(cfg_path: str = "config/config.yaml") -> dict:
@@ -1,47 +1,116 @@
 ﻿from __future__ import annotations
 from pathlib import Path
+from typing import Dict, List, NamedTuple
+import numpy as np
 import pandas as pd, json
 
 def _row_key(r: dict) -> str:
     tf = r.get("timeframe", "1m")
     return f"{r['symbol']}|f{int(r['fast'])}|s{int(r['slow'])}|sl{float(r['stop_loss_pct']):.4f}|{tf}"
 
+def _frame_keys(df: pd.DataFrame) -> pd.Series:
+    """_row_key spaltenweise für einen ganzen Frame."""
+    tf = df["timeframe"].astype(str) if "timeframe" in df.columns else "1m"
+    return (df["symbol"].astype(str) + "|f" + df["fast"].astype(np.int64).astype(str)
+            + "|s" + df["slow"].astype(np.int64).astype(str)
+            + "|sl" + df["stop_loss_pct"].astype(np.float64).map("{:.4f}".format) + "|" + tf)
+
+# Standard-Grenzen; auch Basis für das Pruning im Backtest (backtest.PruneRule)
+MIN_TRADES = 10          # etwas lockerer für kurze Splits
+MAX_MDD_FLOOR = -0.60
+
+# Spalten, die die Akzeptanz liest (fehlende zählen wie in accept_row als 0 / False)
+ACCEPT_COLUMNS = ["pruned", "trades", "max_drawdown", "avg_monthly_return", "worst_month", "net_return"]
+KEY_COLUMNS = ["symbol", "timeframe", "fast", "slow", "stop_loss_pct"]
+
+def thresholds(section: Dict | None) -> Dict:
+    """Akzeptanz-Schwellen aus der extras-Sektion evaluation (fehlende -> Standard) als kwargs."""
+    sec = section or {}
+    return {"min_trades": int(sec.get("min_trades", MIN_TRADES)),
+            "max_mdd_floor": float(sec.get("max_mdd_floor", MAX_MDD_FLOOR)),
+            "min_avg_month": float(sec.get("min_avg_month", 0.0)),
+            "worst_month_floor": float(sec.get("worst_month_floor", -0.50))}
+
+def accept_row(row, min_trades: int = MIN_TRADES, max_mdd_floor: float = MAX_MDD_FLOOR,
+               min_avg_month: float = 0.00, worst_month_floor: float = -0.50) -> bool:
+    """Akzeptanzkriterium einer Metrik-Zeile (dict oder Series), z. B. in der Suche; für Frames: accept_mask."""
+    if bool(row.get("pruned", False)):
+        return False  # im Backtest abgebrochen -> sicher durchgefallen
+    trades = int(row.get("trades", 0))
+    mdd = float(row.get("max_drawdown", 0.0))
+    if trades < min_trades or mdd < max_mdd_floor:
+        return False
+    am = float(row.get("avg_monthly_return", 0.0))
+    wm = float(row.get("worst_month", 0.0))
+    monthly_available = (abs(am) + abs(wm)) > 1e-12
+    if monthly_available:
+        return (am >= min_avg_month) and (wm > worst_month_floor) and (float(row.get("net_return", 0.0)) > 0.0)
+    else:
+        # kurzer OOS-Split: fallback auf NetReturn > 0
+        return float(row.get("net_return", 0.0)) > 0.0
+
+def accept_mask(df: pd.DataFrame, min_trades: int = MIN_TRADES, max_mdd_floor: float = MAX_MDD_FLOOR,
+                min_avg_month: float = 0.00, worst_month_floor: float = -0.50) -> np.ndarray:
+    """accept_row für alle Zeilen als boolesche Spaltenausdrücke (gleiche Semantik inkl. NaN)."""
+    n = len(df)
+    col = lambda c: df[c].to_numpy(dtype=np.float64) if c in df.columns else np.zeros(n)
+    pruned = df["pruned"].to_numpy().astype(bool) if "pruned" in df.columns else np.zeros(n, dtype=bool)
+    trades = np.trunc(np.nan_to_num(col("trades")))
+    mdd, am, wm, net = col("max_drawdown"), col("avg_monthly_return"), col("worst_month"), col("net_return")
+    monthly_available = (np.abs(am) + np.abs(wm)) > 1e-12
+    monthly_ok = (am >= min_avg_month) & (wm > worst_month_floor) & (net > 0.0)
+    return ~pruned & ~(trades < min_trades) & ~(mdd < max_mdd_floor) & np.where(monthly_available, monthly_ok, net > 0.0)
+
+class Evaluation(NamedTuple):
+    """Ergebnis von evaluate_metrics: Metriken mit Spalte is_accepted + akzeptierte Strategie-Dicts."""
+    metrics: pd.DataFrame
+    accepted: List[dict]
+
+def evaluate_metrics(df: pd.DataFrame, strategies: List[dict],
+                     min_trades: int = MIN_TRADES,
+                     max_mdd_floor: float = MAX_MDD_FLOOR,
+                     min_avg_month: float = 0.00,
+                     worst_month_floor: float = -0.50) -> Evaluation:
+    """
+    Bewertung im Speicher: setzt is_accepted (Kopie von df) und ordnet die akzeptierten Zeilen den
+    Strategie-Dicts (model_dump) zu, in deren Reihenfolge. Keine Dateien – dafür save_evaluation.
+    """
+    df = df.copy()
+    df["is_accepted"] = accept_mask(df, min_trades, max_mdd_floor, min_avg_month, worst_month_floor)
+    if not len(df) or not strategies:
+        return Evaluation(df, [])
+    acc_keys = pd.Index(_frame_keys(df[df["is_accepted"]]))
+    hit = _frame_keys(pd.DataFrame(strategies)).isin(acc_keys).to_numpy()
+    return Evaluation(df, [s for s, h in zip(strategies, hit) if h])
+
+def save_evaluation(out_dir: Path, ev: Evaluation, metrics: pd.DataFrame | None = None,
+                    strategies_text: str | None = None, csv: bool = True) -> None:
+    """
+    Schreibt eine Bewertung wie evaluate_and_save (accepted_metrics.csv, accepted_strategies.json);
+    optional zusätzlich metrics.csv und strategies.json (bereits serialisiert, für mehrere Splits teilbar).
+    csv=False: nur die JSON-Dateien (Metriken liegen dann allein im Parquet-Store, metrics_store).
+    """
+    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+    if metrics is not None and csv:
+        (out / "metrics.csv").write_text(metrics.to_csv(index=False), encoding="utf-8")
+    if strategies_text is not None:
+        (out / "strategies.json").write_text(strategies_text, encoding="utf-8")
+    if csv:
+        (out / "accepted_metrics.csv").write_text(ev.metrics.to_csv(index=False), encoding="utf-8")
+    (out / "accepted_strategies.json").write_text(json.dumps(ev.accepted, indent=2), encoding="utf-8")
+
 def evaluate_and_save(metrics_csv: str, strategies_json: str, out_dir: str,
-                      min_trades: int = 10,            # etwas lockerer für kurze Splits
-                      max_mdd_floor: float = -0.60,
+                      min_trades: int = MIN_TRADES,
+                      max_mdd_floor: float = MAX_MDD_FLOOR,
                       min_avg_month: float = 0.00,
                       worst_month_floor: float = -0.50):
-    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+    """Dateibasierte Variante: liest metrics.csv + strategies.json, bewertet (evaluate_metrics) und schreibt."""
     df = pd.read_csv(metrics_csv)
-
-    def _accept(row):
-        trades = int(row.get("trades", 0))
-        mdd = float(row.get("max_drawdown", 0.0))
-        if trades < min_trades or mdd < max_mdd_floor:
-            return False
-        am = float(row.get("avg_monthly_return", 0.0))
-        wm = float(row.get("worst_month", 0.0))
-        monthly_available = (abs(am) + abs(wm)) > 1e-12
-        if monthly_available:
-            return (am >= min_avg_month) and (wm > worst_month_floor) and (float(row.get("net_return", 0.0)) > 0.0)
-        else:
-            # kurzer OOS-Split: fallback auf NetReturn > 0
-            return float(row.get("net_return", 0.0)) > 0.0
-
-    df["is_accepted"] = df.apply(_accept, axis=1)
-    (out / "accepted_metrics.csv").write_text(df.to_csv(index=False), encoding="utf-8")
-
     # Strategien mappen
     try:
         strats = json.loads(Path(strategies_json).read_text(encoding="utf-8"))
     except Exception:
         strats = []
-    acc_keys = {_row_key(r) for _, r in df[df["is_accepted"]].iterrows()}
-
-    def _skey(d):
-        tf = d.get("timeframe", "1m")
-        return f"{d['symbol']}|f{int(d['fast'])}|s{int(d['slow'])}|sl{float(d['stop_loss_pct']):.4f}|{tf}"
-
-    accepted = [s for s in strats if _skey(s) in acc_keys]
-    (out / "accepted_strategies.json").write_text(json.dumps(accepted, indent=2), encoding="utf-8")
-    return df
+    ev = evaluate_metrics(df, strats, min_trades, max_mdd_floor, min_avg_month, worst_month_floor)
+    save_evaluation(Path(out_dir), ev)
+    return ev.metrics
@@ -5,19 +5,13 @@ import json
 import pandas as pd
 from .config_loader import load_config
 from .strategy_blocks import StrategyConfig
-from .backtest import _load_ohlcv, backtest_one
-
-# try import of the extended logger
-try:
-    from .backtest import backtest_one_with_trades as _bt_with_trades
-except Exception:
-    _bt_with_trades = None
+from .backtest import _load_ohlcv, backtest_one_with_trades
 
 def _key_of(d: dict) -> str:
     tf = d.get("timeframe", "1m")
     return f"{d['symbol']}|f{int(d['fast'])}|s{int(d['slow'])}|sl{float(d['stop_loss_pct']):.4f}|{tf}"
 
-def run_paper(lookback_days: int = 14) -> Dict:
+def run_paper(lookback_days: int = 14, intrabar: bool = False) -> Dict:
     root = Path(".")
     cfg = load_config("config/config.yaml")
     ohlcv_dir = Path(cfg.paths.processed) / "ohlcv"
@@ -68,15 +62,12 @@ def run_paper(lookback_days: int = 14) -> Dict:
             cutoff = df.index.max() - pd.Timedelta(days=int(lookback_days))
             df = df[df.index >= cutoff]
 
-        if _bt_with_trades is not None:
-            m, eq, tr = _bt_with_trades(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
-            if isinstance(tr, pd.DataFrame) and not tr.empty:
-                tr = tr.copy()
-                tr["strategy_key"] = k
-                tr["weight"] = float(w)
-                trades_frames.append(tr)
-        else:
-            m, eq = backtest_one(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
+        m, eq, tr = backtest_one_with_trades(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage,
+                                             intrabar=intrabar)
+        if not tr.empty:
+            tr["strategy_key"] = k
+            tr["weight"] = float(w)
+            trades_frames.append(tr)
 
         if eq.empty: continue
         eq_norm[k] = eq / float(eq.iloc[0])
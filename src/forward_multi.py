@@ -5,8 +5,9 @@ import json
 import math
 import pandas as pd
 from .strategy_blocks import StrategyConfig
-from .backtest import _load_ohlcv, backtest_one
-from .evaluation import evaluate_and_save
+from .backtest import _load_ohlcv, plan_batch_jobs, resolve_workers, run_batch_jobs
+from .evaluation import Evaluation, evaluate_metrics, save_evaluation
+from .metrics_store import write_phase
 
 def _key_no_tf(d: dict) -> str:
     return f"{d['symbol']}|{int(d['fast'])}|{int(d['slow'])}|{float(d['stop_loss_pct'])}"
@@ -34,13 +35,31 @@ def run_forward_multi(strategies: List[StrategyConfig],
                       out_dir: Path,
                       total_oos_frac: float = 0.60,
                       n_splits: int = 3,
-                      min_passes: int | None = None) -> Dict:
+                      min_passes: int | None = None,
+                      workers: int = 1,
+                      intrabar: bool = False,
+                      single_pass: bool = True,
+                      warm_start: bool = False,
+                      save_splits: bool = True,
+                      thresholds: Dict | None = None,
+                      results_root: Path | None = None,
+                      csv: bool = True) -> Dict:
     """
     Multi-Split Forward:
       - erzeugt n_splits OOS-Segmente über die letzten total_oos_frac der Daten
       - bewertet je Split und speichert metrics/accepted
       - aggregiert Accepted-Strategien: min_passes von n_splits müssen bestanden sein
       - schreibt forward_tests/accepted_strategies.json (aggregiert)
+    workers > 1 verteilt alle (Split, symbol, timeframe)-Gruppen auf einen Prozess-Pool.
+    single_pass: alle Splits einer (symbol, timeframe)-Gruppe in einem Job (backtest_splits) – ein
+    Resample der vollen Reihe, ein Kernel-Durchgang; Ergebnisse je Split identisch. Mit intrabar
+    wird weiter je Split gerechnet.
+    warm_start: Indikatoren an den Split-Grenzen aus der vollen Reihe (siehe forward_test_all).
+    Bewertung und Aggregation laufen im Speicher (evaluate_metrics); save_splits schreibt danach die
+    Dateien je Split (metrics.csv, strategies.json, accepted_*). Rückgabe enthält die aggregierten
+    Strategie-Dicts unter "accepted". thresholds: kwargs für evaluate_metrics (config: evaluation);
+    results_root: Metriken je Split zusätzlich als Parquet-Partition phase=forward/split=NN;
+    csv=False lässt dann metrics.csv/accepted_metrics.csv je Split weg.
     """
     out_dir.mkdir(parents=True, exist_ok=True)
     if min_passes is None:
@@ -51,74 +70,78 @@ def run_forward_multi(strategies: List[StrategyConfig],
 
     # Sammle Metrics je Split
     per_split_counts = []
-    accepted_keys_per_split: List[set] = []
-    split_dirs: List[Path] = []
 
-    for split_idx in range(1, n_splits + 1):
-        rows = []
-        for s in strategies:
-            if s.symbol not in data_cache:
-                data_cache[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
-            df_full = data_cache[s.symbol]
+    # Strategien je (symbol, timeframe) gemeinsam rechnen; single_pass: alle Splits einer Gruppe in
+    # einem Job, sonst ein Job je Split. Alle Jobs werden vorab geplant und in einem Rutsch ausgeführt
+    by_symbol: Dict[str, List[int]] = {}
+    for i, s in enumerate(strategies):
+        by_symbol.setdefault(s.symbol, []).append(i)
+    jobs, job_slots, job_split = [], [], []
+    for sym in by_symbol:
+        if sym not in data_cache:
+            data_cache[sym] = _load_ohlcv(sym, ohlcv_dir)
+    if single_pass and not intrabar:
+        for sym, idxs in by_symbol.items():
+            df_full = data_cache[sym]
             if len(df_full) < 100:
                 continue
-
             segs = _split_segments(len(df_full), total_oos_frac, n_splits)
-            a, b = segs[split_idx - 1]
-            df_oos = df_full.iloc[a:b]
-            if df_oos.empty:
+            live = tuple(k for k, (a, b) in enumerate(segs, start=1) if b > a)
+            if not live:
                 continue
+            j, sl = plan_batch_jobs([strategies[i] for i in idxs], resolve_workers(workers),
+                                    segments=[segs[k - 1] for k in live], warm_start=warm_start)
+            jobs += j; job_slots += [[idxs[k] for k in part] for part in sl]; job_split += [live] * len(j)
+    else:
+        for split_idx in range(1, n_splits + 1):
+            for sym, idxs in by_symbol.items():
+                df_full = data_cache[sym]
+                if len(df_full) < 100:
+                    continue
 
-            m, _ = backtest_one(df_oos, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
-            m["timeframe"] = s.timeframe
-            rows.append(m)
-
-        # Output je Split
-        split_dir = out_dir / f"split_{split_idx:02d}"
-        split_dir.mkdir(parents=True, exist_ok=True)
-        split_dirs.append(split_dir)
+                segs = _split_segments(len(df_full), total_oos_frac, n_splits)
+                a, b = segs[split_idx - 1]
+                if b <= a:  # leeres OOS-Segment
+                    continue
 
-        df_metrics = pd.DataFrame(rows)
-        (split_dir / "metrics.csv").write_text(df_metrics.to_csv(index=False), encoding="utf-8")
-        (split_dir / "strategies.json").write_text(
-            json.dumps([s.model_dump() for s in strategies], indent=2),
-            encoding="utf-8"
-        )
+                j, sl = plan_batch_jobs([strategies[i] for i in idxs], resolve_workers(workers), start=a, stop=b,
+                                        intrabar=intrabar, warm_start=warm_start)
+                jobs += j; job_slots += [[idxs[k] for k in part] for part in sl]; job_split += [(split_idx,)] * len(j)
 
-        # Bewertung je Split
-        df_acc = evaluate_and_save(str(split_dir / "metrics.csv"),
-                                   str(split_dir / "strategies.json"),
-                                   str(split_dir))
-        acc = df_acc[df_acc.get("is_accepted", False) == True]
-        count_acc = int(acc.shape[0])
-        per_split_counts.append(count_acc)
+    split_rows: Dict[int, List[Dict | None]] = {k: [None] * len(strategies) for k in range(1, n_splits + 1)}
+    outputs = run_batch_jobs(data_cache, jobs, cfg.risk.starting_capital, cfg.risk.max_leverage, workers)
+    for splits, idxs, rows_job in zip(job_split, job_slots, outputs):
+        # Segment-Jobs liefern die Zeilen Split für Split hintereinander
+        for n_seg, split_idx in enumerate(splits):
+            for i, m in zip(idxs, rows_job[n_seg * len(idxs):(n_seg + 1) * len(idxs)]):
+                split_rows[split_idx][i] = m
 
-        # Set akzeptierter Keys (ohne TF, identisch zu main.py-Intersection-Logik)
-        # Falls evaluate_and_save accepted_strategies.json generiert hat, lese daraus
-        acc_path = split_dir / "accepted_strategies.json"
-        if acc_path.exists():
-            accepted = json.loads(acc_path.read_text(encoding="utf-8"))
-            keys = {_key_no_tf(d) for d in accepted}
-        else:
-            # Fallback: aus df_acc
-            keys = {_key_no_tf(row) for _, row in acc.to_dict(orient="index").items()}
-        accepted_keys_per_split.append(keys)
+    # Bewertung je Split im Speicher; Dateien danach gesammelt (strategies.json einmal serialisiert)
+    strat_dicts = [s.model_dump() for s in strategies]
+    evaluations: List[Tuple[pd.DataFrame, Evaluation]] = []
+    for split_idx in range(1, n_splits + 1):
+        df_metrics = pd.DataFrame([m for m in split_rows[split_idx] if m is not None])
+        ev = evaluate_metrics(df_metrics, strat_dicts, **(thresholds or {}))
+        evaluations.append((df_metrics, ev))
+        per_split_counts.append(int(ev.metrics["is_accepted"].sum()) if len(ev.metrics) else 0)
 
-    # Aggregation über Splits: min_passes
+    # Aggregation über Splits: min_passes (Keys ohne TF, identisch zu main.py-Intersection-Logik)
     passes: Dict[str, int] = {}
     first_seen: Dict[str, dict] = {}
-    for split_dir in split_dirs:
-        acc_path = split_dir / "accepted_strategies.json"
-        if not acc_path.exists():
-            continue
-        accepted = json.loads(acc_path.read_text(encoding="utf-8"))
-        for d in accepted:
+    for _, ev in evaluations:
+        for d in ev.accepted:
             k = _key_no_tf(d)
             passes[k] = passes.get(k, 0) + 1
             if k not in first_seen:
                 first_seen[k] = d
-
     kept = [first_seen[k] for k, c in passes.items() if c >= int(min_passes)]
+
+    if results_root is not None:
+        write_phase(results_root, "forward", {k: ev.metrics for k, (_, ev) in enumerate(evaluations, start=1)})
+    if save_splits:
+        strategies_text = json.dumps(strat_dicts, indent=2)
+        for split_idx, (df_metrics, ev) in enumerate(evaluations, start=1):
+            save_evaluation(out_dir / f"split_{split_idx:02d}", ev, df_metrics, strategies_text, csv=csv)
     # Schreibe aggregierte Accepted
     agg_path = out_dir / "accepted_strategies.json"
     agg_path.write_text(json.dumps(kept, indent=2), encoding="utf-8")
@@ -129,4 +152,5 @@ def run_forward_multi(strategies: List[StrategyConfig],
         "splits": n_splits,
         "min_passes": int(min_passes),
         "out_dir": str(out_dir),
+        "accepted": kept,
     }
@@ -4,32 +4,46 @@ from typing import Dict, List
 import json
 import pandas as pd
 from .strategy_blocks import StrategyConfig
-from .backtest import backtest_one, _load_ohlcv
+from .backtest import _load_ohlcv, plan_batch_jobs, resolve_workers, run_batch_jobs
 from .config_loader import GlobalConfig
+from .evaluation import evaluate_metrics, save_evaluation
+from .metrics_store import write_phase
 
-def forward_test_all(strategies: List[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path, oos_fraction: float = 0.30) -> pd.DataFrame:
+def forward_test_all(strategies: List[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path, oos_fraction: float = 0.30,
+                     workers: int = 1, intrabar: bool = False, warm_start: bool = False) -> pd.DataFrame:
     """
     Einfaches OOS-Testen: nimmt die letzten oos_fraction der Daten als Out-of-Sample
-    und wertet die Strategien dort aus (nutzt denselben backtest_one, aber auf OOS-Slice).
+    und wertet die Strategien dort aus (gleiche Engine wie backtest_all, aber auf OOS-Slice).
+    workers > 1 rechnet die (symbol, timeframe)-Gruppen parallel; intrabar wie bei backtest_all.
+    warm_start: SMAs/ATR an der OOS-Grenze aus der vollen Reihe übernehmen -> Signale ab der ersten OOS-Bar.
     """
-    results = []
     cache: Dict[str, pd.DataFrame] = {}
-    for s in strategies:
-        if s.symbol not in cache:
-            cache[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
-        df = cache[s.symbol]
+    jobs, slots = [], []
+    by_symbol: Dict[str, List[int]] = {}
+    for i, s in enumerate(strategies):
+        by_symbol.setdefault(s.symbol, []).append(i)
+    for sym, idxs in by_symbol.items():
+        cache[sym] = _load_ohlcv(sym, ohlcv_dir)
+        df = cache[sym]
         if len(df) < 500:  # minimaler Puffer
             continue
         split = max(1, int(len(df) * (1 - oos_fraction)))
-        df_oos = df.iloc[split:]
-        m, _ = backtest_one(df_oos, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
-        m["phase"] = "forward_oos"
-        results.append(m)
-    return pd.DataFrame(results)
+        j, sl = plan_batch_jobs([strategies[i] for i in idxs], resolve_workers(workers), start=split, intrabar=intrabar,
+                                warm_start=warm_start)
+        jobs += j; slots += [[idxs[k] for k in part] for part in sl]
 
-def save_metrics_and_eval(df: pd.DataFrame, strategies_json: Path, out_dir: Path):
-    out_dir.mkdir(parents=True, exist_ok=True)
-    (out_dir / "metrics.csv").write_text(df.to_csv(index=False), encoding="utf-8")
-    # gleiche Akzeptanz-Schwellen wie Backtest verwenden
-    from .evaluation import evaluate_and_save
-    evaluate_and_save(str(out_dir / "metrics.csv"), str(strategies_json), str(out_dir))
+    slots_out: List[Dict | None] = [None] * len(strategies)
+    for idxs, rows in zip(slots, run_batch_jobs(cache, jobs, cfg.risk.starting_capital, cfg.risk.max_leverage, workers)):
+        for i, m in zip(idxs, rows):
+            m["phase"] = "forward_oos"
+            slots_out[i] = m
+    return pd.DataFrame([m for m in slots_out if m is not None])
+
+def save_metrics_and_eval(df: pd.DataFrame, strategies_json: Path, out_dir: Path, thresholds: Dict | None = None,
+                          results_root: Path | None = None, csv: bool = True):
+    # gleiche Akzeptanz-Schwellen wie Backtest verwenden; Bewertung im Speicher, kein CSV-Rücklesen
+    strats = json.loads(Path(strategies_json).read_text(encoding="utf-8"))
+    ev = evaluate_metrics(df, strats, **(thresholds or {}))
+    if results_root is not None:
+        write_phase(results_root, "forward", {1: ev.metrics})
+    save_evaluation(out_dir, ev, metrics=df, csv=csv)
@@ -0,0 +1,198 @@
+﻿from __future__ import annotations
+from typing import Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from .bar_cache import LRUCache, frame_key
+
+__all__ = ["true_range", "sma", "sma_matrix", "atr", "ema", "rolling_std", "rolling_vol",
+           "IndicatorBank", "get_indicator_bank", "BANK_CACHE", "DEFAULT_SMA_WINDOWS"]
+
+# deckt den Suchraum des Generators ab (fast 5–20, slow bis 60)
+DEFAULT_SMA_WINDOWS = range(5, 61)
+
+def sma_matrix(close: np.ndarray, windows: Sequence[int]) -> np.ndarray:
+    """
+    SMA für viele Fenster in einem vektorisierten Durchgang über Präfixsummen.
+    Form (len(windows), len(close)); die ersten w-1 Werte je Zeile sind NaN (min_periods=w).
+    Präfixsummen relativ zum ersten Close -> kleine Beträge, geringer Rundungsfehler.
+    """
+    x = np.asarray(close, dtype=np.float64)
+    W = np.asarray(list(windows), dtype=np.int64)
+    n = len(x)
+    if not n or not len(W):
+        return np.full((len(W), n), np.nan)
+    anchor = x[0]
+    C = np.empty(n + 1); C[0] = 0.0; np.cumsum(x - anchor, out=C[1:])
+    end = np.arange(1, n + 1)
+    start = end[None, :] - W[:, None]
+    valid = start >= 0
+    sums = C[end][None, :] - C[np.maximum(start, 0)]
+    return np.where(valid, anchor + sums / W[:, None], np.nan)
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    """Einzelnes SMA (min_periods=window)."""
+    return sma_matrix(x, [int(window)])[0]
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """max(|h-l|, |h-prev_c|, |l-prev_c|); erste Bar ohne Vorgänger -> |h-l| (wie pandas max(axis=1) mit skipna)."""
+    h = np.asarray(high, dtype=np.float64); l = np.asarray(low, dtype=np.float64)
+    c = np.asarray(close, dtype=np.float64)
+    tr = np.abs(h - l)
+    if len(tr) > 1:
+        pc = c[:-1]
+        tr[1:] = np.fmax(tr[1:], np.fmax(np.abs(h[1:] - pc), np.abs(l[1:] - pc)))
+    return tr
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, periods: int | Sequence[int]) -> np.ndarray:
+    """
+    ATR als SMA der True Range (min_periods=n). Mehrere Perioden auf einmal:
+    periods als Sequenz -> Form (len(periods), bars), sonst 1D.
+    """
+    tr = true_range(high, low, close)
+    if np.ndim(periods) == 0:
+        return sma_matrix(tr, [int(periods)])[0]
+    return sma_matrix(tr, [int(p) for p in periods])
+
+def _ema_one(x: np.ndarray, alpha: float, block: int = 256) -> np.ndarray:
+    # Blockweise geschlossene Form: innerhalb eines Blocks Matrixprodukt mit der
+    # Dreiecks-Toeplitzmatrix, zwischen Blöcken nur der Übertrag des letzten Werts.
+    n = len(x)
+    if not n:
+        return np.empty(0)
+    B = min(int(block), n)
+    decay = 1.0 - alpha
+    j = np.arange(B)
+    lag = j[:, None] - j[None, :]
+    T = np.where(lag >= 0, alpha * decay ** np.maximum(lag, 0), 0.0)
+    carry = decay ** (j + 1)
+    pad = (-n) % B
+    X = np.concatenate([x, np.zeros(pad)]).reshape(-1, B)
+    inner = X @ T.T
+    out = np.empty_like(inner)
+    prev = x[0]  # y_0 = x_0 (adjust=False)
+    for b in range(len(inner)):
+        out[b] = inner[b] + carry * prev
+        prev = out[b, -1]
+    return out.reshape(-1)[:n]
+
+def ema(x: np.ndarray, spans: int | Sequence[int]) -> np.ndarray:
+    """
+    EMA mit alpha = 2/(span+1), rekursiv ohne Bias-Korrektur (wie pandas ewm(span, adjust=False)).
+    Erwartet NaN-freie Eingaben. Mehrere Spans -> Form (len(spans), bars).
+    """
+    v = np.asarray(x, dtype=np.float64)
+    if np.ndim(spans) == 0:
+        return _ema_one(v, 2.0 / (int(spans) + 1.0))
+    return np.vstack([_ema_one(v, 2.0 / (int(s) + 1.0)) for s in spans]) if len(spans) else np.empty((0, len(v)))
+
+def rolling_std(x: np.ndarray, windows: int | Sequence[int], min_periods: int | None = None) -> np.ndarray:
+    """
+    Rollende Stichproben-Std (ddof=1) über Präfixsummen von x und x²; NaN-Werte werden
+    wie bei pandas übersprungen, min_periods zählt gültige Werte (Default: Fenstergröße).
+    """
+    v = np.asarray(x, dtype=np.float64)
+    single = np.ndim(windows) == 0
+    W = np.asarray([int(windows)] if single else [int(w) for w in windows], dtype=np.int64)
+    n = len(v)
+    ok = ~np.isnan(v)
+    center = float(np.nanmean(v)) if ok.any() else 0.0
+    z = np.where(ok, v - center, 0.0)
+    def _prefix(a):
+        c = np.empty(n + 1); c[0] = 0.0; np.cumsum(a, out=c[1:]); return c
+    C1, C2, CN = _prefix(z), _prefix(z * z), _prefix(ok.astype(np.float64))
+    end = np.arange(1, n + 1)
+    start = np.maximum(end[None, :] - W[:, None], 0)
+    cnt = CN[end][None, :] - CN[start]
+    s1 = C1[end][None, :] - C1[start]
+    s2 = C2[end][None, :] - C2[start]
+    mp = W[:, None] if min_periods is None else int(min_periods)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = (s2 - s1 * s1 / cnt) / (cnt - 1)
+    out = np.where((cnt >= np.maximum(mp, 2)), np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return out[0] if single else out
+
+def rolling_vol(close: np.ndarray, windows: int | Sequence[int], min_periods: int | None = None) -> np.ndarray:
+    """Rollende Volatilität: Std der 1-Bar-Logreturns (erste Bar NaN)."""
+    c = np.asarray(close, dtype=np.float64)
+    lr = np.full(len(c), np.nan)
+    if len(c) > 1:
+        lr[1:] = np.diff(np.log(c))
+    return rolling_std(lr, windows, min_periods=min_periods)
+
+class IndicatorBank:
+    """
+    Vorberechnete Indikatoren für ein (symbol, timeframe): alle SMA-Fenster eines Bereichs
+    plus Kreuzungsmasken je (fast, slow). Fenster außerhalb des Bereichs werden bei Bedarf ergänzt.
+    """
+    def __init__(self, close: np.ndarray, windows: Iterable[int] = DEFAULT_SMA_WINDOWS,
+                 high: np.ndarray | None = None, low: np.ndarray | None = None):
+        self.close = np.asarray(close, dtype=np.float64)
+        self.high = None if high is None else np.asarray(high, dtype=np.float64)
+        self.low = None if low is None else np.asarray(low, dtype=np.float64)
+        self._row: Dict[int, int] = {}
+        self._sma = np.empty((0, len(self.close)))
+        self._atr: Dict[int, np.ndarray] = {}
+        self._add_windows(windows)
+
+    def _add_windows(self, windows: Iterable[int]) -> None:
+        new = sorted({int(w) for w in windows} - self._row.keys())
+        if not new:
+            return
+        base = len(self._row)
+        self._sma = np.vstack([self._sma, sma_matrix(self.close, new)])
+        for i, w in enumerate(new):
+            self._row[w] = base + i
+
+    @property
+    def nbytes(self) -> int:
+        extra = sum(a.nbytes for a in (self.high, self.low) if a is not None)
+        return int(self.close.nbytes + self._sma.nbytes + extra + sum(a.nbytes for a in self._atr.values()))
+
+    def atr(self, period: int) -> np.ndarray:
+        """ATR je Periode, einmal gerechnet und gemerkt (benötigt high/low)."""
+        p = int(period)
+        if p not in self._atr:
+            if self.high is None or self.low is None:
+                raise ValueError("IndicatorBank was built without high/low; ATR not available")
+            self._atr[p] = atr(self.high, self.low, self.close, p)
+        return self._atr[p]
+
+    def sma(self, window: int) -> np.ndarray:
+        w = int(window)
+        if w not in self._row:
+            self._add_windows([w])
+        return self._sma[self._row[w]]
+
+    def sma_rows(self, windows: Sequence[int]) -> np.ndarray:
+        self._add_windows(windows)
+        return self._sma[[self._row[int(w)] for w in windows]]
+
+    def cross(self, fast: int, slow: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(cross_up, cross_down) wie (ma_f.shift(1) <= ma_s.shift(1)) & (ma_f > ma_s) bzw. spiegelbildlich."""
+        up, down = self.cross_matrix([(fast, slow)])
+        return up[0], down[0]
+
+    def cross_matrix(self, pairs: Sequence[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Kreuzungsmasken für viele (fast, slow)-Paare auf einmal, Form (len(pairs), bars)."""
+        F = self.sma_rows([p[0] for p in pairs])
+        S = self.sma_rows([p[1] for p in pairs])
+        n = F.shape[1]
+        up = np.zeros(F.shape, dtype=bool); down = np.zeros(F.shape, dtype=bool)
+        if n > 1:
+            f, s, fp, sp = F[:, 1:], S[:, 1:], F[:, :-1], S[:, :-1]
+            up[:, 1:] = (fp <= sp) & (f > s)
+            down[:, 1:] = (fp >= sp) & (f < s)
+        return up, down
+
+# Banks je (symbol, timeframe, Datenversion, Slice) – gleicher Schlüssel wie BAR_CACHE
+BANK_CACHE = LRUCache(max_bytes=256 * 1024 * 1024, size_of=lambda b: b.nbytes)
+
+def get_indicator_bank(df_tf: pd.DataFrame, windows: Iterable[int] = DEFAULT_SMA_WINDOWS) -> IndicatorBank:
+    """Bank für resamplete Bars; über BANK_CACHE geteilt, wenn der Frame aus _load_ohlcv stammt."""
+    key = frame_key(df_tf)
+    build = lambda: IndicatorBank(df_tf["close"].to_numpy(dtype=np.float64), windows,
+                                  high=df_tf["high"].to_numpy(dtype=np.float64),
+                                  low=df_tf["low"].to_numpy(dtype=np.float64))
+    if key is None:
+        return build()
+    return BANK_CACHE.get_or_build(key, build)
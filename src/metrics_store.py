@@ -0,0 +1,105 @@
+﻿from __future__ import annotations
+import json, os, shutil
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+__all__ = ["DEFAULT_ROOT", "EQUITY_FILE", "partition_path", "write_phase", "read_metrics", "write_daily_equity",
+           "read_daily_equity", "open_results"]
+
+# Metrik-Tabellen je Phase/Split als Parquet: <root>/phase=<phase>[/split=<NN>]/metrics.parquet
+DEFAULT_ROOT = Path("results/store")
+_FILE = "metrics.parquet"
+
+def partition_path(root: Path, phase: str, split: int | None = None) -> Path:
+    d = Path(root) / f"phase={phase}"
+    return d if split is None else d / f"split={int(split):02d}"
+
+def write_phase(root: Path, phase: str, parts: Dict[int | None, pd.DataFrame]) -> List[Path]:
+    """
+    Schreibt alle Partitionen einer Phase in einem Schritt ({None: df} ohne Splits, sonst {split: df}).
+    Die Phase wird als Ganzes ersetzt (Aufbau neben dem Ziel, dann Tausch) – keine Splits eines
+    älteren Laufs bleiben liegen, Leser sehen nie eine halb geschriebene Phase.
+    """
+    if None in parts and len(parts) > 1:
+        raise ValueError(f"{phase}: cannot mix an unsplit partition with splits")
+    final = partition_path(root, phase)
+    tmp = final.with_name(final.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    written = []
+    for split, df in parts.items():
+        d = tmp if split is None else tmp / f"split={int(split):02d}"
+        d.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(d / _FILE, index=False)
+        written.append(partition_path(root, phase, split) / _FILE)
+    old = final.with_name(final.name + f".old{os.getpid()}")
+    if final.exists():
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    return written
+
+def read_metrics(root: Path, phase: str, columns: Sequence[str] | None = None,
+                 split: int | None = None) -> pd.DataFrame | None:
+    """
+    Liest eine Phase (oder einen Split) und dabei nur die angefragten Spalten aus den Parquet-Dateien.
+    Über alle Splits gelesen kommt eine Spalte "split" dazu. None, wenn die Partition fehlt.
+    """
+    cols = None if columns is None else list(columns)
+    d = partition_path(root, phase, split)
+    if (d / _FILE).exists():
+        return pd.read_parquet(d / _FILE, columns=cols)
+    files = sorted(d.glob(f"split=*/{_FILE}")) if split is None else []
+    if not files:
+        return None
+    frames = [pd.read_parquet(f, columns=cols).assign(split=int(f.parent.name.split("=", 1)[1])) for f in files]
+    return pd.concat(frames, ignore_index=True)
+
+# Tageskurven je Strategie-Key: <root>/daily_equity.parquet, eine Zeile je Strategie
+EQUITY_FILE = "daily_equity.parquet"
+
+def write_daily_equity(root: Path, entries: Dict[str, Tuple[str, Dict, pd.Series]]) -> Path:
+    """
+    Legt {key: (result_key, metrics, Tages-Equity)} im Artefakt ab: Spalten key, result_key, metrics (JSON),
+    start_equity und max_drawdown (intrabar, aus metrics), tz, day (int64-ns je Tagesende), equity.
+    Vorhandene Zeilen anderer Keys bleiben, gleiche Keys werden ersetzt.
+    """
+    path = Path(root) / EQUITY_FILE
+    rows = []
+    for key, (rk, m, eq) in entries.items():
+        idx = pd.DatetimeIndex(eq.index)
+        rows.append({"key": key, "result_key": rk, "metrics": json.dumps(m),
+                     "start_equity": float(m["start_equity"]), "max_drawdown": float(m["max_drawdown"]),
+                     "tz": str(idx.tz) if idx.tz is not None else "", "day": idx.asi8,
+                     "equity": eq.to_numpy(dtype=np.float64)})
+    df = pd.DataFrame(rows, columns=["key", "result_key", "metrics", "start_equity", "max_drawdown", "tz", "day", "equity"])
+    if path.exists():
+        old = pd.read_parquet(path)
+        old = old[~old["key"].isin(entries)]
+        if not old.columns.equals(df.columns):  # Artefakt eines älteren Stands: Einträge sind ohnehin veraltet
+            old = old.iloc[0:0]
+        df = pd.concat([old, df], ignore_index=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+def read_daily_equity(root: Path, keys: Sequence[str] | None = None) -> Dict[str, Tuple[str, Dict, pd.Series]]:
+    """{key: (result_key, metrics, Tages-Equity)} aus dem Artefakt, optional nur für keys; leer, wenn es fehlt."""
+    path = Path(root) / EQUITY_FILE
+    if not path.exists() or (keys is not None and not len(keys)):
+        return {}
+    df = pd.read_parquet(path, filters=None if keys is None else [("key", "in", list(keys))])
+    out = {}
+    for key, rk, m, tz, day, eq in df[["key", "result_key", "metrics", "tz", "day", "equity"]].itertuples(index=False):
+        index = pd.DatetimeIndex(np.asarray(day, dtype=np.int64).view("datetime64[ns]"))
+        if tz:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        out[key] = (rk, json.loads(m), pd.Series(np.asarray(eq, dtype=np.float64), index=index))
+    return out
+
+def open_results(extras: Dict) -> Path:
+    """Wurzel des Metrik-Stores aus der extras-Sektion results."""
+    return Path(extras.get("results", {}).get("store", DEFAULT_ROOT))
@@ -0,0 +1,107 @@
+﻿from __future__ import annotations
+import json, os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+
+__all__ = ["STORE_DIRNAME", "store_path", "write_store", "convert_parquet", "load_store", "store_is_fresh"]
+
+# Unterordner von ohlcv_dir: <ohlcv_dir>/mmap/<symbol>/{index,open,...,funding}.npy + meta.json
+STORE_DIRNAME = "mmap"
+_META = "meta.json"
+
+def store_path(symbol: str, ohlcv_dir: Path) -> Path:
+    return Path(ohlcv_dir) / STORE_DIRNAME / symbol
+
+def _source_stat(symbol: str, ohlcv_dir: Path) -> List:
+    # gleiche Stat-Teile wie ohlcv_fingerprint -> Store gilt nur für genau diese Parquet-Version
+    out = []
+    for p in (Path(ohlcv_dir) / f"{symbol}_1m.parquet", Path(ohlcv_dir) / f"{symbol}_funding_1m.parquet"):
+        try:
+            st = p.stat(); out.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            out.append(None)
+    return out
+
+def _save_npy(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    with open(tmp, "wb") as fh:
+        np.save(fh, np.ascontiguousarray(arr))
+    os.replace(tmp, path)  # bereits gemappte Leser behalten die alte Datei
+
+def write_store(df: pd.DataFrame, symbol: str, ohlcv_dir: Path) -> Path:
+    """
+    Schreibt einen bereits sortierten und mit Funding gejointen 1m-Frame spaltenweise als .npy.
+    meta.json kommt zuletzt – erst dann gilt der Store als gültig.
+    """
+    idx = df.index
+    if not isinstance(idx, pd.DatetimeIndex):
+        raise ValueError(f"{symbol}: OHLCV store needs a DatetimeIndex")
+    bad = [c for c in df.columns if not np.issubdtype(df[c].dtype, np.number)]
+    if bad:
+        raise ValueError(f"{symbol}: OHLCV store supports numeric columns only, got {bad}")
+    d = store_path(symbol, ohlcv_dir); d.mkdir(parents=True, exist_ok=True)
+    (d / _META).unlink(missing_ok=True)
+    _save_npy(d / "index.npy", idx.asi8)
+    cols = [str(c) for c in df.columns]
+    for c in cols:
+        _save_npy(d / f"{c}.npy", df[c].to_numpy())
+    meta = {"symbol": symbol, "n": len(df), "columns": cols, "index_name": idx.name,
+            "tz": str(idx.tz) if idx.tz is not None else None,
+            "source": _source_stat(symbol, ohlcv_dir)}
+    tmp = d / (_META + f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, d / _META)
+    return d
+
+def convert_parquet(symbols: Iterable[str], ohlcv_dir: Path) -> List[Path]:
+    """Konverter: liest die Parquets wie _load_ohlcv (sortiert, Funding gejoint) und legt je Symbol den Store an."""
+    from .backtest import _read_parquet_ohlcv  # Import hier, backtest nutzt load_store
+    return [write_store(_read_parquet_ohlcv(sym, Path(ohlcv_dir)), sym, Path(ohlcv_dir)) for sym in symbols]
+
+def _read_meta(symbol: str, ohlcv_dir: Path) -> Tuple[dict, int] | None:
+    p = store_path(symbol, ohlcv_dir) / _META
+    try:
+        return json.loads(p.read_text(encoding="utf-8")), p.stat().st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+def store_is_fresh(symbol: str, ohlcv_dir: Path) -> bool:
+    m = _read_meta(symbol, ohlcv_dir)
+    return m is not None and m[0].get("source") == _source_stat(symbol, ohlcv_dir)
+
+# geöffnete memmaps je Store-Verzeichnis, gültig solange meta.json unverändert ist
+_OPEN: Dict[Path, Tuple[int, dict, np.ndarray, Dict[str, np.ndarray]]] = {}
+_OPEN_LOCK = Lock()
+
+def load_store(symbol: str, ohlcv_dir: Path) -> pd.DataFrame | None:
+    """
+    1m-Frame aus dem Store, Werte per memmap ohne Kopie (read-only, Page-Cache über Prozesse geteilt).
+    None, wenn kein Store existiert oder die Quell-Parquets seit der Konvertierung geändert wurden.
+    """
+    m = _read_meta(symbol, ohlcv_dir)
+    if m is None:
+        return None
+    meta, mtime = m
+    if meta.get("source") != _source_stat(symbol, ohlcv_dir):
+        return None
+    d = store_path(symbol, ohlcv_dir)
+    with _OPEN_LOCK:
+        hit = _OPEN.get(d)
+        if hit is None or hit[0] != mtime:
+            n = int(meta["n"])
+            try:
+                ix = np.load(d / "index.npy", mmap_mode="r")
+                cols = {c: np.load(d / f"{c}.npy", mmap_mode="r") for c in meta["columns"]}
+            except (OSError, ValueError):
+                return None
+            if len(ix) != n or any(len(a) != n for a in cols.values()):
+                return None
+            hit = _OPEN[d] = (mtime, meta, ix, cols)
+    _, meta, ix, cols = hit
+    index = pd.DatetimeIndex(ix.view("datetime64[ns]"), name=meta["index_name"])
+    if meta["tz"] is not None:
+        index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    return pd.DataFrame(cols, index=index, copy=False)
@@ -1,29 +1,130 @@
 ﻿from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
 import json
 import numpy as np
 import pandas as pd
 from .config_loader import GlobalConfig
 from .strategy_blocks import StrategyConfig
-from .backtest import _load_ohlcv, backtest_one
+from .backtest import _load_ohlcv
+from .bar_cache import frame_key
+from .metrics_store import read_daily_equity, write_daily_equity
+from .result_store import ResultStore, cached_backtest_one, result_key
+
+def strategy_key(s: StrategyConfig) -> str:
+    return f"{s.symbol}|f{s.fast}|s{s.slow}|sl{float(s.stop_loss_pct):.4f}|{getattr(s,'timeframe','1m')}"
+
+def _equity_key(s: StrategyConfig, df: pd.DataFrame, cfg: GlobalConfig, intrabar: bool) -> str | None:
+    # gleicher Schlüssel wie der ResultStore (ohne Pruning) -> Artefakt-Eintrag veraltet, sobald Config/Risiko/Daten wechseln
+    data = frame_key(df)
+    return None if data is None else result_key(s, cfg.risk.starting_capital, cfg.risk.max_leverage, data, intrabar=intrabar)
+
+def save_daily_equity(root: Path, strategies: List[StrategyConfig], metrics: pd.DataFrame, cfg: GlobalConfig,
+                      ohlcv_dir: Path, intrabar: bool = False) -> int:
+    """
+    Tageskurven aus einem Backtest-Lauf (Spalte "daily_equity", backtest_all(daily=True)) ins Artefakt, mit
+    Start-Equity (Equity nach der ersten Bar) und intrabar max_drawdown aus den Metriken. Gestoppte Strategien
+    (None) fehlen dort und werden bei Bedarf nachgerechnet. Liefert die Anzahl Einträge.
+    """
+    frames: Dict[str, pd.DataFrame] = {}
+    entries: Dict[str, Tuple[str, Dict, pd.Series]] = {}
+    for s, row in zip(strategies, metrics.to_dict(orient="records")):
+        eq = row.pop("daily_equity", None)
+        if eq is None:
+            continue
+        if s.symbol not in frames:
+            frames[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
+        rk = _equity_key(s, frames[s.symbol], cfg, intrabar)
+        if rk is not None:
+            row.pop("pruned", None); row.pop("pruned_at", None)
+            entries[strategy_key(s)] = (rk, row, eq)
+    if entries:
+        write_daily_equity(root, entries)
+    return len(entries)
+
+def daily_equity_map(strategies: Sequence[StrategyConfig], cfg: GlobalConfig, ohlcv_dir: Path, intrabar: bool = False,
+                     store: ResultStore | None = None, root: Path | None = None) -> Dict[str, Tuple[Dict, pd.Series]]:
+    """
+    {Strategie-Key: (Metriken, Tages-Equity)}. Quelle ist das Artefakt der Backtest-Phase (root), solange dessen
+    result_key passt; fehlende oder veraltete Einträge werden gerechnet (über den ResultStore) und zurückgeschrieben.
+    OHLCV wird je Symbol einmal geladen.
+    """
+    saved = {} if root is None else read_daily_equity(root, [strategy_key(s) for s in strategies])
+    frames: Dict[str, pd.DataFrame] = {}
+    out: Dict[str, Tuple[Dict, pd.Series]] = {}
+    fresh: Dict[str, Tuple[str, Dict, pd.Series]] = {}
+    for s in strategies:
+        if s.symbol not in frames:
+            frames[s.symbol] = _load_ohlcv(s.symbol, ohlcv_dir)
+        key = strategy_key(s); rk = _equity_key(s, frames[s.symbol], cfg, intrabar)
+        hit = saved.get(key)
+        if hit is not None and rk is not None and hit[0] == rk:
+            out[key] = hit[1], hit[2]
+            continue
+        m, eq = cached_backtest_one(store, frames[s.symbol], s, cfg.risk.starting_capital, cfg.risk.max_leverage,
+                                    equity="daily", intrabar=intrabar)
+        out[key] = m, eq
+        if rk is not None:
+            fresh[key] = (rk, m, eq)
+    if root is not None and fresh:
+        write_daily_equity(root, fresh)
+    return out
 
 def _daily_returns(eq: pd.Series) -> pd.Series:
     return eq.resample("D").last().pct_change().dropna()
 
+# |corr - corr_cap| darunter (oder numerisch entartet) -> exakt wie Series.corr nachrechnen
+_CORR_TOL = 1e-9
+
+def _corr_with(X: np.ndarray, X2: np.ndarray, V: np.ndarray, j: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pearson-Korrelation aller Spalten mit Spalte j über die jeweils gemeinsam gültigen Zeilen (pairwise
+    complete wie Series.corr). X: spaltenweise zentrierte Renditen (0 an NaN-Stellen), X2 = X*X, V: Gültigkeit.
+    Liefert (corr, unsicher): unsicher, wo der Wert nicht endlich, entartet oder zu nah am Cap sein kann.
+    """
+    v = V[:, j]; x = X[:, j]
+    n = V.T @ v
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sa = X.T @ v; sb = V.T @ x
+        saa = X2.T @ v; sbb = V.T @ (x * x)
+        va = saa - sa * sa / n; vb = sbb - sb * sb / n
+        corr = (X.T @ x - sa * sb / n) / np.sqrt(va * vb)
+        shaky = ~np.isfinite(corr) | (va <= 1e-12 * saa) | (vb <= 1e-12 * sbb)
+    return corr, shaky
+
 def _select_with_corr(ret_map: Dict[str, pd.Series], score: pd.Series, corr_cap: float = 0.8, max_n: int | None = 10) -> List[str]:
+    """
+    Greedy nach Score: eine Strategie kommt dazu, wenn ihre Korrelation zu keiner bereits gewählten über corr_cap liegt.
+    Eine ausgerichtete Rendite-Matrix; je gewählter Strategie die Korrelationen zu allen Kandidaten in einem
+    NumPy-Schritt, blockierte Kandidaten als Maske. Werte im Toleranzband um den Cap werden mit Series.corr
+    nachgeprüft -> dieselbe Auswahl wie der paarweise Vergleich.
+    """
+    order = list(score.sort_values(ascending=False).index)
+    if not order:
+        return []
+    R = pd.concat({k: ret_map[k] for k in order}, axis=1).to_numpy(dtype=np.float64)
+    V = ~np.isnan(R)
+    with np.errstate(invalid="ignore"):
+        mean = np.where(V, R, 0.0).sum(axis=0) / V.sum(axis=0)
+    X = np.where(V, R - mean, 0.0); X2 = X * X; V = V.astype(np.float64)
+    blocked = np.zeros(len(order), dtype=bool)
+    check: List[List[int]] = [[] for _ in order]   # gewählte Spalten, gegen die exakt geprüft werden muss
     chosen: List[str] = []
-    for key in score.sort_values(ascending=False).index:
-        ok = True
-        for c in chosen:
-            corr = ret_map[key].corr(ret_map[c])
-            if pd.notna(corr) and corr > corr_cap:
-                ok = False
-                break
-        if ok:
-            chosen.append(key)
-            if max_n and len(chosen) >= max_n:
-                break
+    for i, key in enumerate(order):
+        if blocked[i]:
+            continue
+        exact = (ret_map[key].corr(ret_map[order[j]]) for j in check[i])
+        if any(pd.notna(c) and c > corr_cap for c in exact):
+            continue
+        chosen.append(key)
+        if max_n and len(chosen) >= max_n:
+            break
+        corr, shaky = _corr_with(X, X2, V, i)
+        shaky |= np.abs(corr - corr_cap) <= _CORR_TOL
+        blocked |= ~shaky & (corr > corr_cap)
+        for r in np.flatnonzero(shaky & ~blocked).tolist():
+            check[r].append(i)
     return chosen
 
 def _risk_parity_weights(ret_map: Dict[str, pd.Series], keys: List[str], max_w: float) -> pd.Series:
@@ -35,112 +136,355 @@ def _risk_parity_weights(ret_map: Dict[str, pd.Series], keys: List[str], max_w:
     # nicht normalisieren – das machen wir nach den Caps
     return w
 
-def _apply_caps_strict(w: pd.Series, symbol_of: Dict[str, str], max_w: float, market_cap: float, max_iters: int = 20) -> pd.Series:
-    # 1) pro-Strategie-Kappung
-    w = w.clip(upper=max_w)
+def _returns_matrix(ret_map: Dict[str, pd.Series], keys: List[str]) -> np.ndarray:
+    # Tage x Strategien, NaN wo eine Strategie an einem Tag keinen Wert hat
+    return pd.concat({k: ret_map[k] for k in keys}, axis=1).dropna(how="all").to_numpy(dtype=np.float64)
+
+def _shrunk_cov(R: np.ndarray) -> np.ndarray:
+    """
+    Ledoit–Wolf-Kovarianz: Stichproben-Kovarianz, geschrumpft zu mu*I (mu = mittlere Varianz) mit der
+    geschätzten optimalen Intensität. Fehlende Tage zählen als Spaltenmittel. Bleibt bei mehr Strategien
+    als Tagen positiv definit.
+    """
+    valid = ~np.isnan(R)
+    X = np.where(valid, R - np.nanmean(R, axis=0), 0.0)
+    T, N = X.shape
+    S = X.T @ X / T
+    mu = np.trace(S) / N
+    d2 = float((S * S).sum()) - N * mu * mu                        # ||S - mu I||^2
+    b2 = float(((X * X).sum(axis=1) ** 2).sum()) / T**2 - float((S * S).sum()) / T
+    shrink = min(max(b2, 0.0), d2) / d2 if d2 > 0 else 1.0
+    C = (1.0 - shrink) * S
+    C[np.diag_indices(N)] += shrink * mu
+    return C
+
+def _min_variance_weights(C: np.ndarray, max_iters: int = 200) -> np.ndarray:
+    """
+    long-only Minimum-Varianz (min w'Cw, sum w = 1, w >= 0), primales Active-Set-Verfahren: auf der aktiven
+    Menge C_A^-1 1 lösen; hat die Lösung negative Einträge, nur bis zum Rand gehen und diese herausnehmen.
+    Strategien mit (Cw)_i < w'Cw kommen wieder dazu, bis die KKT-Bedingungen gelten. Startpunkt: alle negativen
+    auf einmal streichen und neu lösen (zulässig, meist schon fast optimal). max_iters begrenzt alle Schritte.
+    """
+    N = len(C)
+    active = np.ones(N, dtype=bool)
+    while True:
+        ix = np.flatnonzero(active)
+        x = np.linalg.solve(C[np.ix_(ix, ix)], np.ones(len(ix)))
+        if (x >= 0).all():
+            w = np.zeros(N); w[ix] = x / x.sum()
+            break
+        active[ix[x < 0]] = False   # 1'C^-1 1 > 0 -> mindestens eine bleibt
+    for _ in range(max_iters):  # zählt jeden Lösungsschritt (Rückwärts- und Hinzunahmeschritte)
+        ix = np.flatnonzero(active)
+        x = np.linalg.solve(C[np.ix_(ix, ix)], np.ones(len(ix))); x /= x.sum()
+        neg = x < 0
+        if neg.any():
+            wa = w[ix]; r = wa[neg] / (wa[neg] - x[neg])
+            wa = wa + float(r.min()) * (x - wa)
+            out = neg & (wa <= 1e-15 * wa.max())
+            out[np.flatnonzero(neg)[np.argmin(r)]] = True   # blockierende Nebenbedingung immer herausnehmen
+            w = np.zeros(N); w[ix] = np.where(out, 0.0, wa)
+            active[ix[out]] = False
+            continue
+        w = np.zeros(N); w[ix] = x
+        g = C @ w; lam = float(w @ g)
+        add = ~active & (g < lam - 1e-12 * abs(lam))
+        if not add.any():
+            break
+        active |= add
+    return w
 
+def _erc_weights(C: np.ndarray, max_iters: int = 100, tol: float = 1e-10) -> np.ndarray:
+    """
+    Gleiche Risikobeiträge w_i (Cw)_i: gedämpftes Newton-Verfahren auf min 1/2 y'Cy - 1/N sum log y (Spinu),
+    w = y / sum(y). Je Schritt ein lineares Gleichungssystem, konvergiert in wenigen Dutzend Schritten.
+    """
+    N = len(C); b = 1.0 / N
+    y = 1.0 / np.sqrt(np.diag(C))
+    y /= np.sqrt(y @ C @ y)                              # im Optimum gilt y'Cy = 1
     for _ in range(max_iters):
-        # Markt-Summen
-        sums = {}
-        for k, v in w.items():
-            s = symbol_of[k]
-            sums[s] = sums.get(s, 0.0) + float(v)
-
-        # Übergewichtete Märkte hart kappen
-        over = {s: val for s, val in sums.items() if val > market_cap + 1e-12}
-        if over:
-            for s, val in over.items():
-                keys = [k for k in w.index if symbol_of[k] == s]
-                if val > 0:
-                    scale = market_cap / val
-                    w.loc[keys] = w.loc[keys] * scale
-            # nach dem Kappen erneut clippen (falls Einzeltitel durch Rundung > max_w)
-            w = w.clip(upper=max_w)
-
-        # Summe prüfen
-        total = float(w.sum())
-        if abs(total - 1.0) < 1e-9 and not over:
+        g = C @ y - b / y
+        H = C.copy(); H[np.diag_indices(N)] += b / (y * y)
+        dy = np.linalg.solve(H, g)
+        lam = float(np.sqrt(max(g @ dy, 0.0)))
+        y = y - dy / (1.0 + lam) if lam > 0.25 else y - dy
+        if lam < tol:
             break
+    return y / y.sum()
 
-        # Restgewicht verteilen (nur auf NICHT übergewichtete Märkte)
-        sums = {}
-        for k, v in w.items():
-            s = symbol_of[k]
-            sums[s] = sums.get(s, 0.0) + float(v)
-        non_over_keys = [k for k in w.index if sums[symbol_of[k]] < market_cap - 1e-12]
+def _linkage_order(D: np.ndarray) -> List[int]:
+    """
+    Blattreihenfolge des Single-Linkage-Dendrogramms zur Distanzmatrix D: minimaler Spannbaum (Prim,
+    vektoriell je Knoten), dann die Baumkanten aufsteigend verschmelzen (Kruskal) – ähnliche Strategien liegen nebeneinander.
+    """
+    N = len(D)
+    best = D[0].astype(np.float64).copy(); parent = np.zeros(N, dtype=np.int64)
+    done = np.zeros(N, dtype=bool); done[0] = True
+    edges = []
+    for _ in range(N - 1):
+        j = int(np.argmin(np.where(done, np.inf, best)))
+        edges.append((float(best[j]), int(parent[j]), j)); done[j] = True
+        closer = D[j] < best
+        parent[closer] = j; best = np.where(closer, D[j], best)
+    root = list(range(N)); leaves = {i: [i] for i in range(N)}
+    def find(i: int) -> int:
+        while root[i] != i:
+            root[i] = root[root[i]]; i = root[i]
+        return i
+    for _, a, b in sorted(edges):
+        ra, rb = find(a), find(b)
+        leaves[ra].extend(leaves.pop(rb)); root[rb] = ra
+    return leaves[find(0)]
 
-        if not non_over_keys:
-            # Falls nichts übrig ist, normalisieren wir hart (sollte praktisch nicht vorkommen)
-            w = w / max(total, 1e-12)
-            break
+def _hrp_weights(C: np.ndarray) -> np.ndarray:
+    """
+    Hierarchical Risk Parity (López de Prado): Reihenfolge per Single-Linkage auf sqrt((1 - rho) / 2), dann
+    rekursive Halbierung – jede Hälfte bekommt Gewicht invers zur Varianz ihres Inverse-Varianz-Portfolios.
+    """
+    sd = np.sqrt(np.diag(C))
+    D = np.sqrt(np.clip((1.0 - C / np.outer(sd, sd)) / 2.0, 0.0, None))
+    order = np.asarray(_linkage_order(D))
+    def cluster_var(ix: np.ndarray) -> float:
+        iv = 1.0 / np.diag(C)[ix]; iv /= iv.sum()
+        return float(iv @ C[np.ix_(ix, ix)] @ iv)
+    w = np.ones(len(C))
+    segs = [order]
+    while segs:
+        nxt = []
+        for seg in segs:
+            if len(seg) < 2:
+                continue
+            a, b = seg[:len(seg) // 2], seg[len(seg) // 2:]
+            va, vb = cluster_var(a), cluster_var(b)
+            alpha = vb / (va + vb)
+            w[a] *= alpha; w[b] *= 1.0 - alpha
+            nxt += [a, b]
+        segs = nxt
+    return w / w.sum()
 
-        residual = 1.0 - total
-        if abs(residual) < 1e-9 and not over:
-            break
+# portfolio.optimizer -> Gewichte (Summe 1) aus der Ledoit–Wolf-Kovarianz; "inverse_vol" = _risk_parity_weights
+OPTIMIZERS = {"hrp": _hrp_weights, "min_variance": _min_variance_weights, "erc": _erc_weights}
 
-        # Verteile Rest proportional zu aktuellem Gewicht der nicht-übergewichteten
-        sub = w.loc[non_over_keys]
-        sub_sum = float(sub.sum())
-        if sub_sum <= 0:
-            # gleichmäßig verteilen
-            add = pd.Series(1.0 / len(non_over_keys), index=non_over_keys)
-        else:
-            add = sub / sub_sum
-
-        w.loc[non_over_keys] = w.loc[non_over_keys] + residual * add
-        # Einzeltitel-Grenze erneut beachten
-        w = w.clip(upper=max_w)
-
-    # Final: minimale numerische Korrektur auf 1.0
-    w = w / float(w.sum())
-    return w
+def _optimizer_weights(ret_map: Dict[str, pd.Series], keys: List[str], optimizer: str, max_w: float) -> pd.Series:
+    """
+    Basisgewichte vor den Caps. Kovarianzbasierte Optimierer rechnen auf der ausgerichteten Rendite-Matrix;
+    Strategien ohne Rendite-Schwankung bekommen wie bei inverse_vol Gewicht 0.
+    """
+    if optimizer == "inverse_vol":
+        return _risk_parity_weights(ret_map, keys, max_w=max_w)
+    fn = OPTIMIZERS.get(optimizer)
+    if fn is None:
+        raise ValueError(f"unknown portfolio optimizer {optimizer!r}; expected one of {['inverse_vol', *OPTIMIZERS]}")
+    R = _returns_matrix(ret_map, keys)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.nanvar(R, axis=0, ddof=1) if len(R) > 1 else np.zeros(len(keys))
+    live = np.isfinite(var) & (var > 0)
+    w = np.zeros(len(keys))
+    if live.sum() == 1:
+        w[live] = 1.0
+    elif live.any():
+        w[live] = fn(_shrunk_cov(R[:, live]))
+    return pd.Series(w, index=keys)
 
-def build_portfolio(cfg: GlobalConfig, accepted_json: Path, ohlcv_dir: Path,
-                    corr_cap: float = 0.80, max_w: float = 0.40, market_cap: float = 0.70):
+def _fill_level(w0: np.ndarray, group: np.ndarray, n_groups: int, upper: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """
+    Wasserstand je Gruppe: Faktor t_g mit sum_{i in g} min(upper_i, t_g * w0_i) = target_g. Die Summe ist
+    stückweise linear mit Knicken bei upper_i / w0_i -> exakt über die sortierten Knicke, ohne Iteration.
+    inf, wo die Gruppe target nicht erreicht (alle Einträge an upper); 0 für target <= 0.
+    """
+    t = np.where(target > 0, np.inf, 0.0)
+    idx = np.flatnonzero(w0 > 0)
+    if not idx.size:
+        return t
+    brk = upper[idx] / w0[idx]; g = group[idx]
+    order = np.lexsort((brk, g)); idx, brk, g = idx[order], brk[order], g[order]
+    w, up = w0[idx], upper[idx]
+    counts = np.bincount(g, minlength=n_groups); start = np.cumsum(counts) - counts
+    cw = np.cumsum(w); cu = np.cumsum(up)
+    w_before = cw - w - (cw - w)[start[g]]            # Summe w0 der Einträge vor i in der Gruppe
+    u_before = cu - up - (cu - up)[start[g]]          # ... und ihrer Obergrenzen (dort schon gekappt)
+    rest = np.bincount(g, weights=w, minlength=n_groups)[g] - w_before
+    reach = u_before + brk * rest                     # Gruppensumme beim Knick von i
+    hit = np.flatnonzero(reach >= target[g] - 1e-15)
+    first = np.full(n_groups, len(idx))
+    np.minimum.at(first, g[hit], hit)
+    ok = (first < len(idx)) & (target > 0)
+    j = first[ok]
+    t[ok] = (target[ok] - u_before[j]) / rest[j]
+    return t
+
+def project_caps(w0: np.ndarray, market: np.ndarray, max_w: float, market_cap: float | np.ndarray) -> np.ndarray:
+    """
+    Gewichte mit sum = 1, w_i <= max_w und Marktsummen <= market_cap, so nah wie möglich an w0 (>= 0) im Sinne
+    der relativen Entropie: w_i = min(max_w, c_m * w0_i) – innerhalb eines Marktes bleiben die Verhältnisse der
+    ungekappten Gewichte erhalten. Lagrange-Multiplikatoren je Markt (c_m) und für die Summe per Wasserstand
+    (_fill_level), vektoriell über beliebig viele Strategien/Märkte. market: Marktnummer 0..M-1 je Strategie.
+    Sind die Caps unerfüllbar (bzw. mit den positiven Gewichten nicht erreichbar), wird das maximal Mögliche
+    auf 1 normiert (Caps dann verletzt).
+    """
+    w0 = np.asarray(w0, dtype=np.float64); market = np.asarray(market, dtype=np.int64)
+    if not len(w0):
+        return w0.copy()
+    n_m = int(market.max()) + 1
+    w0 = np.where(w0 > 0, w0, 0.0)
+    if not w0.any():
+        w0 = np.ones_like(w0)
+    cap = np.broadcast_to(np.asarray(market_cap, dtype=np.float64), (n_m,))
+    u = np.full(len(w0), float(max_w))
+    # Stufe 1: Faktor, ab dem ein Markt seinen Cap erreicht -> Obergrenze je Strategie
+    t = _fill_level(w0, market, n_m, u, cap)[market]
+    upper = np.minimum(u, np.where(w0 > 0, t, 0.0) * w0)
+    # Stufe 2: gemeinsamer Faktor für die Summe 1
+    s = _fill_level(w0, np.zeros(len(w0), dtype=np.int64), 1, upper, np.ones(1))[0]
+    if not np.isfinite(s):
+        top = np.where(w0 > 0, upper, 0.0)
+        return top / top.sum() if top.sum() > 0 else np.full(len(w0), 1.0 / len(w0))
+    return np.minimum(upper, s * w0)
+
+def _apply_caps_strict(w: pd.Series, symbol_of: Dict[str, str], max_w: float, market_cap: float) -> pd.Series:
+    # Strategie-/Markt-Caps und Summe 1 in einem Schritt (project_caps)
+    codes, _ = pd.factorize(pd.Series([symbol_of[k] for k in w.index]))
+    return pd.Series(project_caps(w.to_numpy(dtype=np.float64), codes, max_w, market_cap), index=w.index)
+
+def _load_daily(cfg: GlobalConfig, accepted_json: Path, ohlcv_dir: Path, intrabar: bool = False,
+                store: ResultStore | None = None, results_root: Path | None = None
+                ) -> Tuple[Dict[str, pd.Series], Dict[str, pd.Series], Dict[str, Dict]] | None:
+    """(Tagesrenditen, Tages-Equity, Symbol + Metriken) je Strategie-Key; None, wenn nichts akzeptiert ist."""
     if not accepted_json.exists():
         raise FileNotFoundError(f"{accepted_json} not found")
     data = json.loads(accepted_json.read_text(encoding="utf-8"))
     if not data:
-        return {"selected": [], "weights": {}, "metrics": {}}, None
+        return None
 
     ret_map: Dict[str, pd.Series] = {}
     eq_map: Dict[str, pd.Series] = {}
     meta: Dict[str, Dict] = {}
 
-    # Backtest der akzeptierten Strategien (kleine Menge → schnell)
-    for d in data:
-        s = StrategyConfig(**d)
-        df = _load_ohlcv(s.symbol, ohlcv_dir)
-        m, eq = backtest_one(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
-        key = f"{s.symbol}|f{s.fast}|s{s.slow}|sl{float(s.stop_loss_pct):.4f}|{getattr(s,'timeframe','1m')}"
+    # Tageskurven der akzeptierten Strategien (Artefakt, sonst Backtest)
+    strats = [StrategyConfig(**d) for d in data]
+    daily = daily_equity_map(strats, cfg, ohlcv_dir, intrabar=intrabar, store=store, root=results_root)
+    for s in strats:
+        key = strategy_key(s)
+        m, eq = daily[key]
         eq_map[key] = eq
         ret_map[key] = _daily_returns(eq)
         meta[key] = {"symbol": s.symbol, **m}
+    return ret_map, eq_map, meta
 
+def _score(ret_map: Dict[str, pd.Series], meta: Dict[str, Dict]) -> pd.Series:
     # grobe Score-Funktion
-    score = pd.Series({k: (ret_map[k].mean()*30.0) - max(0.0, -meta[k]["max_drawdown"])*0.5 for k in ret_map})
+    return pd.Series({k: (ret_map[k].mean()*30.0) - max(0.0, -meta[k]["max_drawdown"])*0.5 for k in ret_map})
 
-    # Korridor via Korrelation
-    selected = _select_with_corr(ret_map, score, corr_cap=corr_cap, max_n=10)
-    if not selected:
-        return {"selected": [], "weights": {}, "metrics": {}}, None
-
-    # Risiko-Parität (geclipped), dann strikte Caps
-    w_base = _risk_parity_weights(ret_map, selected, max_w=max_w)
+def _weigh(ret_map: Dict[str, pd.Series], meta: Dict[str, Dict], selected: List[str], max_w: float,
+           market_cap: float, optimizer: str) -> pd.Series:
+    # Basisgewichte (Optimierer), dann strikte Caps
+    w_base = _optimizer_weights(ret_map, selected, optimizer, max_w=max_w)
     symbol_of = {k: meta[k]["symbol"] for k in selected}
-    w = _apply_caps_strict(w_base.copy(), symbol_of, max_w=max_w, market_cap=market_cap)
+    return _apply_caps_strict(w_base.copy(), symbol_of, max_w=max_w, market_cap=market_cap)
 
-    # Portfolio-EQ (normiert auf 1.0)
-    aligned = pd.concat({k: eq_map[k] / float(eq_map[k].iloc[0]) for k in selected}, axis=1).dropna()
+def _portfolio_metrics(eq_map: Dict[str, pd.Series], meta: Dict[str, Dict], w: pd.Series) -> Tuple[Dict, pd.Series]:
+    """
+    Portfolio-Equity auf Tagesbasis (je Strategie normiert auf die Start-Equity nach der ersten Bar, ausgerichtet
+    nach Kalendertag, damit Timeframes gemischt werden können) und Monatskennzahlen.
+    Drawdown: max_drawdown_daily aus der Tageskurve (Tiefs innerhalb eines Tages fehlen -> eher zu mild),
+    max_drawdown_floor = schlechtester gespeicherter intrabar-Drawdown der gewählten Strategien; der echte
+    intrabar-Drawdown des Portfolios liegt dazwischen.
+    """
+    aligned = pd.concat({k: (eq_map[k] / float(meta[k]["start_equity"])).set_axis(eq_map[k].index.normalize())
+                         for k in w.index}, axis=1).dropna()
     port_eq = (aligned * w).sum(axis=1)
 
     # Kennzahlen (Monate)
     mret = port_eq.resample("ME").last().pct_change().dropna()
     metrics = {
-        "n_strategies": len(selected),
+        "n_strategies": len(w),
         "avg_monthly_return": float(mret.mean()) if len(mret) else 0.0,
         "worst_month": float(mret.min()) if len(mret) else 0.0,
-        "max_drawdown": float((port_eq/port_eq.cummax() - 1.0).min()) if len(port_eq) else 0.0
+        "max_drawdown_daily": float((port_eq/port_eq.cummax() - 1.0).min()) if len(port_eq) else 0.0,
+        "max_drawdown_floor": float(min(meta[k]["max_drawdown"] for k in w.index)) if len(w) else 0.0
     }
+    return metrics, port_eq
+
+def build_portfolio(cfg: GlobalConfig, accepted_json: Path, ohlcv_dir: Path,
+                    corr_cap: float = 0.80, max_w: float = 0.40, market_cap: float = 0.70, intrabar: bool = False,
+                    store: ResultStore | None = None, results_root: Path | None = None, optimizer: str = "inverse_vol"):
+    """
+    Auswahl, Gewichte und Portfolio-Equity auf Tagesbasis. Tageskurven kommen aus dem Artefakt der
+    Backtest-Phase (results_root, daily_equity_map); nur fehlende/veraltete Strategien werden simuliert.
+    optimizer: Basisgewichte vor den Caps ("inverse_vol" oder ein Name aus OPTIMIZERS).
+    """
+    loaded = _load_daily(cfg, accepted_json, ohlcv_dir, intrabar=intrabar, store=store, results_root=results_root)
+    if loaded is None:
+        return {"selected": [], "weights": {}, "metrics": {}}, None
+    ret_map, eq_map, meta = loaded
+
+    # Korridor via Korrelation
+    selected = _select_with_corr(ret_map, _score(ret_map, meta), corr_cap=corr_cap, max_n=10)
+    if not selected:
+        return {"selected": [], "weights": {}, "metrics": {}}, None
+
+    w = _weigh(ret_map, meta, selected, max_w, market_cap, optimizer)
+    metrics, port_eq = _portfolio_metrics(eq_map, meta, w)
+    # Übergangs-Alias für Leser von selection.json (bis zum nächsten Release): früher max_drawdown
+    metrics["max_drawdown"] = metrics["max_drawdown_daily"]
     result = {"selected": selected, "weights": w.to_dict(), "metrics": metrics}
     return result, port_eq
+
+# im Sweep-Worker: einmal übergebene Tagesrenditen/-kurven der Kandidaten
+_SWEEP_DATA: Dict[str, object] = {}
+
+def _init_sweep(data: Dict[str, object]) -> None:
+    _SWEEP_DATA.update(data)
+
+def _sweep_corr(args: Tuple[float, List[float], List[float], str]) -> List[Dict]:
+    """Alle (max_w, market_cap) zu einem corr_cap – die Auswahl hängt nur vom Cap ab und wird einmal gerechnet."""
+    corr_cap, max_ws, market_caps, optimizer = args
+    ret_map, eq_map, meta = _SWEEP_DATA["ret_map"], _SWEEP_DATA["eq_map"], _SWEEP_DATA["meta"]
+    selected = _select_with_corr(ret_map, _SWEEP_DATA["score"], corr_cap=corr_cap, max_n=10)
+    rows = []
+    for max_w in max_ws:
+        for market_cap in market_caps:
+            row = {"correlation_cap": corr_cap, "max_weight_per_strategy": max_w, "max_weight_per_market": market_cap,
+                   "n_strategies": 0, "avg_monthly_return": np.nan, "worst_month": np.nan,
+                   "max_drawdown_daily": np.nan, "max_drawdown_floor": np.nan, "enb": 0.0, "caps_ok": True}
+            if selected:
+                w = _weigh(ret_map, meta, selected, max_w, market_cap, optimizer)
+                metrics, _ = _portfolio_metrics(eq_map, meta, w)
+                markets = w.groupby(pd.Series({k: meta[k]["symbol"] for k in w.index})).sum()
+                row.update(metrics, enb=float(1.0 / (w.pow(2).sum())),
+                           caps_ok=bool(w.max() <= max_w + 1e-12 and markets.max() <= market_cap + 1e-12))
+            rows.append(row)
+    return rows
+
+def sweep_portfolio(cfg: GlobalConfig, accepted_json: Path, ohlcv_dir: Path, corr_caps: Sequence[float],
+                    max_ws: Sequence[float], market_caps: Sequence[float], intrabar: bool = False,
+                    store: ResultStore | None = None, results_root: Path | None = None, optimizer: str = "inverse_vol",
+                    workers: int = 1) -> pd.DataFrame:
+    """
+    build_portfolio über das Raster corr_caps x max_ws x market_caps: Tagesrenditen einmal laden, dann je
+    corr_cap (workers > 1: Prozess-Pool, Daten einmal je Worker) alle Cap-Kombinationen aus dem Speicher.
+    Eine Zeile je Setting mit n_strategies, avg_monthly_return, worst_month, max_drawdown_daily/_floor
+    (siehe _portfolio_metrics) und ENB (1 / sum w^2),
+    Werte wie build_portfolio mit denselben Settings. caps_ok = False, wo die Auswahl die Caps nicht
+    erfüllen kann (project_caps normiert dann hart).
+    """
+    from .backtest import resolve_workers  # ProcessPool-Konvention wie die Backtests
+    cols = ["correlation_cap", "max_weight_per_strategy", "max_weight_per_market", "n_strategies",
+            "avg_monthly_return", "worst_month", "max_drawdown_daily", "max_drawdown_floor", "enb", "caps_ok"]
+    loaded = _load_daily(cfg, accepted_json, ohlcv_dir, intrabar=intrabar, store=store, results_root=results_root)
+    if loaded is None:
+        return pd.DataFrame(columns=cols)
+    ret_map, eq_map, meta = loaded
+    data = {"ret_map": ret_map, "eq_map": eq_map, "meta": meta, "score": _score(ret_map, meta)}
+    tasks = [(float(c), [float(x) for x in max_ws], [float(x) for x in market_caps], optimizer) for c in corr_caps]
+    workers = resolve_workers(workers)
+    if workers <= 1 or len(tasks) <= 1:
+        _init_sweep(data)
+        try:
+            parts = [_sweep_corr(t) for t in tasks]
+        finally:
+            _SWEEP_DATA.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_sweep, initargs=(data,)) as ex:
+            parts = list(ex.map(_sweep_corr, tasks))
+    return pd.DataFrame([r for part in parts for r in part], columns=cols)
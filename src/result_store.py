@@ -0,0 +1,185 @@
+﻿from __future__ import annotations
+import argparse, hashlib, io, json, os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from .bar_cache import frame_key
+from .strategy_blocks import StrategyConfig
+
+__all__ = ["STORE_VERSION", "ResultStore", "result_key", "open_store", "cached_backtest_one"]
+
+# bei Änderungen an Kernel-Semantik oder Metriken erhöhen -> alte Einträge werden nicht mehr getroffen
+STORE_VERSION = 3
+
+def result_key(strat: StrategyConfig, starting_capital: float, max_leverage: float, data: Tuple,
+               engine: str = "array", prune: Tuple | None = None, intrabar: bool = False) -> str:
+    """
+    sha256 über kanonisches JSON: StrategyConfig, Risiko-Settings, Daten-Fingerprint (frame_key des
+    1m-Frames inkl. Slice-Grenzen) und die ergebnisrelevanten Parameter. "batch" rechnet bitgleich
+    zu "array" und teilt sich deren Einträge.
+    """
+    params = {"engine": "array" if engine == "batch" else engine,
+              "prune": None if prune is None else list(prune), "intrabar": bool(intrabar)}
+    payload = {"v": STORE_VERSION, "strategy": strat.model_dump(), "risk": [float(starting_capital), float(max_leverage)],
+               "data": data, "params": params}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=list).encode("utf-8")).hexdigest()
+
+class ResultStore:
+    """
+    Content-adressierter Ergebnis-Speicher auf der Platte: <root>/<h[:2]>/<h>.json (Metriken) und
+    optional <h>.<equity-Modus>.npz (Equity-Kurve). Schreiben atomar per os.replace, damit parallele
+    Prozesse sich nicht stören. Größenbegrenzt: über max_bytes werden die am längsten nicht
+    benutzten Einträge gelöscht (LRU über mtime, Treffer frischen die mtime auf).
+    """
+    def __init__(self, root: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._sizes: Dict[Path, Tuple[int, int]] | None = None  # Datei -> (mtime_ns, Bytes), lazy
+        self._lock = Lock()
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        if self._sizes is None:
+            sizes = {}
+            if self.root.exists():
+                for d in self.root.iterdir():
+                    if d.is_dir():
+                        for f in os.scandir(d):
+                            if f.is_file() and ".tmp" not in f.name:
+                                st = f.stat(); sizes[Path(f.path)] = (st.st_mtime_ns, st.st_size)
+            self._sizes = sizes
+        return self._sizes
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            sizes = self._scan()
+            sizes[path] = (path.stat().st_mtime_ns, len(data))
+            self._evict(sizes)
+
+    def _evict(self, sizes: Dict[Path, Tuple[int, int]]) -> None:
+        total = sum(sz for _, sz in sizes.values())
+        if total <= self.max_bytes:
+            return
+        for p, (_, sz) in sorted(sizes.items(), key=lambda kv: kv[1][0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                pass
+            total -= sz; del sizes[p]
+
+    def get_metrics(self, key: str) -> Dict | None:
+        p = self._path(key, ".json")
+        try:
+            m = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1; self._touch(p)
+        return m
+
+    def put_metrics(self, key: str, metrics: Dict) -> None:
+        self._write(self._path(key, ".json"), json.dumps(metrics).encode("utf-8"))
+
+    def get_equity(self, key: str, mode: str) -> pd.Series | None:
+        p = self._path(key, f".{mode}.npz")
+        try:
+            with np.load(p, allow_pickle=False) as z:
+                ix, vals, tz = z["index"], z["values"], str(z["tz"])
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(p)
+        index = pd.DatetimeIndex(ix.view("datetime64[ns]"))
+        if tz:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        return pd.Series(vals, index=index)
+
+    def put_equity(self, key: str, mode: str, eq: pd.Series) -> None:
+        idx = pd.DatetimeIndex(eq.index)
+        buf = io.BytesIO()
+        np.savez(buf, index=idx.asi8, values=eq.to_numpy(dtype=np.float64), tz=str(idx.tz) if idx.tz is not None else "")
+        self._write(self._path(key, f".{mode}.npz"), buf.getvalue())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sizes = self._scan()
+            return {"entries": sum(1 for p in sizes if p.suffix == ".json"), "files": len(sizes),
+                    "bytes": sum(sz for _, sz in sizes.values()), "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> int:
+        with self._lock:
+            sizes = self._scan(); n = 0
+            for p in list(sizes):
+                try:
+                    p.unlink(); n += 1
+                except OSError:
+                    pass
+            self._sizes = {}
+            return n
+
+def open_store(extras: Dict) -> ResultStore | None:
+    """ResultStore aus der extras-Sektion result_store (None, wenn deaktiviert)."""
+    rs = extras.get("result_store", {})
+    if not rs.get("enabled", False):
+        return None
+    return ResultStore(Path(rs.get("path", "results/cache/backtests")), int(float(rs.get("max_mb", 512)) * 1024 * 1024))
+
+def cached_backtest_one(store: ResultStore | None, df: pd.DataFrame, strat: StrategyConfig, starting_capital: float,
+                        max_leverage: float, engine: str = "array", equity: str = "full", prune: Tuple | None = None,
+                        intrabar: bool = False) -> Tuple[Dict, pd.Series]:
+    """
+    backtest_one mit vorgeschaltetem Store: Treffer für Metriken (+ Equity im angefragten Modus) werden
+    direkt geliefert, sonst wird gerechnet und abgelegt. Frames ohne Quell-Tag werden nicht gecacht.
+    """
+    from .backtest import backtest_one  # backtest importiert dieses Modul
+    kw = dict(engine=engine, prune=prune, intrabar=intrabar)
+    data = frame_key(df)
+    if store is None or data is None:
+        return backtest_one(df, strat, starting_capital, max_leverage, equity=equity, **kw)
+    key = result_key(strat, starting_capital, max_leverage, data, **kw)
+    m = store.get_metrics(key)
+    if m is not None:
+        if equity == "none":
+            return m, pd.Series(dtype=np.float64)
+        eq = store.get_equity(key, equity)
+        if eq is not None:
+            return m, eq
+    m, eq = backtest_one(df, strat, starting_capital, max_leverage, equity=equity, **kw)
+    store.put_metrics(key, m)
+    if equity != "none":
+        store.put_equity(key, equity, eq)
+    return m, eq
+
+def main(argv: List[str] | None = None) -> None:
+    from .config_extras import load_extras
+    p = argparse.ArgumentParser(description="Backtest result store (content-addressed cache)")
+    p.add_argument("command", choices=["stats", "clear"])
+    p.add_argument("--config", default="config/config.yaml")
+    args = p.parse_args(argv)
+    rs = load_extras(args.config)["result_store"]
+    store = ResultStore(Path(rs.get("path", "results/cache/backtests")), int(float(rs.get("max_mb", 512)) * 1024 * 1024))
+    if args.command == "stats":
+        print(json.dumps({"path": str(store.root), "enabled": bool(rs.get("enabled", False)), **store.stats()}, indent=2))
+    else:
+        print(f"[OK] Removed {store.clear()} files from {store.root}")
+
+if __name__ == "__main__":
+    main()
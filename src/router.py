@@ -2,13 +2,14 @@
 from pathlib import Path
 import json, csv
 from typing import Dict, List, Tuple
+import numpy as np
 import pandas as pd
 from datetime import datetime, timezone, date
 
 from src.config_loader import load_config
 from src.config_extras import load_extras
 from src.strategy_blocks import StrategyConfig
-from src.backtest import _load_ohlcv, _resample_ohlcv
+from src.backtest import _TF_DELTA, _load_ohlcv, _resample_cached
 from src.signals import make_key
 
 class DryRouter:
@@ -24,6 +25,7 @@ class DryRouter:
         self.use_weights = bool(self.extras.get("live", {}).get("use_portfolio_weights", True))
         self.daily_limit_pct = float(self.extras.get("live", {}).get("daily_loss_limit_pct", 0.02))
         self.max_notional_cfg = float(self.extras.get("live", {}).get("max_notional", 0.0))
+        self.intrabar = bool(self.extras.get("backtest", {}).get("intrabar_stops", False))
         self.port_weights = self._load_portfolio_weights()
         self._load_state()
         self._rollover_day_if_needed()
@@ -113,7 +115,7 @@ class DryRouter:
             if not d: continue
             strat = StrategyConfig(**d)
             df = _load_ohlcv(strat.symbol, Path(self.cfg.paths.processed) / "ohlcv")
-            tf = _resample_ohlcv(df, strat.timeframe)
+            tf = _resample_cached(df, strat.timeframe)
             if tf.empty: continue
             last_px = float(tf["close"].iloc[-1])
             side = int(pos["side"]); qty = float(pos["qty"]); entry = float(pos["entry_px"])
@@ -168,6 +170,21 @@ class DryRouter:
         return pool
 
     # ---------- stop updates & processing ----------
+    def _intrabar_stop_hit(self, df: pd.DataFrame, strat: StrategyConfig, pos: Dict,
+                           last_chk: pd.Timestamp | None) -> Tuple[pd.Timestamp, float] | None:
+        """Erste 1m-Bar nach der zuletzt geprüften TF-Bar, die den Stop berührt (vektorielle Suche) -> (Zeit, Exit-Preis)."""
+        mins = df if last_chk is None else df[df.index >= last_chk + _TF_DELTA[strat.timeframe]]
+        if mins.empty:
+            return None
+        side = int(pos["side"]); stop = float(pos["stop_px"]); slip = float(strat.slippage)
+        touch = mins["low"].to_numpy() <= stop if side == 1 else mins["high"].to_numpy() >= stop
+        if not touch.any():
+            return None
+        m = int(np.argmax(touch)); op = float(mins["open"].iloc[m])
+        # Gap über den Stop hinweg -> Fill zum Open der Minute
+        exit_px = min(op, stop) * (1 - slip) if side == 1 else max(op, stop) * (1 + slip)
+        return mins.index[m], exit_px
+
     def update_stops(self):
         self._rollover_day_if_needed()
         pos_keys = list(self.state["positions"].keys())
@@ -179,10 +196,31 @@ class DryRouter:
             strat = StrategyConfig(**d)
 
             df = _load_ohlcv(strat.symbol, Path(self.cfg.paths.processed) / "ohlcv")
-            tf = _resample_ohlcv(df, strat.timeframe)
+            tf = _resample_cached(df, strat.timeframe)
             last_chk = pd.Timestamp(pos.get("last_checked")) if pos.get("last_checked") else None
             bars = tf if last_chk is None else tf[tf.index > last_chk]
 
+            if self.intrabar and strat.timeframe in _TF_DELTA:
+                hit = self._intrabar_stop_hit(df, strat, pos, last_chk)
+                if hit is None:
+                    if not bars.empty:
+                        pos["last_checked"] = bars.index[-1].isoformat()
+                    continue
+                t, exit_px = hit
+                side = int(pos["side"]); qty = float(pos["qty"])
+                fee = abs(exit_px * qty) * float(strat.fee_rate)
+                pnl = (exit_px - float(pos["entry_px"])) * qty if side == 1 else (float(pos["entry_px"]) - exit_px) * qty
+                self.state["equity"] = float(self.state["equity"]) + pnl - fee
+                self.state["realized_today"] = float(self.state["realized_today"]) + pnl - fee
+                self._append_log({
+                    "time": t.isoformat(),
+                    "strategy_key": key, "symbol": strat.symbol, "timeframe": strat.timeframe,
+                    "event":"close_stop","side": side, "price": exit_px, "qty": qty, "fee": fee, "pnl": pnl,
+                    "equity_after": self.state["equity"], "reason":"STOP"
+                })
+                del self.state["positions"][key]
+                continue
+
             for t, row in bars.iterrows():
                 hi, lo, price = float(row["high"]), float(row["low"]), float(row["close"])
                 side = int(pos["side"]); stop = float(pos["stop_px"])
@@ -309,7 +347,7 @@ class DryRouter:
                 continue
             strat = StrategyConfig(**d)
             df = _load_ohlcv(strat.symbol, Path(self.cfg.paths.processed) / "ohlcv")
-            tf = _resample_ohlcv(df, strat.timeframe)
+            tf = _resample_cached(df, strat.timeframe)
             if tf.empty:
                 del self.state["positions"][key]; 
                 continue
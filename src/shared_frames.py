@@ -0,0 +1,80 @@
+﻿from __future__ import annotations
+from multiprocessing import shared_memory
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+
+__all__ = ["SharedFrames", "attach_frames"]
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        # ältere Versionen registrieren auch beim Attachen; Pool-Worker teilen sich den
+        # resource_tracker des Parents, der das Segment ohnehin besitzt -> unkritisch.
+        return shared_memory.SharedMemory(name=name)
+
+class SharedFrames:
+    """
+    Legt OHLCV-Frames (DatetimeIndex + float-Spalten) einmal in Shared Memory ab.
+    Layout je Symbol: [int64 Index (n)] [float64 Werte (ncols, n), spaltenweise zusammenhängend].
+    Worker bekommen nur die kleinen Metadaten (meta) und hängen sich per attach_frames an –
+    die Arrays werden nicht je Task gepickelt. Als Context-Manager: Segmente werden beim Verlassen freigegeben.
+    """
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self._segments: List[shared_memory.SharedMemory] = []
+        self.meta: Dict[str, dict] = {}
+        try:
+            for sym, df in frames.items():
+                self.meta[sym] = self._publish(df)
+        except Exception:
+            self.close()
+            raise
+
+    def _publish(self, df: pd.DataFrame) -> dict:
+        n = len(df); cols = [str(c) for c in df.columns]
+        idx = df.index
+        tz = str(idx.tz) if getattr(idx, "tz", None) is not None else None
+        shm = shared_memory.SharedMemory(create=True, size=max(8, 8 * n * (1 + len(cols))))
+        self._segments.append(shm)
+        ix = np.ndarray((n,), dtype=np.int64, buffer=shm.buf)
+        ix[:] = idx.asi8
+        vals = np.ndarray((len(cols), n), dtype=np.float64, buffer=shm.buf, offset=8 * n)
+        for j, c in enumerate(df.columns):
+            vals[j] = df[c].to_numpy(dtype=np.float64)
+        return {"name": shm.name, "n": n, "columns": cols, "tz": tz,
+                "index_name": idx.name, "attrs": dict(df.attrs)}
+
+    def close(self) -> None:
+        for shm in self._segments:
+            try:
+                shm.close(); shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._segments = []
+
+    def __enter__(self) -> "SharedFrames":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# Handles im Worker am Leben halten, solange die Frames benutzt werden
+_ATTACHED: List[shared_memory.SharedMemory] = []
+
+def attach_frames(meta: Dict[str, dict]) -> Dict[str, pd.DataFrame]:
+    """Baut read-only DataFrames direkt auf den Shared-Memory-Puffern (ohne Kopie der Werte)."""
+    out: Dict[str, pd.DataFrame] = {}
+    for sym, m in meta.items():
+        shm = _attach(m["name"]); _ATTACHED.append(shm)
+        n, cols = int(m["n"]), list(m["columns"])
+        ix = np.ndarray((n,), dtype=np.int64, buffer=shm.buf)
+        vals = np.ndarray((len(cols), n), dtype=np.float64, buffer=shm.buf, offset=8 * n)
+        vals.flags.writeable = False
+        index = pd.DatetimeIndex(ix.view("datetime64[ns]"), name=m["index_name"])
+        if m["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(m["tz"])
+        df = pd.DataFrame(vals.T, index=index, columns=cols, copy=False)
+        df.attrs.update(m["attrs"])
+        out[sym] = df
+    return out
@@ -2,19 +2,9 @@
 from pathlib import Path
 from typing import Optional, Dict, List
 import pandas as pd
-import numpy as np
 
 from src.strategy_blocks import StrategyConfig
-from src.backtest import _load_ohlcv, _resample_ohlcv  # vorhandene Helper nutzen
-
-def _atr(high: pd.Series, low: pd.Series, close: pd.Series, n: int) -> pd.Series:
-    prev_close = close.shift(1)
-    tr = pd.concat([
-        (high - low).abs(),
-        (high - prev_close).abs(),
-        (low  - prev_close).abs()
-    ], axis=1).max(axis=1)
-    return tr.rolling(int(n), min_periods=int(n)).mean()
+from src.backtest import _load_ohlcv, _resample_cached, _entry_signal_matrix  # vorhandene Helper nutzen
 
 def make_key(d: Dict) -> str:
     tf = d.get("timeframe","1m")
@@ -22,36 +12,16 @@ def make_key(d: Dict) -> str:
 
 def recent_entry_signals(df_raw: pd.DataFrame, strat: StrategyConfig, lookback_bars: int = 1) -> List[Dict]:
     """Liefert Entry-Signale (entry_long/entry_short) innerhalb der letzten lookback_bars Kerzen."""
-    df = _resample_ohlcv(df_raw, strat.timeframe)
+    df = _resample_cached(df_raw, strat.timeframe)
     need = max(strat.fast, strat.slow) + 2
     if len(df) < need:
         return []
 
+    # identische Entry-Logik wie im Backtest (Indikatoren aus indicators.py)
     close = df["close"].astype(float)
-    high  = df["high"].astype(float)
-    low   = df["low"].astype(float)
-
-    ma_f = close.rolling(strat.fast, min_periods=strat.fast).mean()
-    ma_s = close.rolling(strat.slow, min_periods=strat.slow).mean()
-
-    cross_up   = (ma_f.shift(1) <= ma_s.shift(1)) & (ma_f > ma_s)
-    cross_down = (ma_f.shift(1) >= ma_s.shift(1)) & (ma_f < ma_s)
-
-    if strat.trend_tol > 0:
-        delta = (ma_f - ma_s) / ma_s.replace(0, np.nan)
-        trend_ok_long  = (delta >= strat.trend_tol)
-        trend_ok_short = ((-delta) >= strat.trend_tol)
-    else:
-        trend_ok_long = trend_ok_short = pd.Series(True, index=close.index)
-
-    if strat.atr_thresh > 0:
-        atr = _atr(high, low, close, strat.atr_period)
-        vol_ok = (atr / close >= strat.atr_thresh).fillna(False)
-    else:
-        vol_ok = pd.Series(True, index=close.index)
-
-    long_entry  = cross_up   & trend_ok_long  & vol_ok
-    short_entry = cross_down & trend_ok_short & vol_ok
+    L, S = _entry_signal_matrix(df, [strat])
+    long_entry  = pd.Series(L[:, 0], index=df.index)
+    short_entry = pd.Series(S[:, 0], index=df.index)
 
     out: List[Dict] = []
     idx = df.index[-int(max(1, lookback_bars)):]  # letzte N Kerzen
@@ -1,7 +1,10 @@
 ﻿from __future__ import annotations
-from typing import List, Iterable
-import random
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import json, math, os, random
+from pathlib import Path
+import pandas as pd
 from .strategy_blocks import StrategyConfig
+from .evaluation import accept_row, thresholds
 
 def generate_ma_crossover_candidates(markets: Iterable[str], risk_fraction: float, n_per_symbol: int = 20) -> List[StrategyConfig]:
     rng = random.Random(42)
@@ -22,3 +25,321 @@ def generate_ma_crossover_candidates(markets: Iterable[str], risk_fraction: floa
                 trend_tol=trend, atr_thresh=atr, atr_period=14
             ))
     return out
+
+# Feinraster je Parameter; das Grobraster nimmt jeden COARSE_STEP-ten Wert (Enden immer dabei)
+SEARCH_AXES: Dict[str, list] = {
+    "fast": list(range(5, 21)),
+    "slow": list(range(10, 61)),
+    "stop_loss_pct": [0.003, 0.004, 0.005, 0.006, 0.008, 0.010, 0.012, 0.015, 0.020],
+    "trend_tol": [0.0, 0.0005, 0.001, 0.0015, 0.002, 0.0025, 0.003],
+    "atr_thresh": [0.0, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.010],
+}
+COARSE_STEP = {"fast": 5, "slow": 10, "stop_loss_pct": 4, "trend_tol": 3, "atr_thresh": 3}
+SEARCH_TIMEFRAMES = ("5m", "15m")
+
+def _coarse_values(axis: str) -> list:
+    vals = SEARCH_AXES[axis]; step = COARSE_STEP[axis]
+    out = vals[::step]
+    return out if out[-1] == vals[-1] else out + [vals[-1]]
+
+def _cfg_key(s: StrategyConfig) -> Tuple:
+    return (s.symbol, s.timeframe, s.direction, s.fast, s.slow, s.stop_loss_pct, s.trend_tol, s.atr_thresh, s.atr_period)
+
+def _ranked(rows: Sequence[Dict], accept_kw: Dict | None = None) -> List[int]:
+    """
+    Indizes, beste zuerst: akzeptiert (evaluation.accept_row mit accept_kw, z. B. evaluation.thresholds;
+    None -> Standard-Schwellen) vor abgelehnt, dann net_return.
+    """
+    acc = [accept_row(m, **(accept_kw or {})) for m in rows]
+    return sorted(range(len(rows)), key=lambda i: (not acc[i], -float(rows[i].get("net_return", 0.0))))
+
+class SearchState:
+    """
+    Buchhaltung der Suche: bewertete Konfigurationen (keine Doppelbewertung), verbrauchtes Budget
+    und je (Parameter, Wert) wie oft bewertet / akzeptiert -> welche Regionen tragen, welche nicht.
+    accept_kw: Akzeptanz-Schwellen für Rangfolge und Zählung (wie _ranked).
+    """
+    def __init__(self, budget: int, accept_kw: Dict | None = None):
+        self.budget = int(budget)
+        self.accept_kw = dict(accept_kw or {})
+        self.seen: set = set()
+        self.strategies: List[StrategyConfig] = []
+        self.metrics: List[Dict] = []
+        self.stats: Dict[str, Dict[str, List[int]]] = {}
+        self.stages: List[Dict] = []
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - len(self.strategies))
+
+    def fresh(self, cands: Iterable[StrategyConfig]) -> List[StrategyConfig]:
+        """Noch nicht bewertete Kandidaten (ohne Duplikate), gekappt auf das Restbudget."""
+        out: List[StrategyConfig] = []; keys = set()
+        for c in cands:
+            k = _cfg_key(c)
+            if k in self.seen or k in keys:
+                continue
+            keys.add(k); out.append(c)
+            if len(out) >= self.remaining:
+                break
+        return out
+
+    def record(self, stage: str, strats: List[StrategyConfig], rows: List[Dict]) -> None:
+        acc = 0
+        for s, m in zip(strats, rows):
+            ok = bool(m["is_accepted"]); acc += ok
+            self.seen.add(_cfg_key(s)); self.strategies.append(s); self.metrics.append(m)
+            for axis in ("symbol", "timeframe", *SEARCH_AXES):
+                cnt = self.stats.setdefault(axis, {}).setdefault(str(getattr(s, axis)), [0, 0])
+                cnt[0] += 1; cnt[1] += ok
+        self.stages.append({"stage": stage, "evaluated": len(strats), "accepted": acc})
+
+    def ranked(self) -> List[int]:
+        """Indizes aller Bewertungen, beste zuerst (wie _ranked)."""
+        return _ranked(self.metrics, self.accept_kw)
+
+    def to_checkpoint(self) -> Dict:
+        return {"budget": self.budget, "strategies": [s.model_dump() for s in self.strategies],
+                "metrics": self.metrics, "stages": self.stages}
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict, accept_kw: Dict | None = None) -> "SearchState":
+        state = cls(int(data["budget"]), accept_kw)
+        strats = [StrategyConfig(**d) for d in data["strategies"]]
+        stages = data["stages"]; pos = 0
+        for st in stages:  # Stufen nacheinander neu verbuchen -> stats identisch zum ununterbrochenen Lauf
+            n = int(st["evaluated"])
+            state.record(st["stage"], strats[pos:pos + n], data["metrics"][pos:pos + n]); pos += n
+        return state
+
+    def to_dict(self) -> Dict:
+        return {"budget": self.budget, "evaluated": len(self.strategies), "stages": self.stages,
+                "regions": {a: {v: {"evaluated": c[0], "accepted": c[1]} for v, c in d.items()}
+                            for a, d in self.stats.items()}}
+
+def _evaluate_into(state: SearchState, stage: str, cands: Iterable[StrategyConfig],
+                   evaluate: Callable[[List[StrategyConfig]], pd.DataFrame], accept_kw: Dict | None = None) -> int:
+    """
+    Neue Kandidaten bewerten (ein evaluate-Aufruf) und verbuchen; Rückgabe = Anzahl bewertet.
+    accept_kw: Schwellen für is_accepted (None -> die des SearchState).
+    """
+    cands = state.fresh(cands)
+    if not cands:
+        return 0
+    kw = state.accept_kw if accept_kw is None else accept_kw
+    rows = evaluate(cands).to_dict(orient="records")
+    for m in rows:
+        m["is_accepted"] = accept_row(m, **kw)
+    state.record(stage, cands, rows)
+    return len(cands)
+
+def _with(base: StrategyConfig, **kw) -> StrategyConfig | None:
+    d = base.model_dump(); d.update(kw)
+    if d["slow"] < d["fast"] + 5:
+        return None  # gleiche Nebenbedingung wie im Zufallsgenerator
+    return StrategyConfig(**d)
+
+def _coarse_grid(sym: str, risk_fraction: float) -> List[StrategyConfig]:
+    grid = []
+    for tf in SEARCH_TIMEFRAMES:
+        for fast in _coarse_values("fast"):
+            for slow in _coarse_values("slow"):
+                for sl in _coarse_values("stop_loss_pct"):
+                    for trend in _coarse_values("trend_tol"):
+                        for atr in _coarse_values("atr_thresh"):
+                            if slow < fast + 5:
+                                continue
+                            grid.append(StrategyConfig(
+                                symbol=sym, fast=fast, slow=slow, stop_loss_pct=sl, risk_fraction=risk_fraction,
+                                timeframe=tf, direction="both", trend_tol=trend, atr_thresh=atr, atr_period=14))
+    return grid
+
+def _neighbours(s: StrategyConfig, step: Dict[str, int]) -> List[StrategyConfig]:
+    """Nachbarn im Feinraster: je Achse ein Schritt nach unten/oben (Timeframe bleibt)."""
+    out = []
+    for axis, vals in SEARCH_AXES.items():
+        i = vals.index(getattr(s, axis))
+        for j in (i - step[axis], i + step[axis]):
+            if 0 <= j < len(vals):
+                c = _with(s, **{axis: vals[j]})
+                if c is not None:
+                    out.append(c)
+    return out
+
+def coarse_to_fine_search(markets: Iterable[str], risk_fraction: float,
+                          evaluate: Callable[[List[StrategyConfig]], pd.DataFrame],
+                          budget: int = 240, coarse_fraction: float = 0.5, top_k: int = 8,
+                          seed: int = 42, accept_kw: Dict | None = None
+                          ) -> Tuple[List[StrategyConfig], pd.DataFrame, SearchState]:
+    """
+    Grob -> fein: zuerst eine (bei Bedarf gleichmäßig gezogene) Stichprobe des Grobrasters je Symbol,
+    dann Runden um die top_k besten Konfigurationen mit halbierter Schrittweite im Feinraster.
+    Rangfolge nach den Akzeptanzkriterien von evaluation (akzeptiert zuerst, dann net_return), Schwellen
+    aus accept_kw (evaluation.thresholds; None -> Standard).
+    evaluate: Strategien -> Metrik-Frame in Eingabereihenfolge (z. B. backtest_all).
+    budget begrenzt die Gesamtzahl der Bewertungen. Liefert Strategien + Metriken in Bewertungsreihenfolge.
+    """
+    rng = random.Random(seed)
+    state = SearchState(budget, accept_kw)
+    markets = list(markets)
+
+    def _run(stage: str, cands: List[StrategyConfig]) -> None:
+        _evaluate_into(state, stage, cands, evaluate)
+
+    # Grobstufe
+    n_coarse = max(1, int(budget * coarse_fraction) // max(1, len(markets)))
+    coarse: List[StrategyConfig] = []
+    for sym in markets:
+        grid = _coarse_grid(sym, risk_fraction)
+        coarse += grid if len(grid) <= n_coarse else rng.sample(grid, n_coarse)
+    _run("coarse", coarse)
+
+    # Feinstufe: Schrittweite je Achse halbiert sich pro Runde bis 1, danach bleibt sie bei 1
+    step = {a: max(1, COARSE_STEP[a] // 2) for a in SEARCH_AXES}
+    rnd = 0
+    while state.remaining > 0:
+        rnd += 1
+        cands: List[StrategyConfig] = []
+        for i in state.ranked()[:int(top_k)]:
+            cands += _neighbours(state.strategies[i], step)
+        before = len(state.strategies)
+        _run(f"fine_{rnd}", cands)
+        if len(state.strategies) == before and all(v == 1 for v in step.values()):
+            break  # Nachbarschaft der besten erschöpft
+        step = {a: max(1, v // 2) for a, v in step.items()}
+
+    return state.strategies, pd.DataFrame(state.metrics).drop(columns="is_accepted", errors="ignore"), state
+
+def save_search_state(state: SearchState | Dict, path: Path) -> None:
+    data = state.to_dict() if isinstance(state, SearchState) else state
+    Path(path).write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+def successive_halving(strategies: List[StrategyConfig],
+                       evaluate: Callable[[List[StrategyConfig], float], pd.DataFrame],
+                       bar_counts: Callable[[List[StrategyConfig], float], Sequence[int]],
+                       min_fraction: float = 0.125, keep: float = 0.5,
+                       accept_kw: Dict | None = None) -> Tuple[List[StrategyConfig], pd.DataFrame, Dict]:
+    """
+    Successive Halving: alle Kandidaten auf dem jüngsten min_fraction-Anteil der Historie bewerten,
+    die besten keep behalten (Rangfolge wie _ranked, Schwellen aus accept_kw) und mit um 1/keep
+    längerer Historie erneut bewerten, bis die volle Historie erreicht ist. Die letzte Stufe ist ein normaler Backtest.
+    evaluate(strats, fraction) -> Metriken in Eingabereihenfolge; bar_counts(strats, fraction) -> Bars je Strategie.
+    Liefert Überlebende, ihre Metriken auf voller Historie und einen Report (Stufen, gesparte Bar-Bewertungen).
+    """
+    if not 0.0 < keep < 1.0:
+        raise ValueError(f"keep must be in (0, 1), got {keep}")
+    fractions = []
+    f = min(1.0, float(min_fraction))
+    while f < 1.0:
+        fractions.append(f); f /= keep
+    fractions.append(1.0)
+
+    cands = list(strategies); rungs: List[Dict] = []; df = pd.DataFrame()
+    for f in fractions:
+        if not cands:
+            break
+        df = evaluate(cands, f)
+        bars = int(sum(bar_counts(cands, f)))
+        rows = df.to_dict(orient="records")
+        rungs.append({"fraction": f, "candidates": len(cands), "bar_evaluations": bars,
+                      "accepted": sum(accept_row(m, **(accept_kw or {})) for m in rows)})
+        if f < 1.0:
+            top = _ranked(rows, accept_kw)[:max(1, math.ceil(len(cands) * keep))]
+            cands = [cands[i] for i in sorted(top)]  # Eingabereihenfolge beibehalten
+    exhaustive = int(sum(bar_counts(list(strategies), 1.0)))
+    used = sum(r["bar_evaluations"] for r in rungs)
+    report = {"candidates": len(strategies), "survivors": len(cands), "rungs": rungs,
+              "bar_evaluations": used, "exhaustive_bar_evaluations": exhaustive,
+              "saved_bar_evaluations": exhaustive - used,
+              "saved_fraction": (1 - used / exhaustive) if exhaustive else 0.0}
+    return cands, df, report
+
+# Genetische Suche: numerische Gene im Feinraster (plus ATR-Periode), kategoriale frei wählbar
+GA_AXES: Dict[str, list] = {**SEARCH_AXES, "atr_period": [7, 10, 14, 20, 28]}
+GA_CHOICES: Dict[str, list] = {"timeframe": list(SEARCH_TIMEFRAMES), "direction": ["both", "long", "short"]}
+
+def _ga_repair(d: Dict) -> StrategyConfig:
+    # slow >= fast + 5 wie im Zufallsgenerator; slow auf den nächsten zulässigen Rasterwert schieben
+    if d["slow"] < d["fast"] + 5:
+        d["slow"] = next(v for v in SEARCH_AXES["slow"] if v >= d["fast"] + 5)
+    return StrategyConfig(**d)
+
+def _ga_random(rng: random.Random, markets: List[str], risk_fraction: float) -> StrategyConfig:
+    d = {"symbol": rng.choice(markets), "risk_fraction": risk_fraction}
+    d.update({a: rng.choice(v) for a, v in GA_AXES.items()})
+    d.update({a: rng.choice(v) for a, v in GA_CHOICES.items()})
+    return _ga_repair(d)
+
+def _ga_child(rng: random.Random, a: StrategyConfig, b: StrategyConfig, markets: List[str],
+              mutation_rate: float) -> StrategyConfig:
+    """Uniform-Crossover je Gen, danach Mutation: numerisch +-1..2 Rasterschritte, kategorial neu ziehen."""
+    pa, pb = a.model_dump(), b.model_dump()
+    d = {k: (pa[k] if rng.random() < 0.5 else pb[k]) for k in pa}
+    for axis, vals in GA_AXES.items():
+        if rng.random() < mutation_rate:
+            i = vals.index(d[axis]) + rng.choice((-2, -1, 1, 2))
+            d[axis] = vals[min(max(i, 0), len(vals) - 1)]
+    for axis, vals in {**GA_CHOICES, "symbol": markets}.items():
+        if rng.random() < mutation_rate / 2:
+            d[axis] = rng.choice(vals)
+    return _ga_repair(d)
+
+def _write_json_atomic(path: Path, data: Dict) -> None:
+    path = Path(path); path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+def genetic_search(markets: Iterable[str], risk_fraction: float,
+                   evaluate: Callable[[List[StrategyConfig]], pd.DataFrame],
+                   budget: int = 240, population: int = 48, elite: int = 8, mutation_rate: float = 0.2,
+                   seed: int = 42, checkpoint: Path | None = None,
+                   accept_kw: Dict | None = None) -> Tuple[List[StrategyConfig], pd.DataFrame, SearchState]:
+    """
+    Budgetierte genetische Suche über den StrategyConfig-Raum (fast/slow/stop/trend_tol/atr_thresh/
+    atr_period/timeframe/direction/symbol). Generation 0 zufällig, danach Turnierauswahl (Rang wie
+    _ranked, Schwellen aus accept_kw) unter den besten elite+population Bewertungen, Crossover und
+    Mutation. Jede Generation wird als Batch an evaluate gegeben (backtest_all -> Prozess-Pool bei workers > 1).
+    Deterministisch je seed; checkpoint: nach jeder Generation werden SearchState und RNG-Zustand
+    geschrieben, ein passender Checkpoint wird beim Start fortgesetzt.
+    """
+    markets = list(markets)
+    rng = random.Random(seed)
+    state = SearchState(budget, accept_kw); gen = 0
+    ident = {"seed": int(seed), "markets": markets, "risk_fraction": float(risk_fraction), "budget": int(budget),
+             "population": int(population), "elite": int(elite), "mutation_rate": float(mutation_rate),
+             "accept": thresholds(accept_kw)}  # andere Schwellen -> anderer Suchpfad, Checkpoint passt nicht
+    if checkpoint is not None and Path(checkpoint).exists():
+        try:
+            ck = json.loads(Path(checkpoint).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            ck = None
+        if ck is not None and ck.get("search") == ident:
+            state = SearchState.from_checkpoint(ck["state"], accept_kw); gen = int(ck["generation"])
+            v, internal, gauss = ck["rng"]
+            rng.setstate((v, tuple(internal), gauss))
+
+    while state.remaining > 0:
+        n = min(int(population), state.remaining)
+        cands: List[StrategyConfig] = []; keys = set()
+        pool = state.ranked()[:int(elite) + int(population)] if gen > 0 else []  # Eltern je Generation fix
+        for _ in range(20 * n):  # Duplikate / bereits Bewertetes überspringen, Versuche begrenzt
+            if len(cands) >= n:
+                break
+            if gen == 0:
+                c = _ga_random(rng, markets, risk_fraction)
+            else:
+                pa = min(rng.sample(range(len(pool)), min(2, len(pool))))
+                pb = min(rng.sample(range(len(pool)), min(2, len(pool))))
+                c = _ga_child(rng, state.strategies[pool[pa]], state.strategies[pool[pb]], markets, mutation_rate)
+            k = _cfg_key(c)
+            if k not in keys and k not in state.seen:
+                keys.add(k); cands.append(c)
+        if not _evaluate_into(state, f"gen_{gen}", cands, evaluate):
+            break  # Raum um die Elite erschöpft
+        gen += 1
+        if checkpoint is not None:
+            _write_json_atomic(checkpoint, {"search": ident, "generation": gen, "rng": list(rng.getstate()),
+                                            "state": state.to_checkpoint()})
+
+    return state.strategies, pd.DataFrame(state.metrics).drop(columns="is_accepted", errors="ignore"), state
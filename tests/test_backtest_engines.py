@@ -0,0 +1,78 @@
+﻿import numpy as np
+import pandas as pd
+import pytest
+from src.backtest import PruneRule, backtest_batch, backtest_one, backtest_one_with_trades, backtest_splits
+from src.strategy_blocks import StrategyConfig
+
+# Spalten von results/paper_trading/trades.csv (execution.py hängt strategy_key/weight an)
+TRADE_COLUMNS = ["time", "symbol", "timeframe", "action", "pos", "price", "qty", "equity", "entry_px", "fee",
+                 "stop_px", "risk_amt", "size", "cashflow", "notional", "rate", "exit_px", "pnl", "entry_time"]
+
+def _ohlcv(seed: int = 0, days: int = 24) -> pd.DataFrame:
+    # 1m-Random-Walk mit wechselnden Trends über einen Monatswechsel, Funding alle 8h
+    rng = np.random.default_rng(seed); n = days * 1440
+    idx = pd.date_range("2024-02-20", periods=n, freq="1min", tz="UTC")
+    drift = np.repeat(rng.normal(0, 4e-5, n // 240 + 1), 240)[:n]
+    close = 100 * np.exp(np.cumsum(drift + rng.normal(0, 1.2e-3, n)))
+    open_ = np.r_[close[0], close[:-1]]; wick = np.abs(rng.normal(0, 8e-4, n)) * close
+    funding = np.where((idx.hour % 8 == 0) & (idx.minute == 0), rng.normal(1e-4, 1e-4, n), 0.0)
+    return pd.DataFrame({"open": open_, "high": np.maximum(open_, close) + wick, "low": np.minimum(open_, close) - wick,
+                         "close": close, "volume": 1.0, "funding": funding}, index=idx)
+
+DF = _ohlcv()
+
+def _strats(tf: str):
+    return [StrategyConfig(symbol="TEST", fast=f, slow=f + s, stop_loss_pct=sl, risk_fraction=0.01, timeframe=tf,
+                           direction=d, trend_tol=tt, atr_thresh=at)
+            for f in (3, 8) for s in (6, 20) for sl in (0.003, 0.01) for d in ("both", "long", "short")
+            for tt, at in ((0.0, 0.0), (0.001, 0.001))]   # 48 >= BATCH_VECTOR_MIN -> _simulate_batch
+
+def _same_metrics(a: dict, b: dict):
+    assert a.keys() == b.keys()
+    for k in a:
+        assert a[k] == b[k] or (isinstance(a[k], float) and np.isnan(a[k]) and np.isnan(b[k])), k
+
+@pytest.mark.parametrize("tf", ["1m", "5m", "15m"])
+@pytest.mark.parametrize("j", [0, 7, 17, 30, 45])
+def test_array_matches_reference(tf, j):
+    st = _strats(tf)[j]
+    m, eq = backtest_one(DF, st, 1e4, 5)
+    m_ref, eq_ref = backtest_one(DF, st, 1e4, 5, engine="reference")
+    _same_metrics(m, m_ref)
+    pd.testing.assert_series_equal(eq, eq_ref, check_names=False, check_freq=False)
+
+@pytest.mark.parametrize("tf", ["5m", "15m"])
+@pytest.mark.parametrize("intrabar", [False, True])
+@pytest.mark.parametrize("prune", [None, PruneRule(max_mdd_floor=-0.5, min_trades=40)])
+@pytest.mark.parametrize("step", [10, 1])   # 5 Strategien: skalarer Pfad (< BATCH_VECTOR_MIN); 48: _simulate_batch
+def test_batch_matches_array(tf, intrabar, prune, step):
+    strats = _strats(tf)[::step]
+    batch = backtest_batch(DF, strats, 1e4, 5, prune=prune, intrabar=intrabar, daily=True)
+    for st, row in zip(strats, batch.to_dict(orient="records")):
+        m, eq = backtest_one(DF, st, 1e4, 5, equity="daily", prune=prune, intrabar=intrabar)
+        daily = row.pop("daily_equity")
+        _same_metrics(row, m)
+        if not m.get("pruned", False):
+            pd.testing.assert_series_equal(daily, eq, check_names=False, check_freq=False)
+    if prune is not None:
+        assert 0 < batch["pruned"].sum() < len(strats)   # Abbruch wird tatsächlich geprüft
+
+@pytest.mark.parametrize("tf", ["1m", "15m"])
+@pytest.mark.parametrize("warm_start", [False, True])
+def test_splits_match_batch(tf, warm_start):
+    strats = _strats(tf)
+    segments = [(0, 10 * 1440), (5 * 1440, 17 * 1440), (12 * 1440, len(DF))]
+    for (a, b), got in zip(segments, backtest_splits(DF, strats, segments, 1e4, 5, warm_start=warm_start)):
+        ref = backtest_batch(DF.iloc[a:b], strats, 1e4, 5, warm_from=DF if warm_start else None)
+        pd.testing.assert_frame_equal(got, ref)
+
+@pytest.mark.parametrize("tf,intrabar", [("1m", False), ("5m", True), ("15m", False), ("15m", True)])
+def test_trade_log_keeps_trades_csv_columns(tf, intrabar):
+    st = _strats(tf)[0]
+    m, eq, trades = backtest_one_with_trades(DF, st, 1e4, 5, intrabar=intrabar)
+    m_one, eq_one = backtest_one(DF, st, 1e4, 5, intrabar=intrabar)
+    assert list(trades.columns) == TRADE_COLUMNS
+    _same_metrics(m, m_one)
+    pd.testing.assert_series_equal(eq, eq_one)
+    actions = trades["action"].value_counts()
+    assert actions.filter(like="entry_").sum() == m["trades"] and actions["funding"] > 0
@@ -0,0 +1,130 @@
+﻿from typing import Dict, List
+import numpy as np
+import pandas as pd
+import pytest
+from src.portfolio_engine import _select_with_corr, project_caps
+
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")   # Series.corr auf konstanten Spalten
+
+# Referenzen: die früheren Schleifen-Implementierungen (vor der Vektorisierung)
+def _loop_caps(w: pd.Series, symbol_of: Dict[str, str], max_w: float, market_cap: float, max_iters: int = 300) -> pd.Series:
+    w = w.clip(upper=max_w)
+    for _ in range(max_iters):
+        sums = {}
+        for k, v in w.items():
+            sums[symbol_of[k]] = sums.get(symbol_of[k], 0.0) + float(v)
+        over = {s: val for s, val in sums.items() if val > market_cap + 1e-12}
+        if over:
+            for s, val in over.items():
+                keys = [k for k in w.index if symbol_of[k] == s]
+                if val > 0:
+                    w.loc[keys] = w.loc[keys] * (market_cap / val)
+            w = w.clip(upper=max_w)
+        total = float(w.sum())
+        if abs(total - 1.0) < 1e-9 and not over:
+            break
+        sums = {}
+        for k, v in w.items():
+            sums[symbol_of[k]] = sums.get(symbol_of[k], 0.0) + float(v)
+        non_over_keys = [k for k in w.index if sums[symbol_of[k]] < market_cap - 1e-12]
+        if not non_over_keys:
+            w = w / max(total, 1e-12)
+            break
+        residual = 1.0 - total
+        if abs(residual) < 1e-9 and not over:
+            break
+        sub = w.loc[non_over_keys]; sub_sum = float(sub.sum())
+        add = pd.Series(1.0 / len(non_over_keys), index=non_over_keys) if sub_sum <= 0 else sub / sub_sum
+        w.loc[non_over_keys] = w.loc[non_over_keys] + residual * add
+        w = w.clip(upper=max_w)
+    return w / float(w.sum())
+
+def _loop_select(ret_map: Dict[str, pd.Series], score: pd.Series, corr_cap: float, max_n: int | None) -> List[str]:
+    chosen: List[str] = []
+    for key in score.sort_values(ascending=False).index:
+        if all(not (pd.notna(c) and c > corr_cap) for c in (ret_map[key].corr(ret_map[k]) for k in chosen)):
+            chosen.append(key)
+            if max_n and len(chosen) >= max_n:
+                break
+    return chosen
+
+def _caps_case(seed: int, max_n: int, max_ws, caps):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, max_n)); market = pd.factorize(rng.integers(0, int(rng.integers(1, 6)), n))[0]
+    max_w = float(rng.choice(max_ws)); market_cap = float(rng.choice(caps))
+    w0 = rng.lognormal(0, 1, n); w0 = np.minimum(w0 / w0.sum(), max_w)   # wie _risk_parity_weights
+    return w0, market, max_w, market_cap
+
+def _feasible(market: np.ndarray, max_w: float, market_cap: float) -> bool:
+    room = np.minimum(market_cap, max_w * np.bincount(market))
+    return max_w * len(market) >= 1 and room.sum() >= 1
+
+def _both(w0: np.ndarray, market: np.ndarray, max_w: float, market_cap: float):
+    keys = [f"s{i}" for i in range(len(w0))]
+    old = _loop_caps(pd.Series(w0, index=keys), dict(zip(keys, market.astype(str))), max_w, market_cap).to_numpy()
+    return old, project_caps(w0, market, max_w, market_cap)
+
+def _rel_entropy(w: np.ndarray, w0: np.ndarray) -> float:
+    m = w > 0
+    return float((w[m] * np.log(w[m] / w0[m])).sum())
+
+_FEASIBLE = [c for c in (_caps_case(s, 30, [0.05, 0.1, 0.2, 0.4, 1.0], [0.2, 0.35, 0.5, 0.7, 1.0]) for s in range(60))
+             if _feasible(*c[1:])]
+# caps x Anzahl < 1: Strategie- bzw. Marktcaps reichen nicht für Summe 1
+_INFEASIBLE = [c for c in (_caps_case(s, 12, [0.05, 0.1, 0.2], [0.1, 0.2, 0.3]) for s in range(60))
+               if not _feasible(*c[1:])]
+
+@pytest.mark.parametrize("w0,market,max_w,market_cap", _FEASIBLE)
+def test_project_caps_matches_loop_reference(w0, market, max_w, market_cap):
+    old, new = _both(w0, market, max_w, market_cap)
+    assert new.min() >= 0 and new.sum() == pytest.approx(1.0, abs=1e-12)
+    assert new.max() <= max_w + 1e-12 and np.bincount(market, new).max() <= market_cap + 1e-12
+    # gleicher Fixpunkt wie die Schleife; wo diese pfadabhängig früher anhält, mindestens so nah an w0
+    assert np.allclose(new, old, atol=1e-8) or _rel_entropy(new, w0) <= _rel_entropy(old, w0) + 1e-8
+
+@pytest.mark.parametrize("w0,market,max_w,market_cap", _INFEASIBLE)
+def test_project_caps_infeasible_caps(w0, market, max_w, market_cap):
+    old, new = _both(w0, market, max_w, market_cap)
+    assert new.min() >= 0 and new.sum() == pytest.approx(1.0, abs=1e-12)
+    assert np.allclose(np.bincount(market, new), np.bincount(market, old), atol=1e-9)
+
+def test_project_caps_infeasible_single_market_is_equal_weight():
+    w0 = np.array([0.5, 0.3, 0.2]); market = np.zeros(3, dtype=np.int64)
+    keys = ["a", "b", "c"]
+    old = _loop_caps(pd.Series(w0, index=keys), dict.fromkeys(keys, "m"), 0.2, 1.0).to_numpy()
+    assert np.allclose(project_caps(w0, market, 0.2, 1.0), 1 / 3) and np.allclose(old, 1 / 3)
+
+def _returns(seed: int):
+    rng = np.random.default_rng(seed)
+    n, t = int(rng.integers(2, 25)), int(rng.integers(20, 120))
+    idx = pd.date_range("2024-01-01", periods=t, freq="D")
+    common = rng.normal(0, 0.01, t)
+    ret_map = {}
+    for i in range(n):
+        x = float(rng.uniform(0, 1.2)) * common + rng.normal(0, 0.01, t)
+        kind = rng.integers(0, 5)
+        if kind == 0:
+            x[rng.random(t) < rng.uniform(0.7, 0.97)] = np.nan          # NaN-lastige Spalte
+        elif kind == 1:
+            x[: int(t * rng.uniform(0.5, 0.95))] = np.nan              # späte Strategie, kurze Überlappung
+        elif kind == 2 and i:
+            x = ret_map[f"s{int(rng.integers(0, i))}"].to_numpy().copy()  # Duplikat (corr = 1)
+        elif kind == 3:
+            x[:] = np.where(rng.random(t) < 0.5, np.nan, 0.001)        # konstant -> corr NaN
+        ret_map[f"s{i}"] = pd.Series(x, index=idx)
+    score = pd.Series(rng.normal(size=n), index=list(ret_map))
+    return ret_map, score
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("corr_cap,max_n", [(0.8, 10), (0.5, None), (0.95, 3), (0.0, None)])
+def test_select_with_corr_matches_loop_reference(seed, corr_cap, max_n):
+    ret_map, score = _returns(seed)
+    assert _select_with_corr(ret_map, score, corr_cap, max_n) == _loop_select(ret_map, score, corr_cap, max_n)
+
+def test_select_with_corr_all_nan_column():
+    idx = pd.date_range("2024-01-01", periods=30, freq="D")
+    rng = np.random.default_rng(0)
+    ret_map = {"a": pd.Series(rng.normal(size=30), index=idx), "b": pd.Series(np.nan, index=idx),
+               "c": pd.Series(rng.normal(size=30), index=idx)}
+    score = pd.Series([3.0, 2.0, 1.0], index=list(ret_map))
+    assert _select_with_corr(ret_map, score, 0.8, None) == _loop_select(ret_map, score, 0.8, None)
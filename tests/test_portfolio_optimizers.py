@@ -0,0 +1,55 @@
+﻿import itertools
+import numpy as np
+import pytest
+from src.portfolio_engine import _erc_weights, _hrp_weights, _min_variance_weights
+
+def _cov(seed: int, n: int, t: int = 60) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    R = rng.normal(0, 0.01, (t, n)) @ rng.normal(0, 1, (n, n)) + rng.normal(0, 0.01, (t, 1))
+    return np.cov(R, rowvar=False) + 1e-8 * np.eye(n)
+
+def _brute_min_variance(C: np.ndarray) -> np.ndarray:
+    # Referenz-QP: alle Trägermengen durchgehen, zulässige Lösungen auf der Menge vergleichen
+    best, best_v = None, np.inf
+    for k in range(1, len(C) + 1):
+        for S in itertools.combinations(range(len(C)), k):
+            S = list(S)
+            x = np.linalg.solve(C[np.ix_(S, S)], np.ones(k)); x /= x.sum()
+            if (x < -1e-12).any():
+                continue
+            w = np.zeros(len(C)); w[S] = x
+            if w @ C @ w < best_v:
+                best, best_v = w, w @ C @ w
+    return best
+
+@pytest.mark.parametrize("seed", range(20))
+def test_min_variance_kkt_and_reference(seed):
+    C = _cov(seed, 6)
+    w = _min_variance_weights(C)
+    g = C @ w; lam = w @ g
+    assert w.min() >= 0 and w.sum() == pytest.approx(1.0)
+    assert np.allclose(g[w > 1e-12], lam, rtol=1e-8)                  # Gradient auf dem Träger gleich
+    assert (g[w <= 1e-12] >= lam * (1 - 1e-8)).all()                  # außerhalb nicht besser
+    ref = _brute_min_variance(C)
+    assert w @ C @ w == pytest.approx(ref @ C @ ref, rel=1e-10)
+    assert np.allclose(w, ref, atol=1e-8)
+
+def test_min_variance_terminates_on_degenerate_cov():
+    base = _cov(3, 4)
+    C = np.kron(np.ones((3, 3)), base) + 1e-12 * np.eye(12)           # dreifach duplizierte Strategien
+    for iters in (1, 5, 200):
+        w = _min_variance_weights(C, max_iters=iters)
+        assert w.min() >= 0 and w.sum() == pytest.approx(1.0)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_erc_equal_risk_contributions(seed):
+    C = _cov(seed, 8)
+    w = _erc_weights(C)
+    rc = w * (C @ w)
+    assert w.min() > 0 and w.sum() == pytest.approx(1.0)
+    assert np.allclose(rc, rc.mean(), rtol=1e-6)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_hrp_weights_are_a_long_only_allocation(seed):
+    w = _hrp_weights(_cov(seed, 9))
+    assert w.min() >= 0 and w.sum() == pytest.approx(1.0)
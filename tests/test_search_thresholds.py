@@ -0,0 +1,33 @@
+﻿import pandas as pd
+from src.strategy_blocks import StrategyConfig
+from src.strategy_generator import coarse_to_fine_search, successive_halving
+
+def _strat(fast: int) -> StrategyConfig:
+    return StrategyConfig(symbol="BTCUSDT", fast=fast, slow=fast + 20, stop_loss_pct=0.01, risk_fraction=0.01,
+                          timeframe="15m", direction="both")
+
+# fast=5: hohe Rendite, aber nur 5 Trades; fast=6: 20 Trades, kleinere Rendite
+_ROWS = {5: {"trades": 5, "net_return": 0.5}, 6: {"trades": 20, "net_return": 0.1}}
+
+def _evaluate(strats, fraction=1.0):
+    return pd.DataFrame([{"max_drawdown": -0.1, "avg_monthly_return": 0.02, "worst_month": -0.01, **_ROWS[s.fast]}
+                         for s in strats])
+
+def _halving_survivors(accept_kw):
+    strats = [_strat(5), _strat(6)]
+    survivors, _, report = successive_halving(strats, _evaluate, lambda ss, f: [100] * len(ss),
+                                              min_fraction=0.5, keep=0.5, accept_kw=accept_kw)
+    return [s.fast for s in survivors], report["rungs"][0]["accepted"]
+
+def test_halving_uses_configured_thresholds():
+    assert _halving_survivors(None) == ([6], 1)                 # Standard min_trades=10 verwirft fast=5
+    assert _halving_survivors({"min_trades": 3}) == ([5], 2)    # beide akzeptiert -> net_return entscheidet
+
+def test_coarse_to_fine_counts_with_configured_thresholds():
+    def evaluate(strats):
+        return pd.DataFrame([{"trades": 5, "net_return": 0.1, "max_drawdown": -0.1,
+                              "avg_monthly_return": 0.02, "worst_month": -0.01} for _ in strats])
+    _, _, default = coarse_to_fine_search(["BTCUSDT"], 0.01, evaluate, budget=12)
+    _, _, loose = coarse_to_fine_search(["BTCUSDT"], 0.01, evaluate, budget=12, accept_kw={"min_trades": 3})
+    assert sum(st["accepted"] for st in default.stages) == 0
+    assert sum(st["accepted"] for st in loose.stages) == 12
@@ -7,7 +7,9 @@ import pandas as pd
 from src.config_loader import load_config
 from src.config_extras import load_extras
 from src.strategy_blocks import StrategyConfig
-from src.backtest import _load_ohlcv, backtest_one
+from src.metrics_store import open_results
+from src.portfolio_engine import daily_equity_map, strategy_key
+from src.result_store import open_store
 
 ROOT = Path(".")
 SEL_PATH = ROOT / "results/portfolios/selection.json"
@@ -76,13 +78,15 @@ for k in weights.keys():
 if not selected_cfgs:
     raise SystemExit("Konnte Strategiekonfigurationen nicht rekonstruieren (prüfe accepted_intersection.json).")
 
-# ---- 3) Equity→Returns je Strategie & Korrelation
+# ---- 3) Equity→Returns je Strategie & Korrelation (Tageskurven wie bei der Auswahl, aus dem Backtest-Artefakt)
 ohlcv_dir = Path(cfg.paths.processed) / "ohlcv"
+store = open_store(extras)
+intrabar = bool(extras["backtest"].get("intrabar_stops", False))
+strats = [StrategyConfig(**d) for d in selected_cfgs]
+daily = daily_equity_map(strats, cfg, ohlcv_dir, intrabar=intrabar, store=store, root=open_results(extras))
 rets = {}
-for d in selected_cfgs:
-    s = StrategyConfig(**d)
-    df = _load_ohlcv(s.symbol, ohlcv_dir)
-    m, eq = backtest_one(df, s, cfg.risk.starting_capital, cfg.risk.max_leverage)
+for d, s in zip(selected_cfgs, strats):
+    m, eq = daily[strategy_key(s)]
     if not eq.empty:
         rets[_key_of(d)] = (eq / float(eq.iloc[0])).pct_change().fillna(0.0)
 